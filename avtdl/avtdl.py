@@ -9,9 +9,11 @@ from typing import Any, Dict, Optional, Tuple
 
 from avtdl.core import webui
 from avtdl.core.actors import Actor
+from avtdl.core.cache import CacheJanitor
 from avtdl.core.chain import Chain
 from avtdl.core.config import ConfigParser, ConfigurationError, SettingsSection, config_sancheck
 from avtdl.core.info import generate_plugins_description, generate_version_string
+from avtdl.core.lag import LoopLagMonitor
 from avtdl.core.loggers import setup_console_logger, silence_library_loggers
 from avtdl.core.plugins import UnknownPluginError
 from avtdl.core.runtime import RuntimeContext, TerminatedAction
@@ -84,16 +86,17 @@ def handler(loop: AbstractEventLoop, context: Dict[str, Any]) -> None:
 async def install_exception_handler() -> None:
     loop = asyncio.get_running_loop()
     loop.set_exception_handler(handler)
-    loop.slow_callback_duration = 100
-
 
 
 async def run(config_path: Path, host: Optional[str], port: Optional[int]) -> None:
     await install_exception_handler()
+    loop_monitor = LoopLagMonitor()
+    _loop_monitor_task = asyncio.create_task(loop_monitor.run(), name='loop lag monitor')
     config_encoding: Optional[str] = None
     while True:
         config = load_config(config_path, config_encoding)
         ctx = RuntimeContext.create()
+        ctx.set_extra('loop_monitor', loop_monitor)
         with ctx:
             settings, actors, chains = parse_config(config, ctx)
             if config_encoding != settings.encoding:
@@ -116,6 +119,8 @@ async def run(config_path: Path, host: Optional[str], port: Optional[int]) -> No
             controller = ctx.controller
             for runnable in actors.values():
                 _ = controller.create_task(runnable.run(), name=f'{runnable!r}.{hash(runnable)}')
+            janitor = CacheJanitor(settings.cache_directory, settings.cache_max_size, settings.cache_max_age)
+            _ = controller.create_task(janitor.run(), name='cache janitor')
             _ = controller.create_task(webui.run(config_path, config, ctx, settings, actors, chains), name='webui')
 
             action = await controller.run_until_termination()
@@ -173,7 +178,7 @@ def main() -> None:
         elif args.plugins_doc is not None:
             make_docs(args.plugins_doc)
         else:
-            asyncio.run(run(args.config, args.host, args.port), debug=True)
+            asyncio.run(run(args.config, args.host, args.port))
     except KeyboardInterrupt:
         if args.debug:
             logging.exception('Interrupted, exiting... Printing stacktrace for debugging purpose:')
@@ -11,11 +11,17 @@ from avtdl.core.actors import Action, ActionEntity, ActorConfig
 from avtdl.core.config import SettingsSection
 from avtdl.core.formatters import sanitize_filename
 from avtdl.core.interfaces import Record
+from avtdl.core.metrics import Gauge
 from avtdl.core.request import ClientPool, HttpClient, Transport
 from avtdl.core.runtime import RuntimeContext, TaskStatus
 from avtdl.core.state import StateSerializer
 from avtdl.core.utils import ListRootModel, check_dir, with_prefix
 
+QUEUE_DEPTH = Gauge('avtdl_queue_depth', 'Number of records waiting to be processed by queue-based action entities',
+                    ['actor', 'entity'])
+RUNNING_TASKS = Gauge('avtdl_running_tasks', 'Number of records being processed by task-based action entities',
+                      ['actor', 'entity'])
+
 
 class HttpActionConfig(ActorConfig):
     pass
@@ -88,6 +94,7 @@ class QueueAction(HttpAction):
             return
         queue = serialized.to_queue()
         self.queues[entity.name] = queue
+        self.update_queue_depth(entity.name)
         self.logger.debug(f'[{entity.name}] restored {queue.qsize()} unprocessed records from the previous run')
 
     def dump_queue(self, entity: QueueActionEntity):
@@ -97,6 +104,7 @@ class QueueAction(HttpAction):
         if queue.qsize() == 0:
             return
         serialized = QueueSerialized.from_queue(queue)
+        self.update_queue_depth(entity.name)
         persistence_path = self.settings.state_directory / self.persistence_file(entity.name)
         ok = StateSerializer.dump(serialized, persistence_path)
         if ok:
@@ -106,6 +114,7 @@ class QueueAction(HttpAction):
         try:
             queue = self.queues[entity.name]
             queue.put_nowait(record)
+            self.update_queue_depth(entity.name)
         except (asyncio.QueueFull, KeyError) as e:
             self.logger.exception(
                 f'[{entity.name}] failed to add url, {type(e)}: {e}. This is a bug, please report it.')
@@ -120,6 +129,7 @@ class QueueAction(HttpAction):
         try:
             while True:
                 record = await queue.get()
+                self.update_queue_depth(entity.name)
                 self.logger.debug(f'(queued: {queue.qsize()}) processing record {record!r}')
                 await self.handle_single_record(logger, client, entity, record)
                 await asyncio.sleep(self.conf.consumption_delay)
@@ -130,6 +140,9 @@ class QueueAction(HttpAction):
             self.dump_queue(entity)
             raise
 
+    def update_queue_depth(self, entity_name: str) -> None:
+        QUEUE_DEPTH.set(self.conf.name, entity_name, value=self.queues[entity_name].qsize())
+
     def update_info(self, entity: QueueActionEntity, record: Record):
         info = self.info.get(entity.name)
         if info is None:
@@ -205,8 +218,13 @@ class TaskAction(HttpAction):
         info = TaskStatus(self.conf.name, entity.name, record=record)
         client = self.get_client(entity)
         task = self.controller.create_task(self._handle_record_task(logger, client, entity, record, info), name=task_name, _info=info)
-        task.add_done_callback(lambda _: self.tasks.pop(task_name))
+        task.add_done_callback(lambda _: self.on_task_done(entity, task_name))
         self.tasks[task_name] = task
+        RUNNING_TASKS.inc(self.conf.name, entity.name)
+
+    def on_task_done(self, entity: TaskActionEntity, task_name: str) -> None:
+        self.tasks.pop(task_name)
+        RUNNING_TASKS.dec(self.conf.name, entity.name)
 
     def task_name_for(self, entity: TaskActionEntity, record: Record) -> str:
         record_id = record.get_uid()
@@ -7,9 +7,12 @@ from typing import Any, Dict, Optional, Sequence
 from pydantic import BaseModel, ConfigDict, Field, field_serializer, field_validator
 
 from avtdl.core.interfaces import AbstractRecordsStorage, Event, MAX_REPR_LEN, Record
+from avtdl.core.metrics import Counter
 from avtdl.core.runtime import RuntimeContext
 from avtdl.core.utils import Timezone
 
+MONITOR_RECORDS = Counter('avtdl_monitor_records_total', 'Number of records emitted by monitor entities', ['actor', 'entity'])
+
 
 class ActorConfig(BaseModel):
     model_config = ConfigDict(use_attribute_docstrings=True)
@@ -78,10 +81,10 @@ class Actor(ABC):
             self.logger.warning(f'[{entity.name}] received incoming record produced by self, which indicates loop in a chain, dropping: "{record!r}".\nCheck config for chains, passing records to each other in a loop. Record has chain set to "{record.chain}"')
             return
         if record.origin is None:
+            # record has not been published yet, so it is not shared with other consumers
             record.origin = origin
         if entity.reset_origin:
-            record = record.model_copy(deep=True)
-            record.chain = ''
+            record = record.evolve(chain='')
         topic = self.bus.outgoing_topic_for(self.conf.name, entity.name, record.chain)
         self.bus.pub(topic, record)
 
@@ -107,6 +110,7 @@ class Monitor(Actor, ABC):
 
     def on_record(self, entity: ActorEntity, record: Record):
         '''Implementation should call it for every new Record it produces'''
+        MONITOR_RECORDS.inc(self.conf.name, entity.name)
         super().on_record(entity, record)
 
 
@@ -123,11 +127,16 @@ class Filter(Actor):
     def handle_record(self, entity: FilterEntity, record: Record):
         filtered = self.match(entity, record)
         if filtered is not None:
-            filtered.origin = filtered.origin or record.origin
+            # filtered might be the incoming record itself, which is shared with other consumers
+            changes: Dict[str, Any] = {}
+            if not filtered.origin and filtered.origin != record.origin:
+                changes['origin'] = record.origin
             if filtered.chain is None:
-                filtered.chain = ''
-            elif not filtered.chain:
-                filtered.chain = record.chain
+                changes['chain'] = ''
+            elif not filtered.chain and filtered.chain != record.chain:
+                changes['chain'] = record.chain
+            if changes:
+                filtered = filtered.evolve(**changes)
             self.on_record(entity, filtered)
         else:
             self.logger.debug(f'[{entity.name}] record dropped: "{record!r}"')
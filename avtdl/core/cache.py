@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import glob
 import hashlib
@@ -5,11 +6,14 @@ import logging
 import os
 import re
 import shutil
+import time
 import urllib.parse
+import weakref
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Iterable, List, Optional
+from typing import Any, ClassVar, Dict, Iterable, List, Optional, Tuple
 
-from avtdl.core.formatters import sanitize_filename
+from avtdl.core.formatters import Fmt, sanitize_filename
 from avtdl.core.interfaces import Record
 from avtdl.core.request import HttpClient
 
@@ -91,6 +95,244 @@ def has_expired(file: Path, ttl: Optional[float]) -> bool:
     return hours_passed > ttl
 
 
+@dataclass
+class CachedFile:
+    path: Path
+    size: int
+    mtime: float
+
+
+class CacheIndex:
+    """
+    In-memory index of files stored in cache subdirectories
+
+    Maps path to a file without extension and rename suffix to the list of
+    existing files with this name, in the same order find_with_suffix() returns
+    them. A directory is scanned once, on the first lookup of a path inside it.
+    Lookups that find nothing in the index check if the directory has been
+    modified since the scan, and rescan it if it has, so files added by other
+    FileCache instances are picked up. Files deleted by other instances
+    stay in the index until forget() is called for them.
+    """
+
+    def __init__(self, suffix_template: str, ignore_suffix: str):
+        self.suffix_template = suffix_template
+        self.ignore_suffix = ignore_suffix
+        # directory -> base name -> files
+        self.directories: Dict[Path, Dict[str, List[CachedFile]]] = {}
+        self.scanned: Dict[Path, int] = {}
+        self.logger = logging.getLogger('cache').getChild('index')
+
+    def lookup(self, path: Path) -> List[CachedFile]:
+        directory = path.parent
+        files = self.directories.get(directory, {}).get(path.name)
+        if files:
+            return files
+        try:
+            mtime = directory.stat().st_mtime_ns
+        except OSError:
+            return []
+        if self.scanned.get(directory) != mtime:
+            self.scan(directory, mtime)
+        return self.directories.get(directory, {}).get(path.name, [])
+
+    def scan(self, directory: Path, mtime: int) -> None:
+        self.directories.pop(directory, None)
+        try:
+            items = list(directory.iterdir())
+        except OSError as e:
+            self.logger.debug(f'failed to scan "{directory}": {e}')
+            return
+        for item in items:
+            if item.name.endswith(self.ignore_suffix):
+                continue
+            self._add(item)
+        self.scanned[directory] = mtime
+        self.logger.debug(f'indexed {len(items)} files in "{directory}"')
+
+    def add(self, file: Path) -> None:
+        """add newly stored file to the index of an already scanned directory"""
+        if file.parent in self.scanned:
+            self._add(file)
+
+    def _add(self, file: Path) -> None:
+        try:
+            stat = file.stat()
+        except OSError:
+            return
+        base_name = strip_rename_suffix(file.stem, self.suffix_template)
+        files = self.directories.setdefault(file.parent, {}).setdefault(base_name, [])
+        files[:] = [item for item in files if item.path != file]
+        files.append(CachedFile(file, stat.st_size, stat.st_mtime))
+        files.sort(key=lambda item: (item.path.stem != base_name, item.path))
+
+    def forget(self, file: Path) -> None:
+        """remove file, that no longer exists, from the index"""
+        base_name = strip_rename_suffix(file.stem, self.suffix_template)
+        names = self.directories.get(file.parent, {})
+        files = [item for item in names.get(base_name, []) if item.path != file]
+        if files:
+            names[base_name] = files
+        else:
+            names.pop(base_name, None)
+
+
+class CacheUsage:
+    """
+    Usage statistics of a cache directory, shared by all FileCache instances using it
+
+    Keeps time of the last access to every file retrieved during current run,
+    used by CacheJanitor to evict least recently used files first, and lets
+    the janitor notify FileCache indexes about removed files.
+    """
+    _instances: ClassVar[Dict[Path, 'CacheUsage']] = {}
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.bytes_used: Optional[int] = None
+        self.files: Optional[int] = None
+        self.last_access: Dict[Path, float] = {}
+        self.indexes: weakref.WeakSet[CacheIndex] = weakref.WeakSet()
+
+    @classmethod
+    def for_directory(cls, cache_directory: Path) -> 'CacheUsage':
+        cache_directory = cache_directory.resolve()
+        usage = cls._instances.get(cache_directory)
+        if usage is None:
+            usage = cls._instances[cache_directory] = cls()
+        return usage
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+    def hit(self, file: Path) -> None:
+        self.hits += 1
+        self.last_access[file] = time.time()
+
+    def miss(self) -> None:
+        self.misses += 1
+
+    def evicted(self, file: Path, size: int) -> None:
+        self.evictions += 1
+        self.evicted_bytes += size
+        self.last_access.pop(file, None)
+        for index in self.indexes:
+            index.forget(file)
+
+    def __str__(self) -> str:
+        used = 'unknown' if self.bytes_used is None else f'{self.files} files, {Fmt.size(self.bytes_used)}'
+        ratio = 'n/a' if self.hit_ratio is None else f'{self.hit_ratio:.0%}'
+        return f'{used}, hit ratio {ratio} ({self.hits} hits, {self.misses} misses), {self.evictions} files ({Fmt.size(self.evicted_bytes)}) evicted'
+
+
+class CacheJanitor:
+    """
+    Periodically remove files from cache directory to keep it within limits
+
+    Files not accessed for longer than max_age hours are removed, then least
+    recently used files are removed until the total size is below max_size bytes.
+    Last access is the latest of file atime, mtime and the last time it was
+    retrieved by a FileCache during current run. Directory scans and file
+    removals are performed in a worker thread one directory or batch at a time,
+    so that large cache doesn't block the event loop. When neither limit is set,
+    the janitor does nothing.
+    """
+    BATCH_SIZE = 100
+
+    def __init__(self, cache_directory: Path, max_size: Optional[int], max_age: Optional[float],
+                 interval: float = 600, logger: Optional[logging.Logger] = None):
+        self.cache_directory = cache_directory.resolve()
+        self.max_size = max_size
+        self.max_age = max_age
+        self.interval = interval
+        self.usage = CacheUsage.for_directory(self.cache_directory)
+        self.logger = logger or logging.getLogger('cache').getChild('janitor')
+
+    async def run(self) -> None:
+        if self.max_size is None and self.max_age is None:
+            self.logger.debug(f'no limits set for cache directory "{self.cache_directory}", not cleaning it up')
+            return
+        while True:
+            try:
+                await self.cleanup()
+            except Exception:
+                self.logger.exception(f'failed to clean up cache directory "{self.cache_directory}"')
+            await asyncio.sleep(self.interval)
+
+    async def cleanup(self) -> None:
+        files = await self.collect()
+        files.sort(key=lambda item: item[2])
+        total_size = sum(size for _, size, _ in files)
+
+        evict: List[Tuple[Path, int]] = []
+        expiration = time.time() - self.max_age * 3600 if self.max_age is not None else None
+        for path, size, accessed in files:
+            expired = expiration is not None and accessed < expiration
+            oversized = self.max_size is not None and total_size > self.max_size
+            if not expired and not oversized:
+                break
+            evict.append((path, size))
+            total_size -= size
+        for i in range(0, len(evict), self.BATCH_SIZE):
+            batch = evict[i:i + self.BATCH_SIZE]
+            removed = await asyncio.to_thread(self._remove, batch)
+            for path, size in removed:
+                self.usage.evicted(path, size)
+        self.usage.bytes_used = total_size
+        self.usage.files = len(files) - len(evict)
+        if evict:
+            self.logger.info(f'evicted {len(evict)} files from "{self.cache_directory}"')
+        self.logger.debug(f'cache usage: {self.usage}')
+
+    async def collect(self) -> List[Tuple[Path, int, float]]:
+        """return path, size and last access time of every file in the cache directory"""
+        files: List[Tuple[Path, int, float]] = []
+        directories = [self.cache_directory]
+        while directories:
+            directory = directories.pop()
+            directory_files, subdirectories = await asyncio.to_thread(self._scan, directory)
+            files.extend(directory_files)
+            directories.extend(subdirectories)
+        return files
+
+    def _scan(self, directory: Path) -> Tuple[List[Tuple[Path, int, float]], List[Path]]:
+        files = []
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(Path(entry.path))
+                        elif entry.is_file(follow_symlinks=False):
+                            path = Path(entry.path)
+                            stat = entry.stat(follow_symlinks=False)
+                            accessed = max(stat.st_atime, stat.st_mtime, self.usage.last_access.get(path, 0))
+                            files.append((path, stat.st_size, accessed))
+                    except OSError:
+                        continue
+        except OSError as e:
+            self.logger.debug(f'failed to scan "{directory}": {e}')
+        return files, subdirectories
+
+    def _remove(self, files: List[Tuple[Path, int]]) -> List[Tuple[Path, int]]:
+        removed = []
+        for path, size in files:
+            try:
+                path.unlink()
+                removed.append((path, size))
+            except FileNotFoundError:
+                removed.append((path, 0))
+            except OSError as e:
+                self.logger.warning(f'failed to remove "{path}": {e}')
+        return removed
+
+
 class FileCache:
     """
     Provide interface to store and retrieve url content locally
@@ -115,6 +357,9 @@ class FileCache:
         self.cache_directory = cache_directory.resolve()
         self.partial_file_suffix = partial_file_suffix
         self.logger = logging.getLogger('cache')
+        self.index = CacheIndex(self.RENAME_SUFFIX, partial_file_suffix)
+        self.usage = CacheUsage.for_directory(self.cache_directory)
+        self.usage.indexes.add(self.index)
 
     @staticmethod
     def _field_name_by_value(record: Record, value: Any, default='default') -> str:
@@ -140,6 +385,10 @@ class FileCache:
     def retrieve(self, record: Record, url: str) -> Optional[Path]:
         path = self.filename_for(record, url)
         file = self._find_file(path, url)
+        if file is not None:
+            self.usage.hit(file)
+        else:
+            self.usage.miss()
         return file
 
     async def store(self, logger: logging.Logger, client: HttpClient,
@@ -151,9 +400,14 @@ class FileCache:
         copied to cache directory instead of downloading"""
         store_path = self.filename_for(record, url)
         file = self._find_file(store_path, url)
+        if file is not None and not file.exists():
+            self.index.forget(file)
+            file = self._find_file(store_path, url)
         if file and not has_expired(file, replace_after):
             self.logger.debug(f'reusing stored file "{file}" for "{url}"')
+            self.usage.hit(file)
             return file
+        self.usage.miss()
         store_path = find_free_suffix(store_path, self.RENAME_SUFFIX)
         try:
             store_path.parent.mkdir(parents=True, exist_ok=True)
@@ -164,6 +418,7 @@ class FileCache:
             logger.debug(f'reusing external file "{external_path}" for "{url}"')
             try:
                 shutil.copy2(external_path, store_path)
+                self.index.add(store_path)
                 return store_path
             except OSError as e:
                 logger.warning(f'failed to copy external file "{external_path}" to "{store_path}", downloading')
@@ -179,6 +434,7 @@ class FileCache:
         try:
             logger.debug(f'moving "{temp_path}" to "{final_path}"')
             os.replace(temp_path, final_path)
+            self.index.add(final_path)
             return final_path
         except Exception as e:
             message = f'failed to move file "{temp_path}" to desired location "{final_path}": {e}'
@@ -187,7 +443,7 @@ class FileCache:
 
     def _find_file(self, path: Path, url: str) -> Optional[Path]:
         """given path to a file without extension, find and return existing file"""
-        files = find_with_suffix(path, self.RENAME_SUFFIX)
+        files = [item.path for item in self.index.lookup(path)]
         if len(files) == 1:
             file = files[0]
             self.logger.debug(f'url "{url} is stored at "{file}"')
@@ -100,7 +100,8 @@ class Chain:
                 this.logger = self.logger.getChild('handler')
 
             def __call__(this, producer_topic: str, record: Record):
-                this.logger.debug(f'Chain({self.name}): from {producer_topic} to {topic} forwarding record "{record!r}"')
+                if this.logger.isEnabledFor(logging.DEBUG):
+                    this.logger.debug(f'Chain({self.name}): from {producer_topic} to {topic} forwarding record "{record!r}"')
                 self.bus.pub(topic, record)
 
             def __repr__(this):
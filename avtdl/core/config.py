@@ -8,9 +8,11 @@ from pydantic import BaseModel, ConfigDict, Field, RootModel, ValidationError, c
 from avtdl.core import utils
 from avtdl.core.actors import Actor
 from avtdl.core.chain import Chain, ChainConfigSection
+from avtdl.core.executor import DEFAULT_WORKERS, ExecutorKind, configure_parse_executor
 from avtdl.core.loggers import LogLevel, override_loglevel, setup_file_logger, setup_webserver_logger
 from avtdl.core.plugins import Plugins
 from avtdl.core.runtime import RuntimeContext
+from avtdl.core.scheduler import DEFAULT_CONCURRENCY, DEFAULT_CONCURRENCY_PER_HOST, DEFAULT_JITTER, DEFAULT_SLOT_TIMEOUT, PollScheduler
 from avtdl.core.utils import format_validation_error
 
 
@@ -52,8 +54,24 @@ class SettingsSection(BaseModel):
     cache_directory: Path = Field(default='cache/cache/', validate_default=True)
     """directory used for storing pre-downloaded images and other resources, used to display records in the web-interface.
     Send records through the "cache" plugin to download and store resources it references"""
+    cache_max_size: Optional[int] = Field(gt=0, default=None)
+    """maximum total size of files in the cache directory, in bytes. When exceeded, least recently used files are removed. Leave empty to not limit the size"""
+    cache_max_age: Optional[float] = Field(gt=0, default=None)
+    """files in the cache directory that were not used for this many hours are removed. Leave empty to keep files indefinitely"""
     state_directory: Path = Field(default='cache/state/', validate_default=True)
     """directory used to store certain parts of the internal state of the application between restarts"""
+    parse_executor: ExecutorKind = ExecutorKind.THREAD
+    """where parsing of large feeds and pages is performed, "thread" or "process". Process pool fully isolates the rest of the application from the parsing cost, at the price of higher memory usage"""
+    parse_workers: int = Field(gt=0, default=DEFAULT_WORKERS)
+    """maximum number of feeds and pages being parsed simultaneously"""
+    poll_concurrency: int = Field(gt=0, default=DEFAULT_CONCURRENCY)
+    """maximum number of monitor updates running at the same time. Updates that are due when the limit is reached wait for one of the running updates to finish"""
+    poll_concurrency_per_host: int = Field(gt=0, default=DEFAULT_CONCURRENCY_PER_HOST)
+    """maximum number of monitor updates running at the same time for entities using the same server"""
+    poll_jitter: float = Field(ge=0, lt=1, default=DEFAULT_JITTER)
+    """each delay between monitor updates is randomly changed by up to this fraction of the update interval, so that updates of different entities don't happen at the same moment"""
+    poll_slot_timeout: float = Field(gt=0, default=DEFAULT_SLOT_TIMEOUT)
+    """monitor update that takes longer than this many seconds, for example waiting for a rate limit or a slow server, stops counting towards "poll_concurrency" and "poll_concurrency_per_host" limits, so it can't delay updates of other entities"""
 
     @field_validator('cache_directory')
     @classmethod
@@ -65,6 +83,15 @@ class SettingsSection(BaseModel):
             raise ValueError(f'check path "{path}" exists and is a writeable directory')
 
 
+def configure_executors(settings: SettingsSection):
+    configure_parse_executor(settings.parse_executor, settings.parse_workers)
+
+
+def configure_scheduler(settings: SettingsSection, scheduler: PollScheduler):
+    scheduler.configure(settings.poll_concurrency, settings.poll_concurrency_per_host, settings.poll_jitter,
+                        settings.poll_slot_timeout)
+
+
 def configure_loggers(settings: SettingsSection):
     override_loglevel(settings.loglevel_override)
     setup_file_logger(path=settings.log_directory, max_size=settings.logfile_size, level=settings.logfile_level)
@@ -184,6 +211,8 @@ class ConfigParser:
 
         ctx.set_extra('settings', config.settings)
         configure_loggers(config.settings)
+        configure_executors(config.settings)
+        configure_scheduler(config.settings, ctx.controller.scheduler)
         Plugins.load()
 
         # after that entities transformation and specific plugins validation can be safely performed
@@ -1,3 +1,4 @@
+import copy
 import http.cookiejar
 import http.cookies
 import logging
@@ -11,18 +12,32 @@ import aiohttp
 import curl_cffi
 from aiohttp.abc import AbstractCookieJar
 
-from avtdl.core.utils import parse_to_date_string, parse_to_timestamp
+from avtdl.core.utils import ParsedFileCache, parse_to_date_string, parse_to_timestamp
+
+
+def read_cookies(path: Path) -> cookiejar.MozillaCookieJar:
+    """parse a text file with cookies in Netscape format, raising on failure"""
+    cookie_jar = cookiejar.MozillaCookieJar(path)
+    cookie_jar.load(ignore_discard=True, ignore_expires=True)
+    logging.getLogger('cookies').info(f"Successfully loaded cookies from {path}")
+    return cookie_jar
+
+
+cookies_files: ParsedFileCache[cookiejar.MozillaCookieJar] = ParsedFileCache(read_cookies)
 
 
 def load_cookies(path: Optional[Path], raise_on_error: bool = False) -> Optional[cookiejar.CookieJar]:
-    """load cookies from a text file in Netscape format"""
+    """
+    load cookies from a text file in Netscape format
+
+    The file is only parsed again after it has changed. Every call
+    returns a new cookie jar, that can be modified by the caller.
+    """
     logger = logging.getLogger('cookies')
     if path is None:
         return None
-    cookie_jar = cookiejar.MozillaCookieJar(path)
     try:
-        cookie_jar.load(ignore_discard=True, ignore_expires=True)
-        logger.info(f"Successfully loaded cookies from {path}")
+        parsed_jar = cookies_files.get(path)
     except FileNotFoundError:
         logger.exception(f'Failed to load cookies from {path}: file not found')
         if raise_on_error:
@@ -33,6 +48,9 @@ def load_cookies(path: Optional[Path], raise_on_error: bool = False) -> Optional
             raise
         logger.exception(f'Failed to load cookies from {path}: {e}')
         return None
+    cookie_jar = cookiejar.MozillaCookieJar(path)
+    for cookie in parsed_jar:
+        cookie_jar.set_cookie(copy.copy(cookie))
     return cookie_jar
 
 
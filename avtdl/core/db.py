@@ -1,16 +1,45 @@
+import asyncio
+import base64
 import datetime
+import functools
+import json
 import logging
 import math
 import sqlite3
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, TypeVar, Union
 
 from pydantic import Field, field_validator, model_validator
 
 from avtdl.core.actors import ActorConfig
-from avtdl.core.interfaces import AbstractRecordsStorage, Record, get_record_type
+from avtdl.core.interfaces import AbstractRecordsStorage, Record, RecordsPage, get_record_type
+from avtdl.core.metrics import Histogram
 from avtdl.core.utils import check_dir
 
+SQLITE_QUERY_DURATION = Histogram('avtdl_sqlite_query_duration_seconds', 'Duration of records database queries',
+                                  ['query'], buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+
+
+def synchronized(method):
+    """serialize calls to decorated method of BaseRecordDB, allowing to use it from multiple threads"""
+    query = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self: 'BaseRecordDB', *args, **kwargs):
+        with self.lock:
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                SQLITE_QUERY_DURATION.observe(query, value=time.perf_counter() - started)
+
+    return wrapper
+
 
 class BaseRecordDB:
     table_name = 'records'
@@ -21,14 +50,27 @@ class BaseRecordDB:
     group_id_field = 'feed_name'
     sorting_field = 'parsed_at'
 
+    MAX_PENDING_ROWS = 1000
+    MAX_QUERY_PARAMETERS = 500
+
     def __init__(self, db_path: Union[str, Path], logger: Optional[logging.Logger] = None):
         self.logger = logger or logging.getLogger('RecordDB')
+        self.lock = threading.RLock()
+        self.deferred_commit = False
+        """when enabled, store() does not commit, leaving it to the periodic commit() calls"""
+        self.pending_rows = 0
+        self.sizes: Dict[Optional[str], int] = {}
+        """cached number of rows, total (under None key) and per group"""
+        self.data_version: Optional[int] = None
         try:
             if not db_path == ':memory:' and not Path(db_path).exists():
                 check_dir(Path(db_path).parent)
-            self.db = sqlite3.connect(db_path)
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
             self.db.row_factory = sqlite3.Row
             self.cursor = self.db.cursor()
+            if not db_path == ':memory:':
+                self.cursor.execute('PRAGMA journal_mode=WAL')
+            self.cursor.execute('PRAGMA synchronous=NORMAL')
             self.cursor.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(self.table_name, self.table_structure))
             self.db.commit()
         except sqlite3.OperationalError as e:
@@ -38,11 +80,13 @@ class BaseRecordDB:
         self.logger.debug(f'successfully connected to sqlite database at "{db_path}"')
         self.create_indexes()
 
+    @synchronized
     def create_indexes(self):
         queries = [
             f'CREATE INDEX IF NOT EXISTS `index_{self.group_id_field}` ON `{self.table_name}` (`{self.group_id_field}`);',
             f'CREATE INDEX IF NOT EXISTS `index_{self.sorting_field}` ON `{self.table_name}` ( `{self.sorting_field}`)',
-            f'CREATE INDEX IF NOT EXISTS `index_{self.id_field}_{self.sorting_field}` ON `{self.table_name}` ( `{self.id_field}`, `{self.sorting_field}` )'
+            f'CREATE INDEX IF NOT EXISTS `index_{self.id_field}_{self.sorting_field}` ON `{self.table_name}` ( `{self.id_field}`, `{self.sorting_field}` )',
+            f'CREATE INDEX IF NOT EXISTS `index_{self.group_id_field}_{self.sorting_field}` ON `{self.table_name}` ( `{self.group_id_field}`, `{self.sorting_field}` )'
         ]
         for query in queries:
             try:
@@ -52,14 +96,45 @@ class BaseRecordDB:
                 self.logger.exception(f'failed to create index: {e}. Raw query: {query}')
         self.db.commit()
 
+    @synchronized
     def store(self, rows: Union[Dict[str, Any], List[Dict[str, Any]]], replace: bool = False) -> None:
         on_conflict = 'REPLACE' if replace else 'IGNORE'
         sql = "INSERT OR {} INTO {} VALUES({})".format(on_conflict, self.table_name, self.row_structure)
         if not isinstance(rows, list):
             rows = [rows]
         self.cursor.executemany(sql, rows)
-        self.db.commit()
+        self.update_sizes(rows, self.cursor.rowcount, replace)
+        self.pending_rows += len(rows)
+        if not self.deferred_commit or self.pending_rows >= self.MAX_PENDING_ROWS:
+            self.commit()
+
+    def update_sizes(self, rows: List[Dict[str, Any]], added: int, replace: bool) -> None:
+        """adjust cached number of rows after storing rows, dropping it if the number of added rows is not known"""
+        groups = {row.get(self.group_id_field) for row in rows}
+        if replace or len(groups) != 1 or added < 0:
+            for group in groups | {None}:
+                self.sizes.pop(group, None)
+            return
+        for group in groups | {None}:
+            if group in self.sizes:
+                self.sizes[group] += added
+
+    def drop_outdated_sizes(self) -> None:
+        """forget cached number of rows if the database was modified by another connection"""
+        self.cursor.execute('PRAGMA data_version')
+        data_version = self.cursor.fetchone()[0]
+        if data_version != self.data_version:
+            self.sizes.clear()
+            self.data_version = data_version
+
+    @synchronized
+    def commit(self) -> None:
+        """commit pending changes, if there are any"""
+        if self.db.in_transaction:
+            self.db.commit()
+        self.pending_rows = 0
 
+    @synchronized
     def fetch_row(self, uid: Any, exact_id: Optional[str] = None) -> Optional[sqlite3.Row]:
         if exact_id is not None:
             sql = f'SELECT * FROM records WHERE {self.id_field}=:uid AND {self.exact_id_field}=:exact_id ORDER BY {self.sorting_field} DESC LIMIT 1'
@@ -69,6 +144,7 @@ class BaseRecordDB:
         self.cursor.execute(sql, keys)
         return self.cursor.fetchone()
 
+    @synchronized
     def row_exists(self, uid: Any, exact_id: Optional[str] = None) -> bool:
         if exact_id is not None:
             sql = f'SELECT 1 FROM records WHERE {self.id_field}=:uid AND {self.exact_id_field}=:exact_id LIMIT 1'
@@ -78,23 +154,44 @@ class BaseRecordDB:
         self.cursor.execute(sql, keys)
         return self.cursor.fetchone() is not None
 
+    @synchronized
+    def fetch_exact_ids(self, uids: Sequence[Any]) -> Dict[Any, Set[str]]:
+        """return mapping of given uids to sets of exact ids stored for them, uids that are not stored are omitted"""
+        exact_ids: Dict[Any, Set[str]] = defaultdict(set)
+        unique_uids = list(dict.fromkeys(uids))
+        for i in range(0, len(unique_uids), self.MAX_QUERY_PARAMETERS):
+            chunk = unique_uids[i:i + self.MAX_QUERY_PARAMETERS]
+            placeholders = ', '.join('?' * len(chunk))
+            sql = f'SELECT {self.id_field}, {self.exact_id_field} FROM {self.table_name} WHERE {self.id_field} IN ({placeholders})'
+            self.cursor.execute(sql, chunk)
+            for uid, exact_id in self.cursor.fetchall():
+                exact_ids[uid].add(exact_id)
+        return exact_ids
+
+    @synchronized
     def get_size(self, group_id: Optional[str] = None) -> int:
         '''return number of records, total or for specified feed, are stored in db'''
+        self.drop_outdated_sizes()
+        size = self.sizes.get(group_id)
+        if size is not None:
+            return size
         if group_id is None:
             sql = f'SELECT COUNT(1) FROM {self.table_name}'
         else:
             sql = f'SELECT COUNT(1) FROM {self.table_name} WHERE {self.group_id_field}=:group'
         keys = {'group': group_id}
         self.cursor.execute(sql, keys)
-        return int(self.cursor.fetchone()[0])
+        size = self.sizes[group_id] = int(self.cursor.fetchone()[0])
+        return size
 
+    @synchronized
     def get_groups(self) -> List[Tuple[str, int]]:
         sql = f'SELECT {self.group_id_field}, COUNT(1) as count FROM records GROUP BY {self.group_id_field}'
         self.cursor.execute(sql)
         rows = self.cursor.fetchall()
         return [(row[self.group_id_field], int(row['count'])) for row in rows]
 
-
+    @synchronized
     def fetch_offset(self, limit: int, offset: int, group_id: Optional[str] = None, desc: bool = True) -> List[sqlite3.Row]:
         order = 'DESC' if desc else 'ASC'
         if group_id is not None:
@@ -105,6 +202,29 @@ class BaseRecordDB:
         self.cursor.execute(sql, keys)
         return self.cursor.fetchall()
 
+    @synchronized
+    def fetch_keyset(self, limit: int, key: Optional[Tuple[str, str]], group_id: Optional[str] = None,
+                     desc: bool = True) -> List[sqlite3.Row]:
+        '''fetch up to limit rows following the row with given (sorting field, id) key, or from the start if key is None'''
+        order = 'DESC' if desc else 'ASC'
+        op = '<' if desc else '>'
+        conditions = []
+        if group_id is not None:
+            conditions.append(f'{self.group_id_field}=:group_id')
+        if key is not None:
+            # the first condition alone allows to use the index on the sorting field, the second one resolves ties
+            conditions.append(f'{self.sorting_field} {op}= :sorting_key')
+            conditions.append(f'({self.sorting_field} {op} :sorting_key OR {self.id_field} {op} :id_key)')
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        sql = f'SELECT * FROM records {where} ORDER BY {self.sorting_field} {order}, {self.id_field} {order} LIMIT :limit'
+        sorting_key, id_key = key or (None, None)
+        keys = {'group_id': group_id, 'sorting_key': sorting_key, 'id_key': id_key, 'limit': limit}
+        self.cursor.execute(sql, keys)
+        return self.cursor.fetchall()
+
+    def row_key(self, row: sqlite3.Row) -> Tuple[str, str]:
+        return row[self.sorting_field], row[self.id_field]
+
 
 def calculate_offset(page: Optional[int], per_page: int, total_rows: int) -> Tuple[int, int]:
     if total_rows == 0 or per_page == 0:
@@ -123,6 +243,42 @@ def calculate_offset(page: Optional[int], per_page: int, total_rows: int) -> Tup
     return limit, offset
 
 
+OLDEST_KEY = ('', '')
+"""key preceding all rows in the sorting order"""
+
+
+def encode_cursor(newer: bool, key: Tuple[str, str], page: int) -> str:
+    """
+    pack position of a page into an opaque string
+
+    The cursor points to rows older or newer than the row with given key,
+    page is an approximate number of the page it points to.
+    """
+    data = json.dumps([int(newer), *key, page], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[bool, Tuple[str, str], int]:
+    """unpack cursor made by encode_cursor(), raise ValueError if it is malformed"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        newer, sorting_key, id_key, page = json.loads(data)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'malformed cursor "{cursor}"') from e
+    if not isinstance(sorting_key, str) or not isinstance(id_key, str) or not isinstance(page, int):
+        raise ValueError(f'malformed cursor "{cursor}"')
+    return bool(newer), (sorting_key, id_key), page
+
+
+class RecordState(str, Enum):
+    NEW = 'new'
+    """no version of the record is stored"""
+    UPDATED = 'updated'
+    """different versions of the record are stored, but not this one"""
+    UNCHANGED = 'unchanged'
+    """this exact version of the record is stored"""
+
+
 class RecordDB(BaseRecordDB):
 
     @staticmethod
@@ -165,6 +321,20 @@ class RecordDB(BaseRecordDB):
         uid = self._get_record_id(record, entity_name)
         return self.row_exists(uid) and not self.row_exists(uid, record.hash())
 
+    def classify_records(self, records: Sequence[Record], entity_name: str) -> List[RecordState]:
+        """return state of every record compared to stored versions, making a single query for the whole batch"""
+        uids = [self._get_record_id(record, entity_name) for record in records]
+        stored = self.fetch_exact_ids(uids)
+        states = []
+        for uid, record in zip(uids, records):
+            if uid not in stored:
+                states.append(RecordState.NEW)
+            elif record.hash() in stored[uid]:
+                states.append(RecordState.UNCHANGED)
+            else:
+                states.append(RecordState.UPDATED)
+        return states
+
     def record_has_changed(self, record: Record, entity_name: str, excluded_fields: Set[str]):
         """check if the record differs from most recently stored version, not counting fields listed in excluded_fields"""
         stored_record = self.load_record(record, entity_name)
@@ -216,10 +386,89 @@ class RecordDB(BaseRecordDB):
             records = records[::-1]
         return records
 
+    def load_cursor_page(self, entity_name: Optional[str], cursor: Optional[str], per_page: int) -> RecordsPage:
+        """
+        load page of records adjacent to the position packed in the cursor, or the most recent page
+
+        Unlike load_page(), rows are looked up by the (parsed_at, uid) key of the
+        first or the last row of the previous page instead of the offset, so loading
+        a page takes the same time no matter how far it is from the newest records.
+        Since pages are not aligned to fixed offsets, page numbers are approximate.
+        """
+        total = self.page_count(entity_name, per_page)
+        key: Optional[Tuple[str, str]]
+        if cursor is None:
+            newer, key, page = False, None, total
+        else:
+            newer, key, page = decode_cursor(cursor)
+        rows = self.fetch_keyset(per_page + 1, key, entity_name, desc=not newer)
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if newer:
+            has_older, has_newer = key != OLDEST_KEY, has_more
+        else:
+            rows.reverse()
+            has_older, has_newer = has_more, key is not None
+        if not has_newer:
+            page = total
+        if not has_older:
+            page = 1
+        page = max(1, min(page, total))
+
+        records = []
+        for row in rows:
+            record = self.parse_record(row)
+            if record is not None:
+                records.append(record)
+        records_page = RecordsPage(records, page, total)
+        if rows and has_older:
+            records_page.first = encode_cursor(True, OLDEST_KEY, 1)
+            records_page.previous = encode_cursor(False, self.row_key(rows[0]), page - 1)
+        if rows and has_newer:
+            records_page.next = encode_cursor(True, self.row_key(rows[-1]), page + 1)
+        return records_page
+
     def feeds(self) -> List[Tuple[str, int]]:
         return self.get_groups()
 
 
+T = TypeVar('T')
+
+
+class AsyncRecordDB:
+    """
+    Run RecordDB queries in a dedicated thread, keeping sqlite off the event loop
+
+    While `run()` task is active, writes from all callers are grouped into
+    transactions that are committed every `commit_interval` seconds instead
+    of after every insert. Calls are executed one by one in order they were made.
+    """
+
+    COMMIT_INTERVAL: float = 1
+
+    def __init__(self, db: RecordDB, name: str = 'db', commit_interval: float = COMMIT_INTERVAL):
+        self.db = db
+        self.commit_interval = commit_interval
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    async def call(self, func: Callable[..., T], *args: Any) -> T:
+        """call func(*args) in the database thread and return the result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def run(self) -> None:
+        """commit pending writes periodically until cancelled, then commit the rest"""
+        self.db.deferred_commit = True
+        try:
+            while True:
+                await asyncio.sleep(self.commit_interval)
+                await self.call(self.db.commit)
+        finally:
+            self.db.deferred_commit = False
+            self.db.commit()
+            self.executor.shutdown(wait=False)
+
+
 class BaseDbConfig(ActorConfig):
     db_path: Union[Path, str] = Field(default='db/', validate_default=True)
     """path to the sqlite database file keeping history of old records.
@@ -264,3 +513,6 @@ class RecordDbView(AbstractRecordsStorage):
 
     def load_page(self, page: Optional[int], per_page: int, desc: bool = True, feed: Optional[str] = None) -> List[Record]:
         return self.db.load_page(feed, page, per_page, desc)
+
+    def load_cursor_page(self, cursor: Optional[str], per_page: int, feed: Optional[str] = None) -> RecordsPage:
+        return self.db.load_cursor_page(feed, cursor, per_page)
@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar('T')
+
+DEFAULT_WORKERS = 2
+
+
+class ExecutorKind(str, Enum):
+    THREAD = 'thread'
+    PROCESS = 'process'
+
+
+class ParseExecutor:
+    """
+    Bounded pool of workers for CPU-heavy parsing of feeds and pages
+
+    Parsing a large document on the event loop blocks every other monitor until
+    it is done. Plugins submit such jobs with `run()` instead. Thread workers
+    release the loop whenever the parser releases GIL or gets preempted, process
+    workers isolate the loop from the parsing cost completely, but require the
+    job function, its arguments and the result to be picklable, so the function
+    must be defined on the module level or be a class- or staticmethod.
+    """
+
+    def __init__(self, kind: ExecutorKind = ExecutorKind.THREAD, workers: int = DEFAULT_WORKERS):
+        self.kind = kind
+        self.workers = workers
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == ExecutorKind.PROCESS:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='parser')
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """run func(*args) in the pool and return the result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_parse_executor = ParseExecutor()
+
+
+def configure_parse_executor(kind: ExecutorKind, workers: int) -> None:
+    """replace the shared executor used by run_parser(), shutting down the old one"""
+    global _parse_executor
+    _parse_executor.shutdown()
+    _parse_executor = ParseExecutor(kind, workers)
+    logging.getLogger('executor').debug(f'parsing jobs will run in {kind.value} pool with {workers} workers')
+
+
+def get_parse_executor() -> ParseExecutor:
+    return _parse_executor
+
+
+async def run_parser(func: Callable[..., T], *args) -> T:
+    """run CPU-heavy func(*args) in the shared parse executor"""
+    return await _parse_executor.run(func, *args)
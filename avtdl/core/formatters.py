@@ -1,11 +1,12 @@
 import dataclasses
 import datetime
+import functools
 import logging
 import re
 from email.utils import mktime_tz
 from enum import Enum
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 import lxml.html
 
@@ -43,6 +44,8 @@ def html_from_string(html: str, base_url: Optional[str] = None) -> lxml.html.Htm
 def html_to_text(html: str, base_url: Optional[str] = None, markdown: bool = False, strip_img: bool = False) -> str:
     """Take html fragment, try to parse it and convert to text using lxml
     Convert links to markdown representation if markdown is True"""
+    if not html:
+        return html
     try:
         root = html_from_string(html, base_url)
     except Exception:
@@ -60,32 +63,62 @@ class Context:
     code: bool = False # inside <code>
 
 
-def html_to_text2(elem: lxml.html.HtmlElement, ctx: Context) -> List[str]:
+class _Frame:
+    """State of an element being converted by html_to_text2()"""
+    __slots__ = ('elem', 'ctx', 'block', 'children', 'pending')
+
+    def __init__(self, elem: lxml.html.HtmlElement, ctx: Context):
+        # markdown code block formatting is only applied to outermost <pre> or <code>
+        self.block = elem.tag in ('pre', 'code') and not ctx.plaintext and not ctx.code and not ctx.pre
+        if elem.tag == 'pre' or elem.tag == 'code':
+            ctx = dataclasses.replace(ctx, **{elem.tag: True})
+        if elem.tag == 'a':
+            ctx = dataclasses.replace(ctx, a=True)
+        self.elem = elem
+        self.ctx = ctx
+        self.children: List[str] = []
+        self.pending = elem.iterchildren()
+
+
+def html_to_text2(root: lxml.html.HtmlElement, ctx: Context) -> List[str]:
+    """Convert element tree into a list of text nodes
+
+    Tree is walked depth-first using explicit stack instead of recursion,
+    so deeply nested documents don't hit the recursion limit"""
+    stack = [_Frame(root, ctx)]
+    while True:
+        frame = stack[-1]
+        child = next(frame.pending, None)
+        if child is not None:
+            stack.append(_Frame(child, frame.ctx))
+            continue
+        stack.pop()
+        nodes = element_to_text(frame)
+        if not stack:
+            return nodes
+        stack[-1].children.extend(nodes)
+
+
+def element_to_text(frame: _Frame) -> List[str]:
+    """Produce text nodes of an element, which children are already converted"""
+    elem, ctx, children = frame.elem, frame.ctx, frame.children
     before = None
     after = None
     text = elem.text
     tail = elem.tail
-    children = None
 
-    if elem.tag == 'pre' or elem.tag == 'code':
-        if not ctx.plaintext and not ctx.code and not ctx.pre:
-            ctx = dataclasses.replace(ctx, **{elem.tag: True})
-            children = children_to_text2(elem, ctx)
-            if elem.tag == 'pre' or is_multiline(elem, children):
-                before = after = '```'
-            else:
-                before = after = '`'
-        ctx = dataclasses.replace(ctx, **{elem.tag: True})
+    if frame.block:
+        if elem.tag == 'pre' or is_multiline(elem, children):
+            before = after = '```'
+        else:
+            before = after = '`'
     if elem.tag == 'p':
         after = '\n\n'
     if elem.tag == 'br':
         after = '\n'
     if elem.tag == 'a':
-        ctx = dataclasses.replace(ctx, a=True)
         href = elem.get('href')
         if href is not None:
-            children = children_to_text2(elem, ctx)
-
             text_is_empty = not elem.text and (not children or not any(children))
             if text_is_empty: # link has no content, likely because it contained now stripped image
                 children = [href]
@@ -109,8 +142,6 @@ def html_to_text2(elem: lxml.html.HtmlElement, ctx: Context) -> List[str]:
                     else:
                         after = f'\n[{text}]({src})\n'
 
-    if children is None:
-        children = children_to_text2(elem, ctx)
     if not ctx.plaintext and not (ctx.pre or ctx.code or ctx.a):
         if text is not None:
             text = escape_markdown(text)
@@ -137,14 +168,6 @@ def is_multiline(elem: lxml.html.HtmlElement, children: List[str]) -> bool:
     return False
 
 
-def children_to_text2(elem: lxml.html.HtmlElement, ctx: Context) -> List[str]:
-    nodes = []
-    for child in elem.iterchildren():
-        child_nodes = html_to_text2(child, ctx=ctx)
-        nodes.extend(child_nodes)
-    return nodes
-
-
 def escape_markdown(text: str) -> str:
     """Escape markdown special characters"""
     escaped = re.sub(r'([\\`*_{}\[\]()#+-.!])', r'\\\1', text)
@@ -153,11 +176,13 @@ def escape_markdown(text: str) -> str:
 
 def html_images(html: str, base_url: Optional[str]) -> List[str]:
     """take html fragment, try to parse it and extract image links"""
+    if not html:
+        return []
     try:
         root = html_from_string(html, base_url)
     except Exception:
         return []
-    images = [elem.get('src') for elem in root.iter() if elem.tag == 'img' and elem.get('src')]
+    images = [elem.get('src') for elem in root.iter('img') if elem.get('src')]
     return images
 
 
@@ -173,38 +198,83 @@ class OutputFormat(str, Enum):
         return item in cls.__members__.values()
 
 
-class Fmt:
-    """Helper class to interpolate format string from config using data from Record"""
+class Template:
+    """
+    Format string from config, parsed once into literal text and placeholders
 
-    @classmethod
-    def format(cls, fmt: str, record: Record, missing: Optional[str] = None, tz: Optional[datetime.tzinfo] = None,
+    Literal parts have current date directives preprocessed, and the list of
+    record fields referenced by placeholders is known in advance, so formatting
+    only serializes these fields instead of the whole record.
+    """
+    PLACEHOLDER_PATTERN = re.compile(r'({[^{}\\]+})')
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        parts = self.PLACEHOLDER_PATTERN.split(Fmt.escape_strftime(fmt))
+        # odd items are placeholders, even items are literal text between them
+        self.literals: List[str] = parts[::2]
+        self.placeholders: List[str] = parts[1::2]
+        self.fields: List[str] = [placeholder.strip('{}') for placeholder in self.placeholders]
+        self.include: Set[str] = set(self.fields)
+        self.uses_date = '%' in fmt
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.fmt!r})'
+
+    def format(self, record: Record, missing: Optional[str] = None, tz: Optional[datetime.tzinfo] = None,
                sanitize: bool = False, extra: Optional[Dict[str, Any]] = None) -> str:
-        """Take string with placeholders like {field} and replace them with record fields"""
-        logger = logging.getLogger().getChild('format')
-        result = cls.strftime(fmt, datetime.datetime.now(tz))
-        record_as_dict = record.model_dump()
-        if extra is not None:
-            record_as_dict.update(extra)
-        placeholders: List[str] = re.findall(r'({[^{}\\]+})', fmt)
-        for placeholder in placeholders:
-            field = placeholder.strip('{}')
-
-            value = record_as_dict.get(field)
+        literals = self.literals
+        if self.uses_date:
+            now = datetime.datetime.now(tz)
+            literals = [Fmt.strftime_escaped(literal, now) for literal in literals]
+        if self.fields:
+            values = record.model_dump(include=self.include)
+            if extra is not None:
+                values.update(extra)
+        else:
+            values = {}
+        chunks: List[str] = []
+        for literal, placeholder, field in zip(literals, self.placeholders, self.fields):
+            chunks.append(self.unescape(literal))
+            value = values.get(field)
             if value is None and OutputFormat.contains(field):
-                value = cls.save_as(record, field)  # type: ignore
+                value = Fmt.save_as(record, field)  # type: ignore
 
             if value is not None:
-                value = cls.format_value(value, sanitize)
-                result = result.replace(placeholder, value)
+                chunks.append(Fmt.format_value(value, sanitize))
             else:
                 if missing is not None:
-                    result = result.replace(placeholder, missing)
+                    chunks.append(missing)
                 else:
+                    logger = logging.getLogger().getChild('format')
                     logger.warning(
-                        f'placeholder "{placeholder}" used by format string "{fmt}" is not a field of {record.__class__.__name__} ({record!r}), resulting command is unlikely to be valid')
-        result = result.replace(r'\{', '{')
-        result = result.replace(r'\}', '}')
-        return result
+                        f'placeholder "{placeholder}" used by format string "{self.fmt}" is not a field of {record.__class__.__name__} ({record!r}), resulting command is unlikely to be valid')
+                    chunks.append(placeholder)
+        chunks.append(self.unescape(literals[-1]))
+        return ''.join(chunks)
+
+    @staticmethod
+    def unescape(text: str) -> str:
+        if '\\' in text:
+            text = text.replace(r'\{', '{')
+            text = text.replace(r'\}', '}')
+        return text
+
+
+class Fmt:
+    """Helper class to interpolate format string from config using data from Record"""
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def compile(cls, fmt: str) -> Template:
+        """return parsed format string, cached for repeated use"""
+        return Template(fmt)
+
+    @classmethod
+    def format(cls, fmt: str, record: Record, missing: Optional[str] = None, tz: Optional[datetime.tzinfo] = None,
+               sanitize: bool = False, extra: Optional[Dict[str, Any]] = None) -> str:
+        """Take string with placeholders like {field} and replace them with record fields"""
+        return cls.compile(fmt).format(record, missing, tz, sanitize, extra)
 
     @classmethod
     def format_value(cls, value: Any, sanitize: bool = False) -> str:
@@ -237,8 +307,19 @@ class Fmt:
 
     @classmethod
     def strftime(cls, fmt: str, dt: datetime.datetime) -> str:
+        return cls.strftime_escaped(cls.escape_strftime(fmt), dt)
+
+    @classmethod
+    def escape_strftime(cls, fmt: str) -> str:
+        """escape percent signs not followed by a supported strftime directive"""
         if '%' in fmt:
             fmt = re.sub(r'(%[^aAwdbBmyYHIpMSfzZjUWcxX%GuV])', r'%\1', fmt)
+        return fmt
+
+    @classmethod
+    def strftime_escaped(cls, fmt: str, dt: datetime.datetime) -> str:
+        if '%' not in fmt:
+            return fmt
         try:
             return dt.strftime(fmt)
         except ValueError as e:
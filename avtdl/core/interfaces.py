@@ -3,11 +3,12 @@ import datetime
 import json
 import logging
 from abc import abstractmethod
+from dataclasses import dataclass
 from hashlib import sha1
 from textwrap import shorten
 from typing import Any, Dict, List, Optional, Tuple, Union
 
-from pydantic import BaseModel, ConfigDict, Field, SerializeAsAny, field_validator, model_validator
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, SerializeAsAny, field_validator, model_validator
 
 MAX_REPR_LEN = 60
 
@@ -17,7 +18,15 @@ def utcnow() -> datetime.datetime:
 
 
 class Record(BaseModel):
-    '''Data entry, passed around from Monitors to Actions through Filters'''
+    '''Data entry, passed around from Monitors to Actions through Filters
+
+    Once published, a record instance might be shared between multiple
+    chains and consumers, so it should be treated as a read-only snapshot.
+    Use `evolve()` to get a copy with some fields changed.
+
+    Canonical json representation and hash of the record are calculated once
+    and cached. The cache is dropped when a field is assigned, but not when
+    a mutable field value, such as a list, is modified in place.'''
 
     model_config = ConfigDict(use_attribute_docstrings=True)
 
@@ -31,6 +40,9 @@ class Record(BaseModel):
     class_name: str = Field(default='', validate_default=True, exclude=True)
     """class name of specific Record implementation, used for deserialization"""
 
+    _json: Optional[str] = PrivateAttr(default=None)
+    _hash: Optional[str] = PrivateAttr(default=None)
+
     @field_validator('class_name')
     @classmethod
     def set_class_name(cls, _: str) -> str:
@@ -51,7 +63,34 @@ class Record(BaseModel):
     def __eq__(self, other) -> bool:
         if not isinstance(other, Record):
             return NotImplemented
-        return self.model_dump() == other.model_dump()
+        return self.as_json() == other.as_json()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if self._is_serialized(name):
+            self._drop_cache()
+
+    @classmethod
+    def _is_serialized(cls, name: str) -> bool:
+        """return False for private and excluded fields, that don't affect as_json() output"""
+        if name.startswith('_'):
+            return False
+        field = cls.model_fields.get(name)
+        return field is None or not field.exclude
+
+    def _drop_cache(self) -> None:
+        self._json = None
+        self._hash = None
+
+    def model_copy(self, *, update: Optional[Dict[str, Any]] = None, deep: bool = False) -> 'Record':
+        record_copy = super().model_copy(update=update, deep=deep)
+        if update and any(self._is_serialized(name) for name in update):
+            record_copy._drop_cache()
+        return record_copy
+
+    def evolve(self, **changes: Any) -> 'Record':
+        """return a shallow copy of the record with given fields replaced"""
+        return self.model_copy(update=changes)
 
     def get_uid(self) -> str:
         '''A string that is the same for different versions of the same record'''
@@ -68,6 +107,13 @@ class Record(BaseModel):
         return record_copy
 
     def as_json(self, indent: Union[int, str, None] = None) -> str:
+        if indent is not None:
+            return self._serialize(indent)
+        if self._json is None:
+            self._json = self._serialize()
+        return self._json
+
+    def _serialize(self, indent: Union[int, str, None] = None) -> str:
         return json.dumps(self.model_dump(), sort_keys=True, ensure_ascii=False, default=str, indent=indent)
 
     def as_embed(self) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
@@ -84,8 +130,9 @@ class Record(BaseModel):
         return {'title': title, 'description': description}
 
     def hash(self) -> str:
-        record_hash = sha1(self.as_json().encode())
-        return record_hash.hexdigest()
+        if self._hash is None:
+            self._hash = sha1(self.as_json().encode()).hexdigest()
+        return self._hash
 
 
 all_known_record_types: Dict[str, type[Record]] = {}
@@ -165,6 +212,23 @@ class OpaqueRecord(Record):
         return f'{self.__class__.__name__}({fields})'
 
 
+@dataclass
+class RecordsPage:
+    """Page of stored records, loaded relative to a cursor"""
+    records: List[Record]
+    """records of the page, oldest first"""
+    current: int
+    """approximate number of the page, counting from the oldest records"""
+    total: int
+    """total number of pages"""
+    first: Optional[str] = None
+    """cursor pointing to the page with the oldest records, unless it is this page"""
+    previous: Optional[str] = None
+    """cursor pointing to the page with older records, if there are any"""
+    next: Optional[str] = None
+    """cursor pointing to the page with newer records, if there are any"""
+
+
 class AbstractRecordsStorage(abc.ABC):
     """Interface for accessing persistent records storage from web ui"""
 
@@ -180,3 +244,7 @@ class AbstractRecordsStorage(abc.ABC):
     def load_page(self, page: Optional[int], per_page: int, desc: bool = True, feed: Optional[str] = None) -> List[
         Record]:
         """return content of specific page as a list of Record instances"""
+
+    @abstractmethod
+    def load_cursor_page(self, cursor: Optional[str], per_page: int, feed: Optional[str] = None) -> RecordsPage:
+        """return page pointed to by a cursor from previously loaded page, or the most recent page if cursor is None"""
@@ -0,0 +1,180 @@
+import asyncio
+import datetime
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from types import FrameType
+from typing import Deque, Optional, Tuple
+
+from avtdl.core.actors import Actor, ActorEntity
+from avtdl.core.interfaces import utcnow
+from avtdl.core.metrics import Counter, Histogram
+
+LOOP_LAG = Histogram('avtdl_loop_lag_seconds', 'Delay of the event loop wakeups compared to the requested time',
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+LOOP_STALLS = Counter('avtdl_loop_stalls_total', 'Number of times the event loop was blocked for longer than the threshold',
+                      ['actor', 'entity'])
+
+PACKAGE_DIRECTORY = str(Path(__file__).parent.parent)
+
+
+@dataclass
+class Stall:
+    """Single occurrence of the event loop being blocked"""
+    started_at: datetime.datetime
+    duration: float
+    """for how long the loop was blocked, in seconds"""
+    task: Optional[str] = None
+    """name of the asyncio task that was running"""
+    actor: Optional[str] = None
+    """name of the actor which code was running"""
+    entity: Optional[str] = None
+    """name of the entity the actor was handling"""
+    location: Optional[str] = None
+    """innermost line of the application code that was running"""
+
+    def __str__(self) -> str:
+        if self.actor is None and self.task is None and self.location is None:
+            return f'blocked for {self.duration:.3f} seconds by unknown code'
+        owner = f'{self.actor}:{self.entity}' if self.entity is not None else self.actor
+        parts = [f'blocked for {self.duration:.3f} seconds']
+        if owner is not None:
+            parts.append(f'by "{owner}"')
+        if self.task is not None:
+            parts.append(f'in task "{self.task}"')
+        if self.location is not None:
+            parts.append(f'at {self.location}')
+        return ' '.join(parts)
+
+
+@dataclass
+class LoopLagStats:
+    samples: int = 0
+    total_lag: float = 0
+    max_lag: float = 0
+    stalls: int = 0
+
+    def __str__(self) -> str:
+        average = self.total_lag / self.samples if self.samples else 0
+        return f'average lag {average * 1000:.1f} ms, maximum lag {self.max_lag * 1000:.1f} ms, {self.stalls} stalls'
+
+
+def describe_stack(frame: Optional[FrameType]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    return names of the actor and the entity the running code belongs to,
+    and the innermost line of the application code in the stack
+    """
+    actor: Optional[Actor] = None
+    entity: Optional[str] = None
+    location: Optional[str] = None
+    while frame is not None:
+        code = frame.f_code
+        if location is None and code.co_filename.startswith(PACKAGE_DIRECTORY):
+            location = f'{code.co_filename[len(PACKAGE_DIRECTORY) + 1:]}:{frame.f_lineno} in {code.co_name}'
+        if entity is None:
+            frame_locals = frame.f_locals
+            owner = frame_locals.get('self')
+            if isinstance(owner, Actor) and (actor is None or owner is actor):
+                actor = owner
+                candidate = frame_locals.get('entity')
+                if isinstance(candidate, ActorEntity):
+                    entity = candidate.name
+        frame = frame.f_back
+    actor_name = actor.conf.name if actor is not None else None
+    return actor_name, entity, location
+
+
+class LoopLagMonitor:
+    """
+    Measure event loop scheduling delay and find out what code was blocking the loop
+
+    A ticker task repeatedly sleeps for `interval` seconds and records how late it
+    woke up. A watchdog thread checks when the ticker last ran, and if the loop
+    appears to be blocked, it samples the stack of the loop thread to find the
+    running task and the actor and entity handling it. When the ticker wakes up
+    after being delayed for more than `threshold` seconds, the stall is logged,
+    counted and stored in the `stalls` history along with the sampled details.
+
+    Unlike asyncio debug mode, it doesn't slow down every callback and reports
+    the blocking code even if it's a small part of a long callback.
+    """
+
+    INTERVAL: float = 0.1
+    THRESHOLD: float = 0.5
+    HISTORY_SIZE: int = 50
+
+    def __init__(self, interval: float = INTERVAL, threshold: float = THRESHOLD, history_size: int = HISTORY_SIZE,
+                 logger: Optional[logging.Logger] = None) -> None:
+        self.logger = logger or logging.getLogger('loop')
+        self.interval = interval
+        self.threshold = threshold
+        self.stats = LoopLagStats()
+        self.stalls: Deque[Stall] = deque(maxlen=history_size)
+        self.heartbeat: float = time.perf_counter()
+        """time the ticker task last started waiting"""
+        self._sample: Optional[Tuple[float, Stall]] = None
+        """details of the stall collected by the watchdog, along with the heartbeat it was collected for"""
+        self._stopped = threading.Event()
+
+    async def run(self) -> None:
+        """measure loop lag until cancelled"""
+        loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self.heartbeat = time.perf_counter()
+        watchdog = threading.Thread(target=self._watch, args=(loop, threading.get_ident()),
+                                    name='loop watchdog', daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                self.heartbeat = heartbeat = time.perf_counter()
+                await asyncio.sleep(self.interval)
+                lag = max(time.perf_counter() - heartbeat - self.interval, 0)
+                self.record(lag, heartbeat)
+        finally:
+            self._stopped.set()
+
+    def record(self, lag: float, heartbeat: float) -> None:
+        LOOP_LAG.observe(value=lag)
+        self.stats.samples += 1
+        self.stats.total_lag += lag
+        self.stats.max_lag = max(self.stats.max_lag, lag)
+        if lag < self.threshold:
+            return
+        started_at = utcnow() - datetime.timedelta(seconds=lag)
+        sample = self._sample
+        if sample is not None and sample[0] == heartbeat:
+            stall = sample[1]
+            stall.started_at = started_at
+            stall.duration = lag
+        else:
+            stall = Stall(started_at, lag)
+        self.stats.stalls += 1
+        self.stalls.append(stall)
+        LOOP_STALLS.inc(stall.actor or '', stall.entity or '')
+        self.logger.warning(f'event loop was {stall}')
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread: int) -> None:
+        """sample what the loop thread is doing when the ticker is late, run in a separate thread"""
+        while not self._stopped.wait(self.interval / 2):
+            heartbeat = self.heartbeat
+            if time.perf_counter() - heartbeat < self.interval + self.threshold / 2:
+                continue
+            sample = self._sample
+            if sample is not None and sample[0] == heartbeat:
+                continue
+            try:
+                self._sample = (heartbeat, self.inspect(loop, loop_thread))
+            except Exception:
+                self.logger.debug('failed to inspect blocked event loop', exc_info=True)
+
+    @staticmethod
+    def inspect(loop: asyncio.AbstractEventLoop, loop_thread: int) -> Stall:
+        frame = sys._current_frames().get(loop_thread)
+        actor, entity, location = describe_stack(frame)
+        task = asyncio.current_task(loop)
+        task_name = task.get_name() if task is not None else None
+        return Stall(utcnow(), 0, task_name, actor, entity, location)
@@ -0,0 +1,188 @@
+import abc
+import bisect
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Registry:
+    """Collection of metrics exported by the /metrics endpoint of the web interface"""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, 'Metric'] = {}
+
+    def register(self, metric: 'Metric') -> None:
+        if metric.name in self.metrics:
+            raise ValueError(f'metric "{metric.name}" is already registered')
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """return all metrics in Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(abc.ABC):
+    """
+    Base class of a metric family with a fixed set of label names
+
+    Values of labels are passed positionally, in the same order as label names.
+    Counters and gauges are cheap enough to be updated on hot paths, but are not
+    protected by a lock and should only be updated from the event loop thread.
+    Histograms might also be updated from worker threads.
+    """
+    type: str = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        if registry is not None:
+            registry.register(self)
+
+    def check_labels(self, values: LabelValues) -> LabelValues:
+        if len(values) != len(self.labels):
+            raise ValueError(f'metric "{self.name}" expects labels {self.labels}, got {values}')
+        return values
+
+    def format_labels(self, values: LabelValues, extra: Iterable[Tuple[str, str]] = ()) -> str:
+        pairs = [*zip(self.labels, values), *extra]
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + '}'
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self.render_samples())
+        return lines
+
+    @abc.abstractmethod
+    def render_samples(self) -> List[str]:
+        """return lines with current values for every combination of labels"""
+
+
+class Counter(Metric):
+    """Monotonically increasing value, such as number of processed requests"""
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY) -> None:
+        super().__init__(name, documentation, labels, registry)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        if len(labels) != len(self.labels):
+            self.check_labels(labels)
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self.values.get(self.check_labels(labels), 0)
+
+    def render_samples(self) -> List[str]:
+        values = list(self.values.items())
+        return [f'{self.name}{self.format_labels(key)} {format_value(value)}' for key, value in values]
+
+
+class Gauge(Metric):
+    """Value that can go up and down, such as a queue size"""
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY) -> None:
+        super().__init__(name, documentation, labels, registry)
+        self.values: Dict[LabelValues, float] = {}
+
+    def set(self, *labels: str, value: float) -> None:
+        key = self.check_labels(labels)
+        self.values[key] = value
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self.check_labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def get(self, *labels: str) -> float:
+        return self.values.get(self.check_labels(labels), 0)
+
+    def render_samples(self) -> List[str]:
+        values = list(self.values.items())
+        return [f'{self.name}{self.format_labels(key)} {format_value(value)}' for key, value in values]
+
+
+class HistogramValue:
+
+    def __init__(self, buckets: int) -> None:
+        self.counts = [0] * buckets
+        self.sum: float = 0
+        self.count = 0
+
+
+class Histogram(Metric):
+    """Distribution of observed values, such as request durations, counted in buckets with given upper bounds"""
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY) -> None:
+        super().__init__(name, documentation, labels, registry)
+        self.lock = threading.Lock()
+        self.buckets = sorted(buckets)
+        if not self.buckets or self.buckets[-1] != math.inf:
+            self.buckets.append(math.inf)
+        self.values: Dict[LabelValues, HistogramValue] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        key = self.check_labels(labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = HistogramValue(len(self.buckets))
+            histogram.counts[bucket] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def get_count(self, *labels: str) -> int:
+        histogram = self.values.get(self.check_labels(labels))
+        return histogram.count if histogram is not None else 0
+
+    def get_sum(self, *labels: str) -> float:
+        histogram = self.values.get(self.check_labels(labels))
+        return histogram.sum if histogram is not None else 0
+
+    def render_samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            values = [(key, list(value.counts), value.sum, value.count) for key, value in self.values.items()]
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = self.format_labels(key, [('le', format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{self.format_labels(key)} {format_value(total)}')
+            lines.append(f'{self.name}_count{self.format_labels(key)} {count}')
+        return lines
@@ -1,8 +1,10 @@
 import asyncio
 import datetime
+import functools
 import json
 import logging
 import re
+import urllib.parse
 from abc import ABC, abstractmethod
 from collections import defaultdict
 from pathlib import Path
@@ -12,11 +14,11 @@ from pydantic import Field, FilePath, PositiveFloat, field_serializer, field_val
 
 from avtdl.core.actors import ActorConfig, Monitor, MonitorEntity
 from avtdl.core.cookies import load_cookies
-from avtdl.core.db import BaseDbConfig, RecordDB, RecordDbView
+from avtdl.core.db import AsyncRecordDB, BaseDbConfig, RecordDB, RecordDbView, RecordState
 from avtdl.core.interfaces import AbstractRecordsStorage, Record, utcnow
 from avtdl.core.request import ClientPool, HttpClient, MaybeHttpResponse, RequestDetails, StateStorage, Transport
 from avtdl.core.runtime import RuntimeContext, TaskStatus
-from avtdl.core.utils import JSONType, show_diff, with_prefix
+from avtdl.core.utils import JSONType, ParsedFileCache, show_diff, with_prefix
 
 HIGHEST_UPDATE_INTERVAL = 4 * 3600
 
@@ -43,9 +45,10 @@ class BaseTaskMonitor(Monitor):
             by_group_interval[interval / len(entities)].extend(entities)
         for interval in sorted(by_group_interval.keys()):
             entities = by_group_interval[interval]
-            _ = self.controller.create_task(self.start_tasks_for(entities, interval), name=f'start_cyclic_tasks_{interval}')
+            self.schedule_tasks_for(entities, interval)
 
-    async def start_tasks_for(self, entities: List[TaskMonitorEntity], interval: float) -> None:
+    def schedule_tasks_for(self, entities: List[TaskMonitorEntity], interval: float) -> None:
+        """add entities to the scheduler, spreading the first updates evenly over the interval"""
         assert self.logger.parent is not None
         logger = self.logger.parent.getChild('scheduler').getChild(self.conf.name.replace('.', '_'))
         if len(entities) == 0:
@@ -57,49 +60,30 @@ class BaseTaskMonitor(Monitor):
         for entity in entities:
             logger.debug(f'starting task {entity.name} with {entity.update_interval} update interval in {current_task_delay}')
             info = TaskStatus(self.conf.name, entity.name)
-            _ = self.controller.create_task(
-                self.start_task(
-                    entity,
-                    delay=current_task_delay,
-                    info=info
-                ),
-                _info=info
+            self.controller.schedule(
+                f'{self.conf.name}:{entity.name}',
+                self.get_host(entity),
+                functools.partial(self.poll, entity, info),
+                functools.partial(getattr, entity, 'update_interval'),
+                delay=current_task_delay,
+                info=info
             )
             current_task_delay += interval
 
-    async def start_task(self, entity: TaskMonitorEntity, delay: float, info: TaskStatus) -> None:
-        name = f'{self.conf.name}:{entity.name}'
-        self.logger.debug(f'task "{name}" to be started after {delay}')
-        step = 10.0
-        while delay:
-            if delay > step:
-                current_step_delay = step
-                delay -= step
-            else:
-                current_step_delay = delay
-                delay = 0
-            info.set_status(f'starting in {datetime.timedelta(seconds=delay)}')
-            await asyncio.sleep(current_step_delay)
-        info.clear()
-        self.logger.info(f'starting task for {info.actor}.{info.entity}')
-        coro = self.run_for(entity, info=info)
-        _ = self.controller.create_task(coro, name=name, _info=info)
+    def get_host(self, entity: TaskMonitorEntity) -> str:
+        """key used by the scheduler to limit the number of simultaneous updates of the same source"""
+        return self.conf.name
 
     @abstractmethod
-    async def run_for(self, entity: TaskMonitorEntity, info: TaskStatus):
-        '''Task for a specific entity that should check for new records based on update_interval and call self.on_record() for each'''
+    async def poll(self, entity: TaskMonitorEntity, info: TaskStatus):
+        '''Called by the scheduler every update_interval to check for new records and call self.on_record() for each.
+        Raising an exception stops further updates of the entity'''
 
 
 class TaskMonitor(BaseTaskMonitor):
 
-    async def run_for(self, entity: TaskMonitorEntity, info: TaskStatus):
-        while True:
-            try:
-                await self.run_once(entity)
-            except Exception:
-                self.logger.exception(f'{self.conf.name}: task for entity {entity} failed, terminating')
-                break
-            await asyncio.sleep(entity.update_interval)
+    async def poll(self, entity: TaskMonitorEntity, info: TaskStatus):
+        await self.run_once(entity)
 
     async def run_once(self, entity: TaskMonitorEntity):
         records = await self.get_new_records(entity)
@@ -121,7 +105,7 @@ class HttpTaskMonitorEntity(TaskMonitorEntity):
     to make requests to a specific endpoint"""
     headers_file: Optional[Path] = None
     """path to a text file containing headers as "key": "value" pairs. Unlike `cookies_file`,
-    it gets read from disk on every request. Files with `.json` extension are parsed in
+    it gets checked for changes on every request and reloaded if modified. Files with `.json` extension are parsed in
     JSON format (must contain a single top-level object), other extensions are treated as 
     plaintext and expected to have one `key: value` pair per line"""
     transport: Transport = Transport.AIOHTTP
@@ -155,38 +139,59 @@ class HttpTaskMonitorEntity(TaskMonitorEntity):
         self.base_update_interval = self.update_interval
 
 
-def load_headers(path: Optional[Path], logger: logging.Logger) -> Optional[Dict[str, str]]:
-    """load HTTP headers from given file, either .json or plaintext"""
-    if path is None:
-        return None
-    try:
-        text = path.read_text()
-    except (OSError, UnicodeDecodeError) as e:
-        logger.warning(f'failed to load headers from "{path}": {e}')
-        return None
+class HeadersFileError(Exception):
+    """Raised when headers file has invalid content"""
+
+
+def parse_headers(path: Path) -> Tuple[Dict[str, str], List[str]]:
+    """
+    parse HTTP headers in given file, either .json or plaintext
+
+    Return parsed headers and descriptions of skipped malformed lines.
+    Raise HeadersFileError if json file can not be parsed.
+    """
+    text = path.read_text()
+    problems: List[str] = []
     if path.suffix == '.json':
-        logger.debug(f'loading json headers from "{path}"')
         try:
             data = json.loads(text)
         except json.JSONDecodeError as e:
-            logger.warning(f'failed to parse headers in json file "{path}": {e}')
-            return None
+            raise HeadersFileError(f'failed to parse headers in json file "{path}": {e}') from e
         if not isinstance(data, dict):
-            logger.warning(f'failed to parse headers in json file "{path}": file must contain top-level dictionary')
-            return None
+            raise HeadersFileError(f'failed to parse headers in json file "{path}": file must contain top-level dictionary')
         headers = {str(k): str(v) for k, v in data.items()}
     else:
-        logger.debug(f'loading plaintext headers from "{path}"')
         headers = {}
         for line in text.splitlines():
             if not line or line.startswith('#'):
                 continue
             if not ':' in line:
-                logger.warning(f'while parsing headers in "{path}" skipped malformed line "{line}": header name and value must be separated by semicolon')
+                problems.append(f'while parsing headers in "{path}" skipped malformed line "{line}": header name and value must be separated by semicolon')
                 continue
             key, value = re.split(r': ?', line, 1)
             headers[key] = value
-    return headers
+    return headers, problems
+
+
+headers_files: ParsedFileCache[Tuple[Dict[str, str], List[str]]] = ParsedFileCache(parse_headers)
+
+
+def load_headers(path: Optional[Path], logger: logging.Logger) -> Optional[Dict[str, str]]:
+    """load HTTP headers from given file, only reading it again after it has changed"""
+    if path is None:
+        return None
+    logger.debug(f'loading headers from "{path}"')
+    try:
+        headers, problems = headers_files.get(path)
+    except HeadersFileError as e:
+        logger.warning(str(e))
+        return None
+    except (OSError, UnicodeDecodeError) as e:
+        logger.warning(f'failed to load headers from "{path}": {e}')
+        return None
+    for problem in problems:
+        logger.warning(problem)
+    return dict(headers)
 
 
 class HttpTaskMonitor(BaseTaskMonitor):
@@ -264,14 +269,9 @@ class HttpTaskMonitor(BaseTaskMonitor):
         _ = self.controller.create_task(self.clients.ensure_closed(), name=name)
         await super().run()
 
-    async def run_for(self, entity: HttpTaskMonitorEntity, info: TaskStatus):
-        try:
-            client = self._get_client(entity)
-            while True:
-                await self.run_once(entity, client, info)
-                await asyncio.sleep(entity.update_interval)
-        except Exception:
-            self.logger.exception(f'unexpected error in task for entity {entity.name}, task terminated')
+    async def poll(self, entity: HttpTaskMonitorEntity, info: TaskStatus):
+        client = self._get_client(entity)
+        await self.run_once(entity, client, info)
 
     async def run_once(self, entity: TaskMonitorEntity, client: HttpClient, info: TaskStatus):
         records = await self.get_new_records(entity, client)
@@ -313,12 +313,15 @@ class BaseFeedMonitor(HttpTaskMonitor):
         super().__init__(conf, entities, ctx)
         self.conf: BaseFeedMonitorConfig = conf
         self.db = RecordDB(conf.db_path, logger=self.logger.getChild('db'))
+        self.async_db = AsyncRecordDB(self.db, name=f'db_{conf.name}')
 
     @abstractmethod
     async def get_records(self, entity: BaseFeedMonitorEntity, client: HttpClient) -> Sequence[Record]:
         '''Fetch and parse resource, return parsed records, both old and new'''
 
     async def run(self):
+        name = f'periodic commit for {self.logger.name} ({self!r})'
+        _ = self.controller.create_task(self.async_db.run(), name=name)
         for entity in self.entities.values():
             client = self._get_client(entity)
             await self.prime_db(entity, client)
@@ -327,7 +330,7 @@ class BaseFeedMonitor(HttpTaskMonitor):
     async def prime_db(self, entity: BaseFeedMonitorEntity, client: HttpClient) -> None:
         '''if a feed has no prior records, fetch it once and mark all entries as old
         in order to not produce ten messages at once when the feed is first added'''
-        size = self.db.get_size(entity.name)
+        size = await self.async_db.call(self.db.get_size, entity.name)
         priming_required = False
         if entity.quiet_start:
             self.logger.info(f'[{entity.name}] option "quiet_start" enabled, all records until this moment will be marked as already seen')
@@ -355,6 +358,11 @@ class BaseFeedMonitor(HttpTaskMonitor):
     def record_got_updated(self, record: Record, entity: BaseFeedMonitorEntity) -> bool:
         return self.db.record_got_updated(record, entity.name)
 
+    def record_update_is_significant(self, record: Record, entity: BaseFeedMonitorEntity) -> bool:
+        '''Called for fetched records that have a stored version with different hash.
+        Implementations might return False to ignore changes in some fields'''
+        return True
+
     def _log_changes(self, record: Record, entity: BaseFeedMonitorEntity):
         normalized_record = type(record).model_validate_json(record.as_json())
         stored_record = self.load_record(record, entity)
@@ -367,21 +375,26 @@ class BaseFeedMonitor(HttpTaskMonitor):
     def filter_new_records(self, records: Sequence[Record], entity: BaseFeedMonitorEntity) -> Sequence[Record]:
         new_records = []
         records_to_store = []
-        for record in records:
-            if self.record_is_new(record, entity):
+        states = self.db.classify_records(records, entity.name)
+        for record, state in zip(records, states):
+            if state == RecordState.NEW:
                 new_records.append(record)
                 records_to_store.append(record)
                 self.logger.debug(f'[{entity.name}] fetched record is new: "{record.get_uid()}" (hash: {record.hash()[:5]})')
-            elif self.record_got_updated(record, entity):
+            elif state == RecordState.UPDATED and self.record_update_is_significant(record, entity):
                 records_to_store.append(record)
                 self._log_changes(record, entity)
                 self.logger.debug(f'[{entity.name}] storing new version of record "{record.get_uid()}" (hash: {record.hash()[:5]})')
         self.store_records(records_to_store, entity)
         return new_records
 
+    async def select_new_records(self, records: Sequence[Record], entity: BaseFeedMonitorEntity) -> Sequence[Record]:
+        '''Run filter_new_records() in the database thread'''
+        return await self.async_db.call(self.filter_new_records, records, entity)
+
     async def get_new_records(self, entity: BaseFeedMonitorEntity, client: HttpClient) -> Sequence[Record]:
         records = await self.get_records(entity, client)
-        new_records = self.filter_new_records(records, entity)
+        new_records = await self.select_new_records(records, entity)
         return new_records
 
     def get_records_storage(self, entity_name: Optional[str] = None) -> Optional[AbstractRecordsStorage]:
@@ -389,6 +402,9 @@ class BaseFeedMonitor(HttpTaskMonitor):
             return None
         return RecordDbView(self.db)
 
+    def get_host(self, entity: BaseFeedMonitorEntity) -> str:
+        return urllib.parse.urlparse(entity.url).netloc or super().get_host(entity)
+
 
 class PagedFeedMonitorConfig(BaseFeedMonitorConfig):
     pass
@@ -437,6 +453,10 @@ class PagedFeedMonitor(BaseFeedMonitor, ABC):
             context (Optional[Any]): any data required to load next page, such as continuation token
         Returns same values as handle_first_page'''
 
+    def all_records_are_new(self, records: Sequence[Record], entity: PagedFeedMonitorEntity) -> bool:
+        states = self.db.classify_records(records, entity.name)
+        return all(state == RecordState.NEW for state in states)
+
     async def get_records(self, entity: PagedFeedMonitorEntity, client: HttpClient) -> Sequence[Record]:
         records: List[Record] = []
         current_page_records, continuation_context = await self.handle_first_page(entity, client)
@@ -461,7 +481,7 @@ class PagedFeedMonitor(BaseFeedMonitor, ABC):
                     self.logger.info(
                         f'[{entity.name}] reached continuation limit of {entity.max_continuation_depth}, aborting update')
                     break
-                if not all(self.record_is_new(record, entity) for record in current_page_records):
+                if not await self.async_db.call(self.all_records_are_new, current_page_records, entity):
                     self.logger.debug(f'[{entity.name}] found already stored records on {current_page - 1} page')
                     break
             self.logger.debug(f'[{entity.name}] all records on page {current_page - 1} are new, loading next one')
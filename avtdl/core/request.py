@@ -1,9 +1,11 @@
 import abc
 import asyncio
 import datetime
+import hashlib
 import json
 import logging
 import mimetypes
+import random
 import re
 import time
 import urllib.parse
@@ -17,23 +19,30 @@ from http.cookies import SimpleCookie
 from math import log2
 from pathlib import Path
 from textwrap import shorten
-from typing import Any, Dict, Literal, Optional, Tuple, Union
+from typing import Any, AsyncIterator, Dict, Literal, Optional, Tuple, Union
 
 import aiohttp
 import curl_cffi
 import multidict
-from curl_cffi import CurlHttpVersion
+from curl_cffi import CurlHttpVersion, CurlInfo
 from multidict import CIMultiDictProxy
 from pydantic import BaseModel
 
 from avtdl._version import __version__
 from avtdl.core.cookies import AnotherAiohttpCookieJar, AnotherCookieJar, AnotherCurlCffiCookieJar, convert_cookiejar, \
     load_cookies
-from avtdl.core.utils import JSONType, timeit, utcnow
+from avtdl.core.metrics import Counter, Histogram
+from avtdl.core.utils import JSONType, timeit, update_file_hash, utcnow
 
 HIGHEST_UPDATE_INTERVAL: float = 4000
 
-CHUNK_SIZE = 1024 ** 3
+CHUNK_SIZE = 1024 ** 2
+
+HTTP_REQUESTS = Counter('avtdl_http_requests_total', 'Number of completed http requests, status is 0 for failed requests',
+                        ['host', 'status'])
+HTTP_REQUEST_DURATION = Histogram('avtdl_http_request_duration_seconds', 'Duration of http requests', ['host'])
+RATE_LIMIT_WAIT = Histogram('avtdl_rate_limit_wait_seconds', 'Time spent waiting for rate limit before making a request',
+                            ['name'], buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600))
 
 
 @dataclass
@@ -44,11 +53,30 @@ class RetrySettings:
     """transparent retrying: delay before first retry attempt"""
     retry_multiplier: float = 1.2
     """transparent retrying: factor to increase retry delay compared to the previous attempt"""
+    max_retry_after: float = 60
+    """transparent retrying: give up retrying if server asks to wait longer than this number of seconds"""
 
     def __post_init__(self):
         if self.retry_times < 0:
             raise ValueError(f'retry_times must be positive, got "{self.retry_times}"')
 
+    def get_delay(self, current: float, response: 'MaybeHttpResponse') -> Optional[float]:
+        """
+        Return number of seconds to wait before the next attempt, or None if retrying should stop
+
+        Delay is picked randomly between 0 and `current` ("full jitter"), so multiple
+        clients failing at once do not retry in lockstep. Retry-After header, if present,
+        sets the lower bound of the delay.
+        """
+        delay = random.uniform(0, current)
+        if response.headers is not None:
+            retry_after = get_retry_after(response.headers)
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    return None
+                delay = max(delay, float(retry_after))
+        return delay
+
 
 @dataclass
 class EndpointState:
@@ -309,12 +337,14 @@ class RateLimit:
         with timeit() as t:
             await self.lock.acquire()
         self.perf_lock_acquired_at = t.end
-        if self.delay > 0:
+        delay = self.delay
+        if delay > 0:
             self.logger.debug(
-                f'[{self.name}] lock acquired in {t.timedelta}, {self.delay} seconds until rate limit reset')
-            await asyncio.sleep(self.delay)
+                f'[{self.name}] lock acquired in {t.timedelta}, {delay} seconds until rate limit reset')
+            await asyncio.sleep(delay)
         else:
             self.logger.debug(f'[{self.name}] lock acquired in {t.timedelta}, there is no active rate limit')
+        RATE_LIMIT_WAIT.observe(self.name, value=t.duration + delay)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -472,6 +502,8 @@ class RemoteFileInfo(BaseModel):
     extension: str = ''
     content_length: Optional[int] = None
     response_headers: dict
+    sha256: Optional[str] = None
+    """hash of the downloaded content, calculated while the file is being written"""
 
     @classmethod
     def from_url_response(cls, url: str, headers: Union[Dict[str, str], multidict.CIMultiDictProxy]) -> 'RemoteFileInfo':
@@ -539,14 +571,98 @@ class RemoteFileInfo(BaseModel):
         return mime_extension
 
 
+class DownloadProgress(BaseModel):
+    """
+    State of a partially downloaded file, persisted next to it to allow resuming the download
+
+    Size of the partial file itself serves as the download offset, while the
+    validator (strong ETag or Last-Modified value) is used in If-Range header
+    to ensure the remote file has not changed since the download has started.
+    """
+    url: str
+    validator: Optional[str] = None
+    response_headers: Dict[str, str] = {}
+
+    @classmethod
+    def from_response(cls, url: str, headers: Union[Dict[str, str], multidict.CIMultiDictProxy]) -> 'DownloadProgress':
+        etag = headers.get('ETag')
+        if etag is not None and etag.startswith('W/'):
+            etag = None  # weak validators are not allowed in If-Range
+        validator = etag or headers.get('Last-Modified')
+        return cls(url=url, validator=validator, response_headers={k: v for k, v in headers.items()})
+
+    @staticmethod
+    def location(path: Path) -> Path:
+        return path.with_name(path.name + '.progress')
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['DownloadProgress']:
+        """return progress stored for partial file at path, if present and valid"""
+        try:
+            return cls.model_validate_json(cls.location(path).read_text(encoding='utf8'))
+        except (OSError, ValueError):
+            return None
+
+    def save(self, path: Path) -> None:
+        self.location(path).write_text(self.model_dump_json(), encoding='utf8')
+
+    @classmethod
+    def discard(cls, path: Path) -> None:
+        cls.location(path).unlink(missing_ok=True)
+
+    def resume_offset(self, path: Path, url: str) -> int:
+        """return number of bytes of partial file at path that can be reused to continue downloading url"""
+        if self.url != url or self.validator is None:
+            return 0
+        try:
+            return path.stat().st_size
+        except OSError:
+            return 0
+
+
+@dataclass
+class ConnectionStats:
+    """Number of connections opened and reused by sessions sharing this instance"""
+    opened: int = 0
+    reused: int = 0
+
+    def __str__(self) -> str:
+        return f'{self.opened} connections opened, {self.reused} reused'
+
+
 class HttpClient(abc.ABC):
+    """
+    Perform requests on behalf of a single entity
 
-    def __init__(self, logger: logging.Logger, cookies_file: Optional[Path], headers: Optional[Dict[str, Any]]):
+    Client holds per-entity state, such as default headers and logger, while
+    the underlying session, with its connection pool and cookie jar, might be
+    shared between multiple clients. Client that created its own session is
+    responsible for closing it, shared sessions are managed by ClientPool.
+    """
+
+    def __init__(self, logger: logging.Logger, cookies_file: Optional[Path], headers: Optional[Dict[str, Any]],
+                 session: Optional[Any] = None, stats: Optional[ConnectionStats] = None):
         self.logger = logger
+        self.headers = headers
+        self.stats = stats or ConnectionStats()
+        self.owns_session = session is None
+
+    @classmethod
+    @abc.abstractmethod
+    def create_session(cls, cookies_file: Optional[Path], stats: ConnectionStats) -> Any:
+        """create a new session with cookies loaded from cookies_file, reporting connections usage to stats"""
 
     @abc.abstractmethod
     async def close(self) -> None:
-        """close underlying session, must be called before shutdown"""
+        """close underlying session if it is owned by the client, must be called before shutdown"""
+
+    def merge_headers(self, headers: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """combine client default headers with request-specific ones, the latter taking precedence"""
+        if self.headers is None:
+            return headers
+        if headers is None:
+            return self.headers
+        return {**self.headers, **headers}
 
     @property
     @abc.abstractmethod
@@ -571,8 +687,88 @@ class HttpClient(abc.ABC):
                             data: Optional[Any] = None,
                             data_json: Optional[Any] = None,
                             headers: Optional[Dict[str, Any]] = None,
-                            method: str = 'GET') -> Optional['RemoteFileInfo']:
-        """download binary file from `url` and store it into `path`"""
+                            method: str = 'GET',
+                            chunk_size: int = CHUNK_SIZE,
+                            resume: bool = False) -> Optional['RemoteFileInfo']:
+        """
+        download binary file from `url` and store it into `path`
+
+        Response body is streamed to disk in chunks of up to `chunk_size` bytes, with
+        writes performed outside the event loop thread. If `resume` is enabled, download
+        progress is persisted next to the file and a download of an existing partial
+        file is continued with a Range request instead of starting from scratch.
+        """
+
+    def prepare_resume(self, path: Path, url: str, headers: Optional[Dict[str, Any]],
+                       resume: bool) -> Tuple[Optional[Dict[str, Any]], Optional[DownloadProgress]]:
+        """add Range and If-Range headers if download of existing partial file can be resumed"""
+        if not resume:
+            return headers, None
+        progress = DownloadProgress.load(path)
+        if progress is None:
+            return headers, None
+        offset = progress.resume_offset(path, url)
+        if offset == 0:
+            return headers, None
+        self.logger.debug(f'resuming download of "{url}" from byte {offset}')
+        headers = dict(headers or {})
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = progress.validator
+        return headers, progress
+
+    @staticmethod
+    def check_range(path: Path, status: int) -> None:
+        """on 416 Range Not Satisfiable forget stored progress, so the next attempt starts over"""
+        if status == 416:
+            DownloadProgress.discard(path)
+            path.unlink(missing_ok=True)
+
+    async def store_response(self, path: Path, url: str, status: int,
+                             headers: Union[multidict.CIMultiDict, multidict.CIMultiDictProxy],
+                             chunks: AsyncIterator[bytes], chunk_size: int,
+                             progress: Optional[DownloadProgress], resume: bool) -> RemoteFileInfo:
+        """
+        write response body to path, appending to it if server has accepted Range request
+
+        Received data is collected into blocks of chunk_size bytes before being written,
+        so a transport delivering data in small pieces does not cause a thread switch per piece.
+        Content hash is calculated along the way and stored in the returned RemoteFileInfo.
+        """
+        append = progress is not None and status == 206
+        if append:
+            assert progress is not None
+            remote_info = RemoteFileInfo.from_url_response(url, multidict.CIMultiDict(progress.response_headers))
+        else:
+            if progress is not None:
+                self.logger.debug(f'remote file has changed, restarting download of "{url}"')
+            remote_info = RemoteFileInfo.from_url_response(url, headers)
+            if resume:
+                await asyncio.to_thread(DownloadProgress.from_response(url, headers).save, path)
+        self.logger.debug(f'downloading {str(remote_info.content_length) + " bytes" or ""} from "{url}"')
+        digest = hashlib.sha256()
+        if append:
+            await asyncio.to_thread(update_file_hash, digest, path)
+
+        def write_block(block: bytearray) -> None:
+            digest.update(block)
+            fp.write(block)
+
+        fp = await asyncio.to_thread(open, path, 'ab' if append else 'wb')
+        buffer = bytearray()
+        try:
+            async for data in chunks:
+                buffer += data
+                if len(buffer) >= chunk_size:
+                    await asyncio.to_thread(write_block, buffer)
+                    buffer = bytearray()
+        finally:
+            # data received before an interruption is kept, so it is not downloaded again on resume
+            await asyncio.to_thread(write_block, buffer)
+            await asyncio.to_thread(fp.close)
+        if resume:
+            DownloadProgress.discard(path)
+        remote_info.sha256 = digest.hexdigest()
+        return remote_info
 
 
     async def request(self, url: str,
@@ -585,10 +781,22 @@ class HttpClient(abc.ABC):
                       settings: RetrySettings = RetrySettings()) -> 'MaybeHttpResponse':
         response: MaybeHttpResponse = NoResponse(self.logger, Exception('request_once was never called'), url)
         next_try_delay = settings.retry_delay
+        host = urllib.parse.urlsplit(url).hostname or ''
         for attempt in range(settings.retry_times + 1):
+            started = time.perf_counter()
             response = await self.request_once(url, params, data, data_json, headers, method, state)
+            HTTP_REQUEST_DURATION.observe(host, value=time.perf_counter() - started)
+            HTTP_REQUESTS.inc(host, str(response.status))
             if response is not None and response.ok:
                 break
+            if attempt == settings.retry_times:
+                break
+            delay = settings.get_delay(next_try_delay, response)
+            if delay is None:
+                self.logger.debug(f'not retrying {url}: server requested delay exceeds {settings.max_retry_after} seconds')
+                break
+            self.logger.debug(f'retrying {url} in {delay:.2f} seconds, attempt {attempt + 1} of {settings.retry_times}')
+            await asyncio.sleep(delay)
             next_try_delay *= settings.retry_multiplier
         return response
 
@@ -641,16 +849,32 @@ class HttpClient(abc.ABC):
 
 class AioHttpClient(HttpClient):
 
-    def __init__(self, logger: logging.Logger, cookies_file: Optional[Path], headers: Optional[Dict[str, Any]]):
-        super().__init__(logger, cookies_file, headers)
+    def __init__(self, logger: logging.Logger, cookies_file: Optional[Path], headers: Optional[Dict[str, Any]],
+                 session: Optional[aiohttp.ClientSession] = None, stats: Optional[ConnectionStats] = None):
+        super().__init__(logger, cookies_file, headers, session, stats)
+        self.session: aiohttp.ClientSession = session or self.create_session(cookies_file, self.stats)
 
+    @classmethod
+    def create_session(cls, cookies_file: Optional[Path], stats: ConnectionStats) -> aiohttp.ClientSession:
         netscape_cookies = load_cookies(cookies_file)
         cookies = convert_cookiejar(netscape_cookies) if netscape_cookies else None
-        session = aiohttp.ClientSession(cookie_jar=cookies, headers=headers)
-        self.session = session
+        return aiohttp.ClientSession(cookie_jar=cookies, trace_configs=[cls.trace_connections(stats)])
+
+    @staticmethod
+    def trace_connections(stats: ConnectionStats) -> aiohttp.TraceConfig:
+        async def on_connection_create_end(*_):
+            stats.opened += 1
+
+        async def on_connection_reuseconn(*_):
+            stats.reused += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
 
     async def close(self) -> None:
-        if not self.session.closed:
+        if self.owns_session and not self.session.closed:
             self.logger.debug(f'closing session')
             await self.session.close()
 
@@ -698,8 +922,8 @@ class AioHttpClient(HttpClient):
                               method: str = 'GET',
                               state: EndpointState = EndpointState()) -> Optional[Dict[str, Any]]:
         request_headers: Dict[str, str] = {}
-        if self.session.headers is not None:
-            request_headers.update(self.session.headers)
+        if self.headers is not None:
+            request_headers.update(self.headers)
         if headers is not None:
             request_headers.update(headers)
         if state.last_modified is not None and method in ['GET', 'HEAD']:
@@ -755,19 +979,21 @@ class AioHttpClient(HttpClient):
                             data: Optional[Any] = None,
                             data_json: Optional[Any] = None,
                             headers: Optional[Dict[str, Any]] = None,
-                            method: str = 'GET') -> Optional['RemoteFileInfo']:
-        headers = insert_useragent(headers)
+                            method: str = 'GET',
+                            chunk_size: int = CHUNK_SIZE,
+                            resume: bool = False) -> Optional['RemoteFileInfo']:
+        headers = insert_useragent(self.merge_headers(headers))
+        headers, progress = self.prepare_resume(path, url, headers, resume)
         try:
             timeout = aiohttp.ClientTimeout(total=0, connect=60, sock_connect=60, sock_read=60)
             async with self.session.request(method, url,
                                             params=params, data=data, json=data_json,
                                             timeout=timeout, headers=headers) as response:
+                self.check_range(path, response.status)
                 response.raise_for_status()
-                remote_info = RemoteFileInfo.from_url_response(url, response.headers)
-                self.logger.debug(f'downloading {str(remote_info.content_length) + " bytes" or ""} from "{url}"')
-                with open(path, 'w+b') as fp:
-                    async for data in response.content.iter_chunked(CHUNK_SIZE):
-                        fp.write(data)
+                chunks = response.content.iter_chunked(chunk_size)
+                remote_info = await self.store_response(path, url, response.status, response.headers,
+                                                        chunks, chunk_size, progress, resume)
         except (OSError, asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientResponseError) as e:
             self.logger.warning(f'failed to download "{url}": {type(e)} {e}')
             return None
@@ -788,16 +1014,31 @@ class CurlCffiHttpClient(HttpClient):
         impersonate: curl_cffi.BrowserTypeLiteral = 'chrome'
         http_version: Optional[CurlHttpVersion] = CurlHttpVersion.V2TLS
 
-    def __init__(self, logger: logging.Logger, cookies_file: Optional[Path], headers: Optional[Dict[str, Any]]):
-        super().__init__(logger, cookies_file, headers)
+    def __init__(self, logger: logging.Logger, cookies_file: Optional[Path], headers: Optional[Dict[str, Any]],
+                 session: Optional[curl_cffi.requests.AsyncSession] = None, stats: Optional[ConnectionStats] = None):
+        super().__init__(logger, cookies_file, headers, session, stats)
         self.options = self.Options()
+        self.session: curl_cffi.requests.AsyncSession = session or self.create_session(cookies_file, self.stats)
 
+    @classmethod
+    def create_session(cls, cookies_file: Optional[Path], stats: ConnectionStats) -> curl_cffi.requests.AsyncSession:
         netscape_cookies = load_cookies(cookies_file)
-        self.session: curl_cffi.requests.AsyncSession = curl_cffi.requests.AsyncSession(cookies=netscape_cookies, headers=headers)
+        # connections usage is collected from responses, see count_connections()
+        return curl_cffi.requests.AsyncSession(cookies=netscape_cookies, curl_infos=[CurlInfo.NUM_CONNECTS])
+
+    def count_connections(self, response: curl_cffi.Response) -> None:
+        new_connections = response.infos.get(CurlInfo.NUM_CONNECTS)
+        if new_connections is None:
+            return
+        if new_connections > 0:
+            self.stats.opened += new_connections
+        else:
+            self.stats.reused += 1
 
     async def close(self) -> None:
-        self.logger.debug(f'closing session')
-        await self.session.close()
+        if self.owns_session:
+            self.logger.debug(f'closing session')
+            await self.session.close()
 
     @property
     def cookie_jar(self) -> AnotherCookieJar:
@@ -844,8 +1085,8 @@ class CurlCffiHttpClient(HttpClient):
                               state: EndpointState = EndpointState()) -> Optional[Dict[str, Any]]:
         request_headers: Optional[Dict[str, str]] = {}
         assert request_headers is not None
-        if self.session.headers is not None:
-            request_headers.update(self.session.headers)
+        if self.headers is not None:
+            request_headers.update(self.headers)
         if headers is not None:
             request_headers.update(headers)
         if state.last_modified is not None and method in ['GET', 'HEAD']:
@@ -882,6 +1123,7 @@ class CurlCffiHttpClient(HttpClient):
         except Exception as e:
             logger.warning(f'error while fetching {url}: {e.__class__.__name__} {e}')
             return NoResponse(logger, e, url)
+        self.count_connections(client_response)
 
         if not client_response.ok:
             logger.warning(
@@ -907,9 +1149,13 @@ class CurlCffiHttpClient(HttpClient):
                             data: Optional[Any] = None,
                             data_json: Optional[Any] = None,
                             headers: Optional[Dict[str, Any]] = None,
-                            method: str = 'GET') -> Optional['RemoteFileInfo']:
+                            method: str = 'GET',
+                            chunk_size: int = CHUNK_SIZE,
+                            resume: bool = False) -> Optional['RemoteFileInfo']:
+        headers = self.merge_headers(headers)
         if self.options.use_own_ua:
             headers = insert_useragent(headers)
+        headers, progress = self.prepare_resume(path, url, headers, resume)
         try:
             async with self.session.stream(method=method,  # type: ignore
                                                  url=url,
@@ -919,12 +1165,15 @@ class CurlCffiHttpClient(HttpClient):
                                                  json=data_json,
                                                  timeout=60,
                                                  ) as response:
+                self.count_connections(response)
+                self.check_range(path, response.status_code)
                 response.raise_for_status()
-                remote_info = RemoteFileInfo.from_url_response(url, headers_dict(response.headers))
-                self.logger.debug(f'downloading {str(remote_info.content_length) + " bytes" or ""} from "{url}"')
-                with open(path, 'w+b') as fp:
-                    async for data in response.aiter_content():
-                        fp.write(data)
+                # curl picks chunk sizes by itself and queues them without any flow control,
+                # so memory usage stays bounded only as long as writing keeps up with receiving
+                chunks = response.aiter_content()
+                response_headers = multidict.CIMultiDict(headers_dict(response.headers))
+                remote_info = await self.store_response(path, url, response.status_code, response_headers,
+                                                        chunks, chunk_size, progress, resume)
         except (OSError, curl_cffi.exceptions.RequestException) as e:
             self.logger.warning(f'failed to download "{url}": {type(e)} {e}')
             return None
@@ -948,13 +1197,24 @@ class Transport(str, Enum):
             raise NotImplementedError(f'unknown transport: "{name}"')
 
 
+SessionKey = Tuple[Transport, Optional[Path]]
+
+
 class ClientPool:
     """
     Store and reuse HttpClient instances and manage associated sessions livecycle
+
+    Clients are lightweight wrappers holding per-entity headers and logger.
+    Clients using the same transport and cookies file share a single underlying
+    session, so connections to the same host are kept alive and reused across
+    entities. Impersonation profile is passed with every request by the curl_cffi
+    client, so it doesn't require a separate session.
     """
 
     def __init__(self, logger: Optional[logging.Logger] = None) -> None:
         self.clients: Dict[str, HttpClient] = {}
+        self.sessions: Dict[SessionKey, Any] = {}
+        self.stats = ConnectionStats()
         self.task: Optional[asyncio.Task] = None
         self.logger = (logger or logging.getLogger()).getChild('client_pool')
 
@@ -980,16 +1240,23 @@ class ClientPool:
             return self.clients[client_id]
         logger = logger or logging.getLogger(f'HttpClient[{self.get_client_id(cookies_file, headers, name)}]')
         HttpClientImplementation = Transport.get_implementation(transport)
-        client = HttpClientImplementation(logger, cookies_file, headers)
+        session_key = (transport, cookies_file)
+        session = self.sessions.get(session_key)
+        if session is None:
+            session = HttpClientImplementation.create_session(cookies_file, self.stats)
+            self.sessions[session_key] = session
+        client = HttpClientImplementation(logger, cookies_file, headers, session, self.stats)
         self.clients[client_id] = client
         return client
 
     async def close(self) -> None:
-        """close sessions for all cached clients"""
+        """close sessions shared by cached clients"""
         self.logger.debug('closing http sessions...')
         for client_id, client in self.clients.items():
             await client.close()
-        self.logger.debug('all http sessions closed')
+        for session in self.sessions.values():
+            await session.close()
+        self.logger.debug(f'all http sessions closed, {self.stats}')
 
     async def ensure_closed(self) -> None:
         try:
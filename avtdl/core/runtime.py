@@ -5,11 +5,13 @@ from collections import defaultdict, deque
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
-from typing import Any, Callable, Coroutine, Dict, List, Literal, Optional, Tuple
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Literal, Optional, Tuple
 
 from pydantic import Field
 
 from avtdl.core.interfaces import Record
+from avtdl.core.metrics import Counter
+from avtdl.core.scheduler import PollScheduler
 from avtdl.core.state import StateSerializer
 from avtdl.core.utils import DictRootModel
 
@@ -18,6 +20,8 @@ SubscriptionsMapping = Dict[str, List[Subscription]]
 
 HISTORY_SIZE = 20
 
+BUS_PUBLISHED = Counter('avtdl_bus_published_total', 'Number of records published on the message bus', ['topic'])
+
 
 def deque_factory() -> deque:
     return deque(maxlen=HISTORY_SIZE)
@@ -27,6 +31,25 @@ class MessageHistory(DictRootModel):
     root: Dict[str, deque[Record]] = Field(default_factory=lambda: defaultdict(deque_factory))
 
 
+@dataclass
+class Route:
+    """Precomputed delivery target for a published topic"""
+    topic: str
+    """specific topic of the subscription"""
+    chain: str
+    """chain name extracted from the subscription topic"""
+    generic_topic: str
+    """subscription topic with chain name stripped, used as a history key"""
+    callbacks: List[Subscription]
+
+
+@dataclass
+class RoutingEntry:
+    """Everything required to deliver a message published on a single topic"""
+    generic_topic: str
+    routes: List[Route]
+
+
 class MessageBus:
     PREFIX_IN = 'inputs'
     PREFIX_OUT = 'output'
@@ -38,10 +61,19 @@ class MessageBus:
         self.subscriptions: SubscriptionsMapping = defaultdict(list)
         self.logger = logging.getLogger('bus')
         self.history: MessageHistory = MessageHistory()
+        # subscription topics grouped by (direction, actor, entity), in order of subscription
+        self._index: Dict[Tuple[str, str, str], List[str]] = defaultdict(list)
+        # routing entries for already seen published topics, dropped on every new subscription
+        self._routes: Dict[str, RoutingEntry] = {}
+        self._split_topics: Dict[str, Tuple[str, str, str, str]] = {}
 
     def sub(self, topic: str, callback: Subscription):
         self.logger.debug(f'subscription on topic {topic} by {callback!r}')
+        if topic not in self.subscriptions:
+            direction, actor, entity, _ = self.split_subscription_topic(topic)
+            self._index[(direction, actor, entity)].append(topic)
         self.subscriptions[topic].append(callback)
+        self._routes.clear()
 
     def _generic_topic(self, specific_topic: str) -> str:
         direction, actor, entity, chain = self.split_subscription_topic(specific_topic)
@@ -49,23 +81,22 @@ class MessageBus:
         return generic_topic
 
     def pub(self, topic: str, message: Record):
-        self.logger.debug(f'on topic {topic} message "{message!r}"')
-        matching_callbacks = self.get_matching_callbacks(topic)
-        for specific_topic, callbacks in matching_callbacks.items():
+        BUS_PUBLISHED.inc(topic)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f'on topic {topic} message "{message!r}"')
+        routing = self.get_routing(topic)
+        for route in routing.routes:
             if message.chain:
                 targeted_message = message
             else:
-                _, _, chain = self.split_message_topic(specific_topic)
-                targeted_message = message.model_copy(deep=True)
-                targeted_message.chain = chain
-            for callback in callbacks:
-                callback(specific_topic, targeted_message)
-
-            generic_topic = self._generic_topic(specific_topic)
-            self.add_to_history(generic_topic, targeted_message)
-        if not matching_callbacks:
+                targeted_message = message.evolve(chain=route.chain)
+            for callback in route.callbacks:
+                callback(route.topic, targeted_message)
+
+            self.add_to_history(route.generic_topic, targeted_message)
+        if not routing.routes:
             # topic has no subscribers, meaning entity is not referenced in chains
-            self.add_to_history(self._generic_topic(topic), message)
+            self.add_to_history(routing.generic_topic, message)
 
     def add_to_history(self, topic: str, message: Record):
         self.history[topic].append(message)
@@ -85,20 +116,29 @@ class MessageBus:
         return records
 
     def get_matching_callbacks(self, topic_pattern: str) -> SubscriptionsMapping:
-        pattern_direction, pattern_actor, pattern_entity, pattern_chain = self.split_subscription_topic(topic_pattern)
-        callbacks = defaultdict(list)
-        for topic, callback in self.subscriptions.items():
-            direction, actor, entity, chain = self.split_subscription_topic(topic)
-            if pattern_direction != direction:
-                continue
-            if actor != pattern_actor:
-                continue
-            if entity != pattern_entity:
-                continue
-            if chain == '' or pattern_chain == '' or chain == pattern_chain:
-                callbacks[topic].extend(callback)
+        callbacks: SubscriptionsMapping = defaultdict(list)
+        for route in self.get_routing(topic_pattern).routes:
+            callbacks[route.topic].extend(route.callbacks)
         return callbacks
 
+    def get_routing(self, topic_pattern: str) -> RoutingEntry:
+        """Return cached routing entry for topic, building it on the first use"""
+        routing = self._routes.get(topic_pattern)
+        if routing is None:
+            routing = self._build_routing(topic_pattern)
+            self._routes[topic_pattern] = routing
+        return routing
+
+    def _build_routing(self, topic_pattern: str) -> RoutingEntry:
+        direction, actor, entity, pattern_chain = self.split_subscription_topic(topic_pattern)
+        routes = []
+        for topic in self._index.get((direction, actor, entity), []):
+            chain = self.split_subscription_topic(topic)[3]
+            if chain == '' or pattern_chain == '' or chain == pattern_chain:
+                generic_topic = self._generic_topic(topic)
+                routes.append(Route(topic, chain, generic_topic, self.subscriptions[topic]))
+        return RoutingEntry(self._generic_topic(topic_pattern), routes)
+
     def make_topic(self, *args: str):
         return self.SEPARATOR.join(args)
 
@@ -116,15 +156,22 @@ class MessageBus:
         return actor, entity, chain
 
     def split_subscription_topic(self, topic) -> Tuple[str, str, str, str]:
+        parts = self._split_topics.get(topic)
+        if parts is not None:
+            return parts
         try:
             direction, actor, entity, chain = self.split_topic(topic)
         except ValueError:
             self.logger.error(f'failed to split message topic "{topic}"')
             raise
-        return direction, actor, entity, chain
+        parts = direction, actor, entity, chain
+        self._split_topics[topic] = parts
+        return parts
 
     def clear_subscriptions(self):
         self.subscriptions.clear()
+        self._index.clear()
+        self._routes.clear()
 
     def dump_state(self, directory: Path):
         StateSerializer.dump(self.history, directory / self.PERSISTENCE_FILE)
@@ -178,6 +225,8 @@ class TasksController:
         self.terminated_action = TerminatedAction.EXIT
         self.tasks: set[asyncio.Task] = set()
         self._info: Dict[asyncio.Task, Optional[TaskStatus]] = {}
+        self.scheduler = PollScheduler(logger=self.logger.getChild('scheduler'))
+        self._scheduler_task: Optional[asyncio.Task] = None
 
     def create_task(self, coro: Coroutine, *, name: Optional[str] = None,
                     _info: Optional[TaskStatus] = None) -> asyncio.Task:
@@ -188,6 +237,13 @@ class TasksController:
         self._info[task] = _info
         return task
 
+    def schedule(self, name: str, host: str, poll: Callable[[], Awaitable[None]], interval: Callable[[], float],
+                 delay: float = 0, info: Optional[TaskStatus] = None) -> None:
+        """add periodic poll to the scheduler, starting it if necessary"""
+        if self._scheduler_task is None or self._scheduler_task.done():
+            self._scheduler_task = self.create_task(self.scheduler.run(), name='scheduler')
+        self.scheduler.add(name, host, poll, interval, delay, info)
+
     async def check_done_tasks(self, done: set[asyncio.Task]) -> None:
         for task in done:
             if not task.done():
@@ -250,7 +306,9 @@ class TasksController:
         return self.terminated_action
 
     def get_status(self) -> List[TaskStatus]:
-        return [status for status in self._info.values() if status is not None]
+        statuses = [status for status in self._info.values() if status is not None]
+        statuses.extend(self.scheduler.get_status())
+        return statuses
 
     def get_task_status(self, task_name: str) -> Optional[TaskStatus]:
         for task, task_info in self._info.items():
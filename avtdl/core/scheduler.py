@@ -0,0 +1,266 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+import random
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from avtdl.core.runtime import TaskStatus
+
+DEFAULT_CONCURRENCY = 32
+DEFAULT_CONCURRENCY_PER_HOST = 4
+DEFAULT_JITTER = 0.1
+DEFAULT_SLOT_TIMEOUT = 60
+
+
+@dataclass(eq=False)
+class PollJob:
+    name: str
+    """unique name of the job, typically "actor:entity" """
+    host: str
+    """key used to limit the number of simultaneous polls of the same server"""
+    poll: Callable[[], Awaitable[None]]
+    """called every time the job is due. Raising an exception removes the job"""
+    interval: Callable[[], float]
+    """returns delay before the next poll. Called after each poll, so the value can change between polls"""
+    info: Optional['TaskStatus'] = None
+    due: float = 0
+    active: bool = True
+    started: bool = False
+    """whether the job has been polled at least once"""
+    started_at: float = 0
+    """time the current or the last poll has started"""
+
+
+@dataclass
+class SchedulerStats:
+    jobs: int = 0
+    """number of scheduled jobs"""
+    queued: int = 0
+    """number of jobs that are due, but wait for a free slot"""
+    running: int = 0
+    """number of polls in progress"""
+    polls: int = 0
+    """total number of started polls"""
+    total_lateness: float = 0
+    """sum of delays between the moment a job was due and the moment it started"""
+    max_lateness: float = 0
+    overdue: int = 0
+    """total number of polls that released their slot because they took longer than slot_timeout"""
+
+    @property
+    def mean_lateness(self) -> float:
+        return self.total_lateness / self.polls if self.polls else 0
+
+    def __str__(self) -> str:
+        return (f'{self.jobs} jobs, {self.queued} queued, {self.running} running, {self.polls} polls, '
+                f'{self.overdue} overdue, lateness mean {self.mean_lateness:.3f}s, max {self.max_lateness:.3f}s')
+
+
+class PollScheduler:
+    """
+    Run periodic polls of all monitors from a single timer heap
+
+    Instead of keeping a sleeping task per monitored entity, jobs are stored in
+    a heap ordered by the time they are due. A single dispatcher task sleeps until
+    the earliest job is due and starts it, limiting the total number of polls in
+    progress and the number of polls of the same host. Due jobs waiting for a free
+    slot are served round-robin by host, so a single slow server with many entities
+    can't delay polling of the others.
+
+    After every poll the job is rescheduled with its current interval, randomly
+    stretched or shrunk by up to `jitter` fraction of it, so polls of entities with
+    the same interval keep drifting apart instead of synchronizing over time.
+
+    A poll can take long while it waits for a rate limit, a retry delay or a slow
+    server. To prevent such polls from occupying all slots and stopping updates of
+    other monitors, a poll that takes longer than `slot_timeout` seconds releases
+    its slot and continues running outside of the concurrency limits.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY,
+                 concurrency_per_host: int = DEFAULT_CONCURRENCY_PER_HOST,
+                 jitter: float = DEFAULT_JITTER,
+                 slot_timeout: float = DEFAULT_SLOT_TIMEOUT,
+                 logger: Optional[logging.Logger] = None) -> None:
+        self.logger = logger or logging.getLogger('scheduler')
+        self.concurrency = concurrency
+        self.concurrency_per_host = concurrency_per_host
+        self.jitter = jitter
+        self.slot_timeout = slot_timeout
+        self.jobs: Dict[str, PollJob] = {}
+        self.stats = SchedulerStats()
+        self._heap: List[Tuple[float, int, PollJob]] = []
+        self._counter = itertools.count()
+        self._ready: Dict[str, Deque[PollJob]] = {}
+        self._running: Dict[PollJob, asyncio.Task] = {}
+        self._slots: Dict[PollJob, asyncio.TimerHandle] = {}
+        """running jobs that occupy a slot, with the timer releasing it after slot_timeout"""
+        self._running_per_host: Dict[str, int] = defaultdict(int)
+        self._saturated = False
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def configure(self, concurrency: int, concurrency_per_host: int, jitter: float,
+                  slot_timeout: float = DEFAULT_SLOT_TIMEOUT) -> None:
+        self.concurrency = concurrency
+        self.concurrency_per_host = concurrency_per_host
+        self.jitter = jitter
+        self.slot_timeout = slot_timeout
+        self._wake()
+
+    @staticmethod
+    def _now() -> float:
+        return asyncio.get_running_loop().time()
+
+    def add(self, name: str, host: str, poll: Callable[[], Awaitable[None]], interval: Callable[[], float],
+            delay: float = 0, info: Optional['TaskStatus'] = None) -> PollJob:
+        """schedule poll() to be first called after delay, and then repeatedly every interval() seconds"""
+        if name in self.jobs:
+            self.remove(name)
+        job = PollJob(name, host, poll, interval, info)
+        self.jobs[name] = job
+        if info is not None and delay > 0:
+            info.set_status(f'starting in {datetime.timedelta(seconds=int(delay))}')
+        self._push(job, self._now() + delay)
+        return job
+
+    def remove(self, name: str) -> None:
+        """stop polling job with given name. Poll in progress, if any, is allowed to finish"""
+        job = self.jobs.pop(name, None)
+        if job is not None:
+            job.active = False
+
+    def _push(self, job: PollJob, due: float) -> None:
+        job.due = due
+        heapq.heappush(self._heap, (due, next(self._counter), job))
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def next_delay(self, job: PollJob) -> float:
+        interval = job.interval()
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def get_status(self) -> List['TaskStatus']:
+        return [job.info for job in self.jobs.values() if job.info is not None]
+
+    def get_stats(self) -> SchedulerStats:
+        self.stats.jobs = len(self.jobs)
+        self.stats.queued = sum(len(queue) for queue in self._ready.values())
+        self.stats.running = len(self._running)
+        return self.stats
+
+    def _collect_due(self, now: float) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            _, _, job = heapq.heappop(self._heap)
+            if job.active:
+                self._ready.setdefault(job.host, deque()).append(job)
+
+    def _dispatch(self, now: float) -> None:
+        """start ready jobs while there are free slots, taking one job per host in turn"""
+        progress = True
+        while progress and self._ready:
+            progress = False
+            for host in list(self._ready):
+                if len(self._slots) >= self.concurrency:
+                    self._report_saturation()
+                    return
+                if self._running_per_host[host] >= self.concurrency_per_host:
+                    continue
+                queue = self._ready.pop(host)
+                job = queue.popleft()
+                if queue:
+                    # reinserting moves the host to the end of the round
+                    self._ready[host] = queue
+                if job.active:
+                    self._start(job, now)
+                progress = True
+        if self._saturated and len(self._slots) < self.concurrency:
+            self._saturated = False
+            self.logger.info(f'scheduler is no longer saturated: {self.get_stats()}')
+
+    def _report_saturation(self) -> None:
+        if self._saturated:
+            return
+        self._saturated = True
+        now = self._now()
+        longest = sorted(self._slots, key=lambda job: job.started_at)[:5]
+        running = ', '.join(f'"{job.name}" ({now - job.started_at:.0f}s)' for job in longest)
+        self.logger.warning(f'all {self.concurrency} update slots are busy, due updates are delayed. '
+                            f'Longest running: {running}. {self.get_stats()}')
+
+    def _start(self, job: PollJob, now: float) -> None:
+        lateness = max(now - job.due, 0)
+        self.stats.polls += 1
+        self.stats.total_lateness += lateness
+        self.stats.max_lateness = max(self.stats.max_lateness, lateness)
+        if not job.started:
+            job.started = True
+            if job.info is not None:
+                # drop "starting in" status set when the job was added
+                job.info.clear()
+        job.started_at = now
+        self._running_per_host[job.host] += 1
+        self._slots[job] = asyncio.get_running_loop().call_later(self.slot_timeout, self._release_overdue, job)
+        self._running[job] = asyncio.create_task(self._execute(job), name=job.name)
+
+    def _release(self, job: PollJob) -> None:
+        """free the slot occupied by the job, if it still holds one"""
+        timer = self._slots.pop(job, None)
+        if timer is not None:
+            timer.cancel()
+            self._running_per_host[job.host] -= 1
+            self._wake()
+
+    def _release_overdue(self, job: PollJob) -> None:
+        self.stats.overdue += 1
+        self.logger.debug(f'update of "{job.name}" takes longer than {self.slot_timeout} seconds, releasing its slot')
+        self._release(job)
+
+    async def _execute(self, job: PollJob) -> None:
+        try:
+            await job.poll()
+        except Exception:
+            self.logger.exception(f'unexpected error in task "{job.name}", task terminated')
+            if self.jobs.get(job.name) is job:
+                self.remove(job.name)
+        finally:
+            self._running.pop(job, None)
+            self._release(job)
+        if job.active:
+            try:
+                delay = self.next_delay(job)
+            except Exception:
+                self.logger.exception(f'failed to get update interval for "{job.name}", task terminated')
+                self.remove(job.name)
+                return
+            self._push(job, self._now() + delay)
+
+    async def run(self) -> None:
+        """dispatch due jobs until cancelled"""
+        self._wakeup = wakeup = asyncio.Event()
+        try:
+            while True:
+                now = self._now()
+                self._collect_due(now)
+                self._dispatch(now)
+                timeout = max(self._heap[0][0] - now, 0) if self._heap else None
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wakeup = None
+            tasks: Set[asyncio.Task] = set(self._running.values())
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.logger.debug(f'scheduler stopped: {self.get_stats()}')
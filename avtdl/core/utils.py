@@ -11,8 +11,8 @@ from contextlib import ContextDecorator
 from pathlib import Path
 from textwrap import shorten
 from time import perf_counter
-from typing import Any, Dict, Hashable, Iterable, Iterator, List, Mapping, MutableMapping, Optional, Tuple, \
-    Type, TypeVar, Union
+from typing import Any, Callable, Dict, Generic, Hashable, Iterable, Iterator, List, Mapping, MutableMapping, Optional, \
+    Tuple, Type, TypeVar, Union
 
 import dateutil.parser
 import dateutil.tz
@@ -22,6 +22,7 @@ from pydantic import AnyHttpUrl, RootModel, ValidationError
 from avtdl.core.interfaces import Record
 
 JSONType = Union[str, int, float, bool, None, Mapping[str, 'JSONType'], List['JSONType']]
+T = TypeVar('T')
 
 
 def parse_to_timestamp(text: Optional[str]) -> Optional[int]:
@@ -156,6 +157,37 @@ class LRUCache:
             self._data.popitem(last=False)
 
 
+class ParsedFileCache(Generic[T]):
+    """
+    Keep results of parsing files, reparsing a file only when it changes
+
+    A file is considered changed when its modification time or size differs
+    from the values it had when it was parsed. The same parsed value is returned
+    to every caller, so it must not be modified. Exceptions raised by the parse
+    function are propagated and not cached, so it should raise on invalid content
+    instead of returning a placeholder value.
+    """
+
+    def __init__(self, parse: Callable[..., T]):
+        self.parse = parse
+        self.entries: Dict[str, Tuple[Tuple[int, int], T]] = {}
+
+    def get(self, path: Path, *args: Any) -> T:
+        """return parse(path, *args), reusing the previous result if the file has not changed"""
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        key = os.path.abspath(path)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        value = self.parse(path, *args)
+        self.entries[key] = (signature, value)
+        return value
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
 def find_matching_field(record: Record, pattern: str, fields: Optional[List[str]] = None) -> Optional[str]:
     name, _ = find_matching_field_name_and_value(record, pattern, fields)
     return name
@@ -242,6 +274,18 @@ def sha1(text: str) -> str:
     return hashlib.sha1(text.encode()).digest().hex()
 
 
+def update_file_hash(digest: 'hashlib._Hash', path: Path, chunk_size: int = 1024 ** 2) -> 'hashlib._Hash':
+    """feed content of the file at path into digest"""
+    with open(path, 'rb') as fp:
+        while chunk := fp.read(chunk_size):
+            digest.update(chunk)
+    return digest
+
+
+def file_sha256(path: Path) -> str:
+    return update_file_hash(hashlib.sha256(), path).hexdigest()
+
+
 def find_all(data: JSONType, jsonpath: str, cache={}) -> List[JSONType]:
     if not isinstance(data, (list, dict)):
         return []
@@ -287,9 +331,6 @@ def is_url(maybe_url: Optional[str]) -> bool:
         return False
 
 
-T = TypeVar('T')
-
-
 def getitem(container: Dict[str, Any], key: str, expected_type: Type[T]) ->T:
     """
     return container.get(key), raise ValueError if result type doesn't match expected_type
@@ -1,4 +1,6 @@
 import asyncio
+import dataclasses
+import datetime
 import json
 import logging
 import pathlib
@@ -10,13 +12,14 @@ import dateutil.zoneinfo
 from aiohttp import web
 from pydantic import BaseModel, ValidationError
 
-from avtdl.core import formatters, info
+from avtdl.core import formatters, info, metrics
 from avtdl.core.actors import Actor
 from avtdl.core.cache import FileCache
 from avtdl.core.chain import Chain
 from avtdl.core.config import ConfigParser, ConfigurationError, SettingsSection
 from avtdl.core.info import get_known_plugins, get_plugin_type, render_markdown
 from avtdl.core.interfaces import AbstractRecordsStorage, Record
+from avtdl.core.lag import LoopLagMonitor
 from avtdl.core.plugins import Plugins
 from avtdl.core.runtime import RuntimeContext, TaskStatus, TerminatedAction
 from avtdl.core.utils import JSONType, strip_text, write_file
@@ -37,6 +40,8 @@ def json_dumps(obj):
     def default(o):
         if isinstance(o, pathlib.Path):
             return str(o)
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
         raise TypeError(f'Object of type {o.__class__.__name__} is not JSON serializable')
 
     return json.dumps(obj, default=default)
@@ -132,6 +137,8 @@ class WebUI:
         self.routes.append(web.get('/motd', self.motd))
         self.routes.append(web.get('/history', self.history))
         self.routes.append(web.get('/tasks', self.tasks))
+        self.routes.append(web.get('/metrics', self.metrics))
+        self.routes.append(web.get('/lag', self.loop_lag))
 
         self.routes.append(web.get('/ui/info/info.html', self.info_webui))
 
@@ -237,10 +244,28 @@ class WebUI:
         motd = f'''
 Server is up and running, working directory is "{pathlib.Path('.').resolve()}".
 Configuration contains {len(self.actors)} actors and {len(self.chains)} chains, loaded from "{self.config_path.resolve()}".
+Resource cache: {self.cache.usage}.
 '''
+        loop_monitor: Optional[LoopLagMonitor] = self.ctx.get_extra('loop_monitor')
+        if loop_monitor is not None:
+            motd += f'Event loop: {loop_monitor.stats}.\n'
         data = {'motd': motd}
         return web.json_response(data, dumps=json_dumps)
 
+    async def metrics(self, _: web.Request) -> web.Response:
+        text = metrics.REGISTRY.render()
+        return web.Response(text=text, content_type='text/plain')
+
+    async def loop_lag(self, _: web.Request) -> web.Response:
+        loop_monitor: Optional[LoopLagMonitor] = self.ctx.get_extra('loop_monitor')
+        if loop_monitor is None:
+            raise web.HTTPNotFound(text='event loop lag monitor is not running')
+        data = {
+            'stats': dataclasses.asdict(loop_monitor.stats),
+            'stalls': [dataclasses.asdict(stall) for stall in reversed(loop_monitor.stalls)]
+        }
+        return web.json_response(data, dumps=json_dumps)
+
     async def info_webui(self, _: web.Request) -> web.Response:
 
         template_path = self.WEBROOT / 'info/info.html'
@@ -322,7 +347,7 @@ Configuration contains {len(self.actors)} actors and {len(self.chains)} chains,
                 db = actor.get_records_storage(view_name)
                 if db is None:
                     continue
-                feeds = db.feeds()
+                feeds = await asyncio.to_thread(db.feeds)
                 if not feeds:
                     continue
                 queries: Dict[str, str] = {}
@@ -381,6 +406,7 @@ Configuration contains {len(self.actors)} actors and {len(self.chains)} chains,
         entity_name = request.query.get('entity') or None
         view_name = request.query.get('view') or None
         page_num = request.query.get('page')
+        cursor = request.query.get('cursor') or None
         page_size = request.query.get('size', RECORDS_PER_PAGE)
 
         if page_num is not None:
@@ -394,6 +420,8 @@ Configuration contains {len(self.actors)} actors and {len(self.chains)} chains,
             per_page = int(page_size)
         except ValueError:
             raise web.HTTPBadRequest(text=f'page size must be positive integer')
+        if per_page < 1:
+            raise web.HTTPBadRequest(text=f'page size must be positive integer')
 
         if actor_name is None:
             raise web.HTTPBadRequest(text=f'missing "actor" parameter')
@@ -405,13 +433,32 @@ Configuration contains {len(self.actors)} actors and {len(self.chains)} chains,
         db: Optional[AbstractRecordsStorage] = actor.get_records_storage(view_name)
         if db is None:
             raise web.HTTPBadRequest(text=f'actor {actor_name} does not have persistent storage')
-        records = db.load_page(page, per_page, feed=entity_name)
-        total_pages = db.page_count(per_page, entity_name)
-        records_view = [self.render_record(record) for record in records]
+
+        if page is not None and cursor is None:
+            records = await asyncio.to_thread(db.load_page, page, per_page, feed=entity_name)
+            total_pages = await asyncio.to_thread(db.page_count, per_page, entity_name)
+            records_view = [self.render_record(record) for record in records]
+
+            data = {
+                'total': total_pages,
+                'current': page,
+                'feed': entity_name,
+                'records': records_view
+            }
+            return web.json_response(data, dumps=json_dumps)
+
+        try:
+            records_page = await asyncio.to_thread(db.load_cursor_page, cursor, per_page, feed=entity_name)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=f'{e}')
+        records_view = [self.render_record(record) for record in records_page.records]
 
         data = {
-            'total': total_pages,
-            'current': page or total_pages,
+            'total': records_page.total,
+            'current': records_page.current,
+            'first': records_page.first,
+            'previous': records_page.previous,
+            'next': records_page.next,
             'feed': entity_name,
             'records': records_view
         }
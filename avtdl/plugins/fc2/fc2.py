@@ -1,19 +1,23 @@
+import asyncio
 import datetime
 import json
+import time
 from json import JSONDecodeError
 from textwrap import shorten
-from typing import Optional, Sequence
+from typing import Dict, Mapping, Optional, Sequence, Set
 
 import pydantic
 from pydantic import Field, PositiveFloat
 
 from avtdl.core.actors import ActorConfig
 from avtdl.core.config import Plugins
+from avtdl.core.executor import run_parser
 from avtdl.core.formatters import Fmt
 from avtdl.core.interfaces import MAX_REPR_LEN, Record
-from avtdl.core.monitors import HttpTaskMonitor, HttpTaskMonitorEntity
+from avtdl.core.monitors import HttpTaskMonitor, HttpTaskMonitorEntity, load_headers
 from avtdl.core.request import HttpClient
-from avtdl.core.utils import parse_timestamp_ms
+from avtdl.core.runtime import RuntimeContext
+from avtdl.core.utils import parse_timestamp_ms, with_prefix
 
 
 @Plugins.register('fc2', Plugins.kind.ASSOCIATED_RECORD)
@@ -60,7 +64,8 @@ class FC2Record(Record):
 
 @Plugins.register('fc2', Plugins.kind.ACTOR_CONFIG)
 class FC2MonitorConfig(ActorConfig):
-    pass
+    use_channel_list: bool = True
+    """when there are more than a couple of entities, check which users are live using the lists of all live channels instead of requesting each user separately"""
 
 
 @Plugins.register('fc2', Plugins.kind.ACTOR_ENTITY)
@@ -85,14 +90,36 @@ class FC2Monitor(HttpTaskMonitor):
 
     Since the endpoint used for monitoring does not provide the user's nickname,
     the name of the configuration entity is used instead.
+
+    With `use_channel_list` enabled and more than two entities, lists of all
+    channels that are currently live are downloaded and shared between entities,
+    and details are only requested for users found in them. This way checking
+    any number of users takes a couple of requests instead of one per user.
     """
 
+    METADATA_URL = 'https://live.fc2.com/api/memberApi.php'
+    CHANNEL_LIST_URLS = ['https://live.fc2.com/contents/allchannellist.php',
+                         'https://live.fc2.com/adult/contents/allchannellist.php']
+
+    def __init__(self, conf: FC2MonitorConfig, entities: Sequence[FC2MonitorEntity], ctx: RuntimeContext):
+        super().__init__(conf, entities, ctx)
+        self.conf: FC2MonitorConfig
+        self.entities: Mapping[str, FC2MonitorEntity]  # type: ignore
+        self.live_channels: Optional[Set[str]] = None
+        self.live_channels_updated: float = float('-inf')
+        self.live_channels_lock = asyncio.Lock()
+        self.channel_lists: Dict[str, Set[str]] = {}
+        """most recent content of every channel list, reused when the server responds with 304"""
 
     async def get_new_records(self, entity: FC2MonitorEntity, client: HttpClient) -> Sequence[FC2Record]:
         record = await self.check_channel(entity, client)
         return [record] if record else []
 
     async def check_channel(self, entity: FC2MonitorEntity, client: HttpClient) -> Optional[FC2Record]:
+        live_channels = await self.get_live_channels(entity, client)
+        if live_channels is not None and entity.user_id not in live_channels:
+            self.logger.debug(f'FC2Monitor for {entity.name}: user {entity.user_id} is not in the list of live channels')
+            return None
         data = await self.get_metadata(entity, client)
         if data is None:
             return None
@@ -111,10 +138,70 @@ class FC2Monitor(HttpTaskMonitor):
         record.name = entity.name
         return record
 
+    def use_channel_list(self) -> bool:
+        # with only a few entities requesting them separately is cheaper than fetching all lists
+        return self.conf.use_channel_list and len(self.entities) > len(self.CHANNEL_LIST_URLS)
+
+    async def get_live_channels(self, entity: FC2MonitorEntity, client: HttpClient) -> Optional[Set[str]]:
+        """
+        return ids of all currently live channels, or None if they should be checked separately
+
+        Lists are shared between all entities and requested again when they are older
+        than half of the shortest update interval, so all entities checked in the meantime
+        make no requests unless some of the monitored users are live.
+        """
+        if not self.use_channel_list():
+            return None
+        async with self.live_channels_lock:
+            max_age = min(e.update_interval for e in self.entities.values()) / 2
+            if time.monotonic() - self.live_channels_updated < max_age:
+                return self.live_channels
+            live_channels: Optional[Set[str]] = set()
+            for url in self.CHANNEL_LIST_URLS:
+                channels = await self.get_channel_list(url, entity, client)
+                if channels is None:
+                    live_channels = None
+                    break
+                live_channels |= channels  # type: ignore
+            self.live_channels = live_channels
+            self.live_channels_updated = time.monotonic()
+            return live_channels
+
+    async def get_channel_list(self, url: str, entity: FC2MonitorEntity, client: HttpClient) -> Optional[Set[str]]:
+        """
+        return ids of channels in the list at the given url, or None if it could not be retrieved
+
+        The list is shared between all entities, so unlike responses to requests made
+        for specific entity, failures to fetch it do not affect update interval of the
+        entity that happened to trigger the update.
+        """
+        state = self.state_storage.get(url, 'GET', None)
+        headers = load_headers(entity.headers_file, with_prefix(self.logger, f'[{entity.name}]'))
+        response = await client.request(url, headers=headers, state=state)
+        if response.status == 304 and url in self.channel_lists:
+            self.logger.debug(f'list of live channels at {url} has not changed')
+            return self.channel_lists[url]
+        if not response.has_content:
+            return None
+        try:
+            channels = await run_parser(self.parse_channel_list, response.text)
+        except (KeyError, TypeError, JSONDecodeError) as e:
+            self.logger.warning(f'failed to parse list of live channels from {url}, falling back to checking every user separately: {e}')
+            # forget Last-Modified and Etag of the broken list, so it is not answered with 304 next time
+            state.etag = state.last_modified = None
+            self.channel_lists.pop(url, None)
+            return None
+        self.channel_lists[url] = channels
+        return channels
+
+    @staticmethod
+    def parse_channel_list(raw_data: str) -> Set[str]:
+        data = json.loads(raw_data)
+        return {str(channel['id']) for channel in data['channel']}
+
     async def get_metadata(self, entity: FC2MonitorEntity, client: HttpClient) -> Optional[str]:
-        url = 'https://live.fc2.com/api/memberApi.php'
         data = {'channel': 1, 'streamid': entity.user_id}
-        text = await self.request(url, entity, client, method='POST', data=data)
+        text = await self.request(self.METADATA_URL, entity, client, method='POST', data=data)
         return text
 
     @staticmethod
@@ -0,0 +1,116 @@
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Union
+
+from avtdl.core.utils import check_dir, file_sha256
+
+
+class ContentIndex:
+    """
+    Persistent index of files stored in download directories
+
+    For every known file its size, modification time and sha256 of the content
+    are stored, allowing to check if a newly downloaded file is a duplicate with
+    a single query instead of reading every candidate file in the directory.
+
+    Files that are already present in a directory when it is seen for the
+    first time, or appear in it later, for example when written by another
+    actor or an external tool, are added to the index without hashing. The
+    directory is scanned again on lookup whenever its modification time
+    has changed since the previous scan. Their hash is calculated
+    lazily, only when a downloaded file of the same size is looked up. Entries
+    for files that were removed or modified externally are updated on lookup.
+
+    Methods perform blocking IO and are intended to be called via asyncio.to_thread().
+    """
+
+    def __init__(self, db_path: Union[str, Path], ignore_suffixes: Sequence[str] = (),
+                 logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger('content_index')
+        self.ignore_suffixes = tuple(ignore_suffixes)
+        self.lock = threading.Lock()
+        self.scanned: Dict[str, int] = {}
+        """directory -> its modification time at the moment of the last scan"""
+        if not db_path == ':memory:' and not Path(db_path).exists():
+            check_dir(Path(db_path).parent)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS files (directory text, name text, size integer, mtime integer, sha256 text, PRIMARY KEY(directory, name))')
+        self.db.execute('CREATE INDEX IF NOT EXISTS index_directory_size ON files (directory, size)')
+        self.db.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+    def add(self, path: Path, sha256: Optional[str] = None) -> None:
+        """store file at path in the index, calculating the hash unless it is provided"""
+        stat = path.stat()
+        sha256 = sha256 or file_sha256(path)
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                            (str(path.parent), path.name, stat.st_size, stat.st_mtime_ns, sha256))
+            self.db.commit()
+
+    def scan(self, directory: Path) -> None:
+        """add files not yet present in the index, if the directory has changed since the last scan"""
+        key = str(directory)
+        try:
+            mtime = directory.stat().st_mtime_ns
+        except OSError:
+            return
+        if self.scanned.get(key) == mtime:
+            return
+        with self.lock:
+            known = {row[0] for row in self.db.execute('SELECT name FROM files WHERE directory = ?', (key,))}
+            rows = []
+            for item in directory.iterdir():
+                if item.name in known or item.name.endswith(self.ignore_suffixes):
+                    continue
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                if item.is_file():
+                    rows.append((key, item.name, stat.st_size, stat.st_mtime_ns, None))
+            self.db.executemany('INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?)', rows)
+            self.db.commit()
+            self.scanned[key] = mtime
+        if rows:
+            self.logger.debug(f'added {len(rows)} existing files in "{directory}" to the index')
+
+    def find_duplicate(self, directory: Path, stem: str, size: int, sha256: str) -> Optional[Path]:
+        """return a file in directory which name starts with stem and has the given content, if indexed"""
+        self.scan(directory)
+        key = str(directory)
+        with self.lock:
+            candidates = self.db.execute('SELECT name, mtime, sha256 FROM files WHERE directory = ? AND size = ?',
+                                         (key, size)).fetchall()
+        for name, mtime, stored_sha256 in candidates:
+            candidate = directory / name
+            if not candidate.stem.startswith(stem):
+                continue
+            try:
+                stat = candidate.stat()
+            except OSError:
+                stat = None
+            if stat is None or not candidate.is_file():
+                with self.lock:
+                    self.db.execute('DELETE FROM files WHERE directory = ? AND name = ?', (key, name))
+                    self.db.commit()
+                continue
+            if stat.st_size != size or stat.st_mtime_ns != mtime or stored_sha256 is None:
+                try:
+                    self.add(candidate)
+                except OSError as e:
+                    self.logger.debug(f'failed to hash "{candidate}": {e}')
+                    continue
+                if stat.st_size != size:
+                    continue
+                with self.lock:
+                    [stored_sha256] = self.db.execute('SELECT sha256 FROM files WHERE directory = ? AND name = ?',
+                                                      (key, name)).fetchone()
+            if stored_sha256 == sha256:
+                return candidate
+        return None
@@ -3,20 +3,23 @@ import logging
 import os
 import re
 import shutil
+import sqlite3
 from pathlib import Path
-from typing import List, Mapping, Optional, Sequence
+from typing import List, Mapping, Optional, Sequence, Set, Union
 
 from pydantic import AnyUrl, Field, NonNegativeFloat, RootModel, ValidationError, field_validator, model_validator
 
 from avtdl.core.actions import QueueAction, QueueActionConfig, QueueActionEntity
 from avtdl.core.cache import FileCache, find_free_suffix, find_with_suffix
 from avtdl.core.config import SettingsSection
+from avtdl.core.db import validate_db_path
 from avtdl.core.formatters import Fmt, sanitize_filename
 from avtdl.core.interfaces import Record
 from avtdl.core.plugins import Plugins
-from avtdl.core.request import CHUNK_SIZE, HttpClient, RemoteFileInfo
+from avtdl.core.request import CHUNK_SIZE, DownloadProgress, HttpClient, RemoteFileInfo
 from avtdl.core.runtime import RuntimeContext
-from avtdl.core.utils import check_dir, is_url, sha1
+from avtdl.core.utils import check_dir, file_sha256, is_url, sha1
+from avtdl.plugins.file.content_index import ContentIndex
 
 
 @Plugins.register('download', Plugins.kind.ACTOR_CONFIG)
@@ -25,6 +28,24 @@ class FileDownloadConfig(QueueActionConfig):
     """limit for simultaneously active download tasks among all entities. Note that each entity will still process records sequentially regardless of this setting"""
     partial_file_suffix: str = '.part'
     """appended to a name of the file that is not yet completely downloaded"""
+    chunk_size: int = Field(default=CHUNK_SIZE, ge=1024)
+    """size of chunks the downloaded data is received and written to disk by, in bytes. Bounds memory used by each download"""
+    index_path: Union[Path, str] = Field(default='db/', validate_default=True)
+    """path to the sqlite database file storing sizes and hashes of files in download directories, used to detect duplicates.
+    Might specify a path to a directory containing the file (with trailing slash)
+    or a direct path to the file itself (without a slash). If special value `:memory:` is used,
+    the index is rebuilt on every startup"""
+
+    @field_validator('index_path')
+    @classmethod
+    def str_to_path(cls, path: Union[Path, str]):
+        return validate_db_path(path)
+
+    @model_validator(mode='after')
+    def handle_index_directory(self):
+        if isinstance(self.index_path, Path) and self.index_path.is_dir():
+            self.index_path = self.index_path.joinpath(f'download/{self.name}.sqlite')
+        return self
 
 
 @Plugins.register('download', Plugins.kind.ACTOR_ENTITY)
@@ -72,8 +93,8 @@ class FileDownload(QueueAction):
     (such as "https") or a list of such urls.
 
     Primarily designed for downloading images attached to a post, or thumbnails.
-    Does not support resuming interrupted downloads or detecting that this exact file is
-    already stored at target location without downloading it again.
+    Does not support detecting that this exact file is already stored at target
+    location without downloading it again.
 
     File extension and name are inferred from HTTP headers and path part of the url,
     unless provided explicitly with `extension` and `filename` parameters.
@@ -81,11 +102,18 @@ class FileDownload(QueueAction):
     is initially stored under a temporary name (currently an SHA1 of the url) in the
     download directory, and then renamed to target filename.
 
+    Download progress is stored next to the temporary file. If the download gets
+    interrupted, it is continued from where it stopped the next time the same url
+    is processed, provided the server supports range requests and the remote file
+    has not changed since.
+
     If a file with given name already exists, depending on an `overwrite` setting a new file will either
     overwrite it or get stored under different name, generated by combining
     the base name with a number added as part of `rename_suffix`.
     If, however, an exact copy of the new file is found among the files in target directory
     sharing the base name, the new file will be deleted, giving preference to the existing copy.
+    To find copies without reading existing files every time, sizes and hashes of files
+    in download directories are kept in an index stored at `index_path`.
     """
 
     def __init__(self, conf: FileDownloadConfig, entities: Sequence[FileDownloadEntity], ctx: RuntimeContext):
@@ -93,6 +121,10 @@ class FileDownload(QueueAction):
         self.conf: FileDownloadConfig
         self.entities: Mapping[str, FileDownloadEntity]
         self.concurrency_limit = asyncio.BoundedSemaphore(value=conf.max_concurrent_downloads)
+        self.active_downloads: Set[Path] = set()
+        self.index = ContentIndex(conf.index_path,
+                                  ignore_suffixes=[conf.partial_file_suffix, conf.partial_file_suffix + '.progress'],
+                                  logger=self.logger.getChild('index'))
 
     def _get_urls_list(self, entity: FileDownloadEntity, record: Record) -> Optional[List[str]]:
         field = getattr(record, entity.url_field, None)
@@ -125,8 +157,8 @@ class FileDownload(QueueAction):
         Handle download-related stuff: generating filenames, moving files, error reporting
 
         - generate tempfile name from url hash
-        - if it exists abort
-        - perform the download into a temp file
+        - if it is being downloaded or can not be resumed abort
+        - perform or resume the download into a temp file
         - generate resulting file name
         - if exists either rename or replace depending on settings
         """
@@ -137,13 +169,20 @@ class FileDownload(QueueAction):
             return
 
         temp_file = path / Path(sha1(url)).with_suffix(self.conf.partial_file_suffix)
-        if temp_file.exists():
+        if temp_file in self.active_downloads:
+            logger.warning(f'aborting download of "{url}": download to "{temp_file}" is already in progress')
+            return
+        if temp_file.exists() and DownloadProgress.load(temp_file) is None:
             logger.warning(
                 f'aborting download of "{url}": temporary file "{temp_file}" already exists, meaning download is already in progress or download process has been interrupted abruptly')
             return
 
         logger.debug(f'downloading "{url}" to "{temp_file}"')
-        info = await self.download(logger, client, url, temp_file)
+        self.active_downloads.add(temp_file)
+        try:
+            info = await self.download(logger, client, url, temp_file)
+        finally:
+            self.active_downloads.discard(temp_file)
         if info is None:
             return None
 
@@ -165,13 +204,11 @@ class FileDownload(QueueAction):
             logger.warning(f'failed to process record: {e}')
             return
         if path.exists() and not entity.overwrite:
-            for p in path.parent.iterdir():
-                if not p.stem.startswith(path.stem):
-                    continue
-                if has_same_content(temp_file, p):
-                    self.logger.info(f'file "{temp_file}" is already stored as "{p}", deleting')
-                    remove_files([temp_file])
-                    return
+            duplicate = await asyncio.to_thread(self.find_duplicate, temp_file, path, info)
+            if duplicate is not None:
+                self.logger.info(f'file "{temp_file}" is already stored as "{duplicate}", deleting')
+                remove_files([temp_file])
+                return
             new_path = Path(path)  # making a copy
             i = 0
             while new_path.exists():
@@ -180,7 +217,21 @@ class FileDownload(QueueAction):
                 new_name = path.stem + suffix
                 new_path = new_path.with_stem(new_name)
             path = new_path
-        move_file(temp_file, path, logger)
+        if move_file(temp_file, path, logger):
+            try:
+                await asyncio.to_thread(self.index.add, path, info.sha256)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f'failed to add "{path}" to the index: {e}')
+
+    def find_duplicate(self, temp_file: Path, path: Path, info: RemoteFileInfo) -> Optional[Path]:
+        """return existing file in the directory of path sharing its base name and the content of temp_file"""
+        try:
+            size = temp_file.stat().st_size
+            sha256 = info.sha256 or file_sha256(temp_file)
+            return self.index.find_duplicate(path.parent, path.stem, size, sha256)
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(f'failed to look up copies of "{temp_file}" in the index: {e}')
+            return None
 
     async def download(self, logger: logging.Logger, client: HttpClient,
                        url: str, output_file: Path) -> Optional[RemoteFileInfo]:
@@ -189,7 +240,7 @@ class FileDownload(QueueAction):
         try:
             async with semaphore:
                 logger.debug(f'acquired semaphore({semaphore._value}), downloading "{url}" to "{output_file}"')
-                info = await client.download_file(output_file, url)
+                info = await client.download_file(output_file, url, chunk_size=self.conf.chunk_size, resume=True)
         except Exception as e:
             logger.exception(f'unexpected error when downloading "{url}" to "{output_file}": {e}')
             return None
@@ -197,29 +248,6 @@ class FileDownload(QueueAction):
         return info
 
 
-def has_same_content(file1: Path, file2: Path) -> bool:
-    """return True if file1 and file2 are both files and have the same content"""
-    try:
-        if not file1.exists() or not file2.exists():
-            return False
-        if file1.is_dir() or file2.is_dir():
-            return False
-        if file1.lstat().st_size != file2.lstat().st_size:
-            return False
-        with (file1.open('rb') as fp1, file2.open('rb') as fp2):
-            while True:
-                chunk1 = fp1.read(CHUNK_SIZE)
-                chunk2 = fp2.read(CHUNK_SIZE)
-                if chunk1 != chunk2:
-                    return False
-                elif chunk1 and chunk2:
-                    continue
-                else:
-                    return True
-    except OSError:
-        return False
-
-
 class UrlList(RootModel):
     root: Sequence[AnyUrl]
 
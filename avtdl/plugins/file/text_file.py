@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
+import codecs
+import io
+import locale
 import os
 import re
 from pathlib import Path
-from typing import Any, List, Optional, Sequence
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, Sequence
 
 from pydantic import Field, field_validator
 
@@ -12,10 +15,19 @@ from avtdl.core.config import Plugins
 from avtdl.core.formatters import Fmt, OutputFormat, sanitize_filename
 from avtdl.core.interfaces import Event, EventType, Record, TextRecord
 from avtdl.core.monitors import HIGHEST_UPDATE_INTERVAL, TaskMonitor, TaskMonitorEntity
+from avtdl.core.runtime import RuntimeContext
 from avtdl.core.utils import check_dir, read_file
+from avtdl.plugins.file.writer import FileWriters, WriteFailure
 
 Plugins.register('from_file', Plugins.kind.ASSOCIATED_RECORD)(TextRecord)
 
+READ_SIZE = 1024 * 1024
+"""size of a single read from the monitored file in follow mode"""
+MAX_READ_SIZE = 16 * 1024 * 1024
+"""maximum amount of data read from the monitored file in a single update in follow mode, the rest is read on the next updates"""
+FINGERPRINT_SIZE = 256
+"""size of the beginning of the monitored file compared between updates to detect it has been replaced"""
+
 
 @Plugins.register('from_file', Plugins.kind.ACTOR_CONFIG)
 class FileMonitorConfig(ActorConfig):
@@ -44,6 +56,8 @@ class FileMonitorEntity(TaskMonitorEntity):
     """internal variable to persist state between updates. Used to check if the file has changed"""
     inode: int = Field(exclude=True, default=-1)
     """internal variable to persist state between updates. Used to check if the file was replaced with a new one"""
+    head: bytes = Field(exclude=True, default=b'')
+    """internal variable to persist state between updates. Used to check if the file was replaced with a new one that got the same inode"""
     position: int = Field(exclude=True, default=-1)
     """internal variable to persist state between updates. Used to hold current position in the file in follow mode. Value -1 indicates that file hasn't yet been read since application start"""
     text_buffer: str = Field(exclude=True, default='')
@@ -135,79 +149,105 @@ class FileMonitor(TaskMonitor):
             entity.mtime = current_mtime
             return True
 
-    def has_been_replaced(self, entity: FileMonitorEntity) -> bool:
-        if not self.exists(entity):
-            entity.inode = -1
-            return False
-        try:
-            current_inode = os.stat(entity.path).st_ino
-        except OSError as e:
-            self.logger.debug(f'[{entity.name}] failed to get file info for "{entity.path}": {e}')
-            return False
-        if current_inode == entity.inode:
-            return False
-        else:
-            entity.inode = current_inode
+    @staticmethod
+    def has_been_replaced(entity: FileMonitorEntity, stat: os.stat_result, head: bytes) -> bool:
+        """check if the file is not the one read on previous update, or it was truncated since then"""
+        if stat.st_ino != entity.inode:
             return True
-
-    def get_file_content(self, entity: FileMonitorEntity) -> str:
-        if not entity.follow:
+        if stat.st_size < entity.position:
+            return True
+        # inode numbers of removed files get reused, so also check the beginning of the file is the same
+        return head[:len(entity.head)] != entity.head
+
+    def read_new_text(self, entity: FileMonitorEntity) -> Iterator[str]:
+        """
+        return iterator over text added to the file since the previous update, in blocks ending on a line boundary
+
+        At most about MAX_READ_SIZE bytes are read in a single update, stopping at the end
+        of the last complete line. Entity position is only updated after all blocks have
+        been consumed.
+        """
+        fp = open(entity.path, 'rb')
+        try:
+            stat = os.fstat(fp.fileno())
+            head = fp.read(FINGERPRINT_SIZE)
+            if self.has_been_replaced(entity, stat, head):
+                entity.text_buffer = ''
+                if entity.position != -1:
+                    entity.position = 0
+            entity.inode = stat.st_ino
+            entity.head = head
             if entity.position == -1:
-                entity.position = 0
-                if entity.quiet_start:
-                    return ''
-            return read_file(entity.path, entity.encoding)
+                entity.position = stat.st_size if entity.quiet_start else 0
+            fp.seek(entity.position, os.SEEK_SET)
+        except Exception:
+            fp.close()
+            raise
+        return self._read_blocks(entity, fp)
 
-        if self.has_been_replaced(entity):
-            entity.text_buffer = ''
+    @staticmethod
+    def _read_blocks(entity: FileMonitorEntity, fp: BinaryIO) -> Iterator[str]:
+        encoding = entity.encoding or locale.getpreferredencoding(False)
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+        with fp:
+            remainder = ''
+            total = 0
+            complete = False
+            while True:
+                if total >= MAX_READ_SIZE and complete:
+                    # the rest of the file, starting with the incomplete last line,
+                    # will be read on the next update even if it does not change
+                    entity.mtime = -1
+                    undecoded, flags = decoder.getstate()
+                    pending_cr = '\r' if flags & 1 else ''
+                    unread = len(undecoded) + len((remainder + pending_cr).encode(encoding))
+                    entity.position = fp.tell() - unread
+                    return
+                data = fp.read(READ_SIZE)
+                if not data:
+                    break
+                total += len(data)
+                text = remainder + decoder.decode(data)
+                cut = text.rfind('\n') + 1
+                if cut == 0:
+                    if len(text) < MAX_READ_SIZE:
+                        # no line ends in the text read so far
+                        remainder = text
+                        continue
+                    cut = len(text)
+                remainder = text[cut:]
+                complete = True
+                yield text[:cut]
+            if remainder:
+                yield remainder
+            undecoded, _ = decoder.getstate()
+            entity.position = fp.tell() - len(undecoded)
+
+    def read_text(self, entity: FileMonitorEntity) -> Iterable[str]:
+        if entity.follow:
+            return self.read_new_text(entity)
+        if entity.position == -1:
             entity.position = 0
-        with open(entity.path, 'rt', encoding=entity.encoding) as fp:
-            if entity.position == -1:
-                if entity.quiet_start:
-                    entity.position = fp.seek(0, os.SEEK_END)
-                else:
-                    entity.position = 0
-            else:
-                fp.seek(entity.position, os.SEEK_SET)
-            text = fp.read()
-            entity.position = fp.tell()
-            return text
+            if entity.quiet_start:
+                return []
+        return [read_file(entity.path, entity.encoding)]
 
-    def split_text(self, entity: FileMonitorEntity, text: str) -> List[str]:
+    def split_text(self, entity: FileMonitorEntity, blocks: Iterable[str]) -> List[str]:
         if not entity.split_lines:
-            return [text]
-        text = entity.text_buffer + text
+            return [''.join(blocks)]
+        splitter = RecordSplitter(entity.record_start, entity.record_end, entity.text_buffer)
         entity.text_buffer = ''  # clear buffer in case processing gets interrupted
-        return self.split_text_start_end(text, entity)
-
-    @staticmethod
-    def split_text_start_end(text:str, entity: FileMonitorEntity) -> List[str]:
-        lines: List[str] = []
-        position = 0
-
-        while True:
-            if position >= len(text):
-                break
-            start_match = re.search(entity.record_start, text[position:], re.MULTILINE)
-            if start_match is None:
-                # no more records in the rest of text
-                break
-            start = position + start_match.start()
-            middle = position + start_match.end()
-            end_match = re.search(entity.record_end, text[middle:], re.MULTILINE)
-            if end_match is None:
-                # text ended mid-record, store it in the buffer
-                entity.text_buffer = text[start:]
-                break
-            end = middle + end_match.end() + 1
-            lines.append(text[start:end])
-            position = end
+        lines = [line for block in blocks for line in splitter.feed(block)]
+        if len(splitter.partial) > MAX_READ_SIZE:
+            self.logger.warning(f'[{entity.name}] no end of the record found in {len(splitter.partial)} characters of "{entity.path}", discarding it')
+        else:
+            entity.text_buffer = splitter.partial
         return lines
 
     def get_records(self, entity: FileMonitorEntity) -> List[TextRecord]:
         records = []
-        text = self.get_file_content(entity)
-        lines = self.split_text(entity, text)
+        blocks = self.read_text(entity)
+        lines = self.split_text(entity, blocks)
         for line in lines:
             text = line.strip()
             if text:
@@ -216,6 +256,44 @@ class FileMonitor(TaskMonitor):
         return records
 
 
+class RecordSplitter:
+    """
+    Split text into records delimited by matches of record_start and record_end patterns
+
+    Text can be fed in consecutive blocks. If the last record in a block does not end
+    in it, the beginning of the record is kept in `partial` and prepended to the next
+    block. Every character of the text is only scanned once, unless a record spans
+    over multiple blocks.
+    """
+
+    def __init__(self, record_start: str, record_end: str, partial: str = '') -> None:
+        self.start = re.compile(record_start, re.MULTILINE)
+        self.end = re.compile(record_end, re.MULTILINE)
+        self.partial = partial
+
+    def feed(self, text: str) -> List[str]:
+        """return records ending in the text"""
+        if self.partial:
+            text = self.partial + text
+            self.partial = ''
+        lines: List[str] = []
+        position = 0
+        while position < len(text):
+            start_match = self.start.search(text, position)
+            if start_match is None:
+                # no more records in the rest of text
+                break
+            end_match = self.end.search(text, start_match.end())
+            if end_match is None:
+                # text ended mid-record, keep it until the next block
+                self.partial = text[start_match.start():]
+                break
+            end = end_match.end() + 1
+            lines.append(text[start_match.start():end])
+            position = end
+        return lines
+
+
 Plugins.register('to_file', Plugins.kind.ASSOCIATED_RECORD)(Event)
 
 
@@ -266,6 +344,11 @@ class FileAction(Action):
     values of the record fields in json format. For text representation it is possible
     to provide a custom format template.
 
+    Records are not written immediately, but collected and written in the
+    background about once a second, keeping output files open between writes.
+    Each record is written as a whole, so a program reading the file
+    never sees only a part of it.
+
     Produces `Event` with `error` type if writing to target file fails.
 
     Note discrepancy between default value of `encoding` setting between `from_file`
@@ -276,43 +359,55 @@ class FileAction(Action):
     using system-wide encoding.
     """
 
+    def __init__(self, conf: FileActionConfig, entities: Sequence[FileActionEntity], ctx: RuntimeContext):
+        super().__init__(conf, entities, ctx)
+        self.writers = FileWriters(logger=self.logger)
+
     def handle(self, entity: FileActionEntity, record: Record):
         filename = Fmt.format(entity.filename, record, tz=entity.timezone)
         filename = sanitize_filename(filename)
         if entity.path is None:
             path = Path.cwd().joinpath(filename)
         else:
-            path = Fmt.format_path(entity.path, record, tz=entity.timezone)
-            ok = check_dir(path)
-            if not ok:
-                self.logger.warning(f'[{entity.name}] check "{path}" is a valid and writeable directory')
+            directory = Fmt.format_path(entity.path, record, tz=entity.timezone)
+            path = directory.joinpath(filename)
+            # directory of a file currently being written to is known to exist
+            if path not in self.writers and not check_dir(directory):
+                self.logger.warning(f'[{entity.name}] check "{directory}" is a valid and writeable directory')
+                return
+        if not entity.overwrite:
+            # files currently being written to are known to exist without checking
+            try:
+                exists = path in self.writers or path.exists()
+            except OSError as e:
+                self.logger.warning(f'[{entity.name}] failed to process record: {e}')
+                return
+            if exists:
+                self.logger.debug(f'[{entity.name}] file {path} already exists, not overwriting')
                 return
-            path = path.joinpath(filename)
-        try:
-            path.exists()
-        except OSError as e:
-            self.logger.warning(f'[{entity.name}] failed to process record: {e}')
-            return
-        if path.exists() and not entity.overwrite:
-            self.logger.debug(f'[{entity.name}] file {path} already exists, not overwriting')
-            return
-        mode = 'at' if entity.append else 'wt'
         try:
             if entity.output_template is not None and entity.output_format == OutputFormat.text:
                 text = Fmt.format(entity.output_template, record, entity.missing, tz=entity.timezone)
             else:
                 text = Fmt.save_as(record, entity.output_format)
             text = entity.prefix + text + entity.postfix
+            if os.linesep != '\n':
+                text = text.replace('\n', os.linesep)
+            data = text.encode(entity.encoding or locale.getpreferredencoding(False))
         except Exception as e:
             message = f'[{entity.name}] failed to convert record "{record!r}" into a text: {e}'
             self.on_record(entity, Event(event_type=EventType.error, text=message, record=record))
             self.logger.exception(message)
             return
-        try:
-            with open(path, mode, encoding=entity.encoding) as fp:
-                fp.write(text)
-        except OSError as e:
-            message = f'[{entity.name}] error writing to output file "{path}": {e}'
+        failure = self.writers.write(path, data, truncate=not entity.append, context=(entity, record))
+        if failure is not None:
+            self.on_write_failure(failure)
+
+    def on_write_failure(self, failure: WriteFailure) -> None:
+        for entity, record in failure.context:
+            message = f'[{entity.name}] error writing to output file "{failure.path}": {failure.error}'
             self.on_record(entity, Event(event_type=EventType.error, text=message, record=record))
             self.logger.warning(message)
 
+    async def run(self) -> None:
+        await self.writers.run(self.on_write_failure)
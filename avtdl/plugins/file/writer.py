@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, List, Optional
+
+
+@dataclass
+class WriteFailure:
+    path: Path
+    error: OSError
+    context: List[Any]
+    """objects passed to `write()` along with the data that failed to be written"""
+
+
+class BufferedFile:
+    """
+    Pending writes to a single file and the handle used to write them
+
+    Data is only ever written in whole chunks passed to `add()`. If writing
+    fails midway, the file is truncated back to the size it had before,
+    so a reader never sees a partially written record.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.chunks: List[bytes] = []
+        self.context: List[Any] = []
+        self.size = 0
+        self.truncate = False
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        """protects pending chunks, held for a short time by both the event loop and the writer thread"""
+        self.io_lock = threading.Lock()
+        """serializes operations on the file handle"""
+        self.fp: Optional[BinaryIO] = None
+        self.inode: Optional[int] = None
+
+    def add(self, data: bytes, truncate: bool, context: Any = None) -> int:
+        """
+        buffer data to be written at the end of the file, return the size of pending data
+
+        If truncate is set, the file content, including data buffered earlier, is replaced.
+        """
+        with self.lock:
+            if truncate:
+                self.chunks.clear()
+                self.context.clear()
+                self.size = 0
+                self.truncate = True
+            self.chunks.append(data)
+            self.context.append(context)
+            self.size += len(data)
+            self.last_used = time.monotonic()
+            return self.size
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.chunks)
+
+    @property
+    def is_open(self) -> bool:
+        return self.fp is not None
+
+    def _open(self) -> BinaryIO:
+        """return open handle, reopening it if the file was removed or replaced since the last write"""
+        if self.fp is not None:
+            try:
+                replaced = os.stat(self.path).st_ino != self.inode
+            except OSError:
+                replaced = True
+            if replaced:
+                self._close()
+        if self.fp is None:
+            self.fp = open(self.path, 'ab', buffering=0)
+            self.inode = os.fstat(self.fp.fileno()).st_ino
+        return self.fp
+
+    def flush(self) -> Optional[WriteFailure]:
+        """write pending data to the file in a single call"""
+        with self.lock:
+            if not self.chunks:
+                return None
+            chunks, self.chunks = self.chunks, []
+            context, self.context = self.context, []
+            truncate, self.truncate = self.truncate, False
+            self.size = 0
+        data = b''.join(chunks)
+        with self.io_lock:
+            position: Optional[int] = None
+            try:
+                fp = self._open()
+                if truncate:
+                    fp.truncate(0)
+                position = fp.seek(0, os.SEEK_END)
+                view = memoryview(data)
+                while view:
+                    written = fp.write(view)
+                    view = view[written:]
+            except OSError as e:
+                if self.fp is not None and position is not None:
+                    try:
+                        self.fp.truncate(position)
+                    except OSError:
+                        pass
+                self._close()
+                return WriteFailure(self.path, e, context)
+        return None
+
+    def _close(self) -> None:
+        if self.fp is not None:
+            try:
+                self.fp.close()
+            except OSError:
+                pass
+            self.fp = None
+            self.inode = None
+
+    def close(self) -> None:
+        with self.io_lock:
+            self._close()
+
+
+class FileWriters:
+    """
+    Buffered writers to multiple files, keeping them open between writes
+
+    While `run()` task is active, data passed to `write()` is buffered per file
+    and written in the background every `flush_interval` seconds, or earlier if
+    pending data for a file exceeds `max_buffer_size` bytes. Remaining data
+    is written when the task is cancelled. Files that were not written to for
+    `idle_timeout` seconds are closed, as well as least recently used ones when
+    there are more than `max_open_files` of them.
+
+    Without `run()` task data is written and the file is closed immediately.
+    """
+
+    FLUSH_INTERVAL: float = 1
+    MAX_BUFFER_SIZE: int = 64 * 1024
+    MAX_OPEN_FILES: int = 32
+    IDLE_TIMEOUT: float = 60
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_buffer_size: int = MAX_BUFFER_SIZE,
+                 max_open_files: int = MAX_OPEN_FILES, idle_timeout: float = IDLE_TIMEOUT,
+                 logger: Optional[logging.Logger] = None) -> None:
+        self.logger = logger or logging.getLogger('writer')
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self.max_open_files = max_open_files
+        self.idle_timeout = idle_timeout
+        self.files: typing.OrderedDict[Path, BufferedFile] = OrderedDict()
+        self.deferred = False
+        """when enabled, write() only buffers data, leaving it to the run() task to write it"""
+        self.flush_needed: Optional[asyncio.Event] = None
+        """set to write buffered data without waiting for the flush interval, exists while run() is active"""
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self.files
+
+    def write(self, path: Path, data: bytes, truncate: bool = False, context: Any = None) -> Optional[WriteFailure]:
+        """
+        write data at the end of the file at path, replacing file content if truncate is set
+
+        When writing is deferred, always returns None, failures are reported by the run() task instead.
+        """
+        file = self.files.get(path)
+        if file is None:
+            file = self.files[path] = BufferedFile(path)
+        else:
+            self.files.move_to_end(path)
+        size = file.add(data, truncate, context)
+        if not self.deferred:
+            failure = file.flush()
+            file.close()
+            self.files.pop(path, None)
+            return failure
+        if size >= self.max_buffer_size and self.flush_needed is not None:
+            self.flush_needed.set()
+        return None
+
+    @staticmethod
+    def _flush(files: List[BufferedFile]) -> List[WriteFailure]:
+        failures = []
+        for file in files:
+            failure = file.flush()
+            if failure is not None:
+                failures.append(failure)
+        return failures
+
+    @staticmethod
+    def _close(files: List[BufferedFile]) -> None:
+        for file in files:
+            file.close()
+
+    def _collect_unused(self) -> List[BufferedFile]:
+        """forget files that were idle for too long, or are least recently used over the open files limit"""
+        unused = []
+        deadline = time.monotonic() - self.idle_timeout
+        excess = len(self.files) - self.max_open_files
+        for path, file in list(self.files.items()):
+            if file.pending:
+                continue
+            if excess > 0 or file.last_used < deadline:
+                unused.append(self.files.pop(path))
+                excess -= 1
+        return unused
+
+    async def run(self, on_failure: Callable[[WriteFailure], None]) -> None:
+        """write buffered data periodically until cancelled, then write the rest and close all files"""
+        # created here rather than in __init__ to be bound to the running loop on older Python versions
+        self.flush_needed = flush_needed = asyncio.Event()
+        self.deferred = True
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(flush_needed.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                flush_needed.clear()
+                failures = await asyncio.to_thread(self._flush, list(self.files.values()))
+                for failure in failures:
+                    on_failure(failure)
+                unused = self._collect_unused()
+                if unused:
+                    await asyncio.to_thread(self._close, unused)
+        finally:
+            self.deferred = False
+            self.flush_needed = None
+            files = list(self.files.values())
+            self.files.clear()
+            for failure in self._flush(files):
+                on_failure(failure)
+            self._close(files)
@@ -1,8 +1,10 @@
 import asyncio
 import json
+import sqlite3
+import time
 from collections import OrderedDict
 from pathlib import Path
-from typing import List, Mapping, Optional, Sequence
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
 
 from pydantic import Field, field_validator
 
@@ -12,6 +14,7 @@ from avtdl.core.interfaces import Event, Record, TextRecord
 from avtdl.core.plugins import Plugins
 from avtdl.core.runtime import RuntimeContext
 from avtdl.core.utils import find_matching_field
+from avtdl.plugins.filters.history import SeenHistory
 
 
 @Plugins.register('filter.noop', Plugins.kind.ACTOR_CONFIG)
@@ -244,7 +247,9 @@ class JsonFilter(Filter):
 @Plugins.register('filter.deduplicate', Plugins.kind.ACTOR_CONFIG)
 class DeduplicateFilterConfig(ActorConfig):
     history_dir: Optional[Path] = Field(default='cache/deduplicate/', validate_default=True)
-    """directory to store entities history between restarts"""
+    """directory to store entities history between restarts. Leave empty to only keep history in memory"""
+    commit_interval: float = Field(gt=0, default=10)
+    """how often, in seconds, newly seen values are written to the history database"""
 
     @field_validator('history_dir')
     @classmethod
@@ -262,10 +267,12 @@ class DeduplicateFilterConfig(ActorConfig):
 class DeduplicateFilterEntity(FilterEntity):
     field: str = 'hash'
     """field name to use for comparison"""
-    history_size: int = 10000
+    history_size: int = Field(gt=0, default=10000)
     """how many old records should be kept in memory"""
+    history_ttl: Optional[float] = Field(gt=0, default=None)
+    """records seen more than this many hours ago are forgotten and let through again. Leave empty to only limit history by size"""
     history: OrderedDict = Field(exclude=True, repr=False, default=OrderedDict())
-    """internal variable to persist state between updates. Used to keep fields of already seen records"""
+    """internal variable to persist state between updates. Maps fields of already seen records to the time they were seen, oldest first"""
 
 
 @Plugins.register('filter.deduplicate', Plugins.kind.ACTOR)
@@ -286,14 +293,21 @@ class DeduplicateFilter(Filter):
     in a chain, that gather records from Youtube channel and Youtube RSS monitors,
     by passing them to an entity of this filter with `field` set to `video_id`.
 
-    Note, that history is kept in memory, so it will not be persisted between
-    restarts.
+    Up to `history_size` most recently seen values are remembered. With `history_ttl`
+    set, values seen earlier than that are forgotten even if the history is not full.
+
+    Unless `history_dir` is empty, newly seen values are written to a database
+    in this directory every `commit_interval` seconds and restored on startup,
+    so the history survives restarts and only a few seconds of it are lost
+    if the application is terminated abruptly.
     """
 
     def __init__(self, conf: DeduplicateFilterConfig, entities: Sequence[DeduplicateFilterEntity], ctx: RuntimeContext):
         super().__init__(conf, entities, ctx)
         self.conf: DeduplicateFilterConfig
         self.entities: Mapping[str, DeduplicateFilterEntity]  # type: ignore
+        self.store: Optional[SeenHistory] = None
+        self.flush_needed: Optional[asyncio.Event] = None
 
     def match(self, entity: DeduplicateFilterEntity, record: Record) -> Optional[Record]:
         field = getattr(record, entity.field, None)
@@ -312,6 +326,8 @@ class DeduplicateFilter(Filter):
 
         value = str(value)  # support non-hashable fields
 
+        now = time.time()
+        self.expire(entity, now)
         if value in entity.history:
             self.logger.debug(f'[{entity.name}] record with {entity.field}={value} has already been seen, dropping')
             return None
@@ -319,39 +335,101 @@ class DeduplicateFilter(Filter):
         while len(entity.history) >= entity.history_size:
             entity.history.popitem(last=False)
 
-        entity.history[value] = True
-        entity.history.move_to_end(value)
+        entity.history[value] = now
+        if self.store is not None and self.store.add(entity.name, value, now) and self.flush_needed is not None:
+            self.flush_needed.set()
         self.logger.debug(f'[{entity.name}] record with {entity.field}={value} has not yet been seen, letting through')
         return record
 
+    @staticmethod
+    def expire(entity: DeduplicateFilterEntity, now: float) -> None:
+        """drop values seen earlier than entity.history_ttl hours ago"""
+        if entity.history_ttl is None:
+            return
+        not_before = now - entity.history_ttl * 3600
+        while entity.history:
+            oldest = next(iter(entity.history.values()))
+            if oldest >= not_before:
+                break
+            entity.history.popitem(last=False)
+
+    def _legacy_history_file(self, entity: DeduplicateFilterEntity) -> Path:
+        assert self.conf.history_dir is not None
+        return self.conf.history_dir / Path(f'{self.conf.name}-{entity.name}-history.json')
+
+    def _load_history(self, store: SeenHistory, entity: DeduplicateFilterEntity) -> List[Tuple[str, float]]:
+        """return stored history of the entity, importing history file written by older versions first"""
+        filename = self._legacy_history_file(entity)
+        if filename.exists() and filename.is_file():
+            with open(filename, 'rt', encoding='utf8') as fp:
+                history = json.load(fp)
+            imported = store.import_values(entity.name, history, time.time())
+            filename.unlink()
+            self.logger.info(f'[{entity.name}] history ({imported} items) imported from {filename}')
+        not_before = time.time() - entity.history_ttl * 3600 if entity.history_ttl is not None else None
+        return store.load(entity.name, entity.history_size, not_before)
+
+    def _flush_cutoffs(self) -> Dict[str, float]:
+        """for every entity, timestamp of the oldest value that should be kept in the database"""
+        cutoffs = {}
+        now = time.time()
+        for entity in self.entities.values():
+            self.expire(entity, now)
+            if entity.history:
+                cutoffs[entity.name] = next(iter(entity.history.values()))
+            elif entity.history_ttl is not None:
+                cutoffs[entity.name] = now - entity.history_ttl * 3600
+        return cutoffs
+
     async def run(self) -> None:
         if self.conf.history_dir is None:
             return
 
-        for entity in self.entities.values():
-            filename = self.conf.history_dir / Path(f'{self.conf.name}-{entity.name}-history.json')
-            try:
-                if filename.exists() and filename.is_file():
-                    with open(filename, 'rt', encoding='utf8') as fp:
-                        history = json.load(fp)
-                        entity.history.update(history)
-                        self.logger.info(
-                            f'[{entity.name}] history ({len(entity.history)} items) successfully loaded from {filename}')
-            except Exception as e:
-                self.logger.info(f'[{entity.name}] failed to load history from "{filename}": {e}')
+        path = self.conf.history_dir / Path(f'{self.conf.name}-history.sqlite')
+        try:
+            store = await asyncio.to_thread(SeenHistory, path, self.logger)
+        except Exception as e:
+            self.logger.warning(f'failed to open history database "{path}", history will not be persisted: {e}')
+            return
+        # created here rather than in __init__ to be bound to the running loop on older Python versions
+        self.flush_needed = flush_needed = asyncio.Event()
+        self.store = store
 
         try:
-            await asyncio.Future()
-        except (asyncio.CancelledError, KeyboardInterrupt):
             for entity in self.entities.values():
-                if not entity.history:
-                    continue
-                filename = self.conf.history_dir / Path(f'{self.conf.name}-{entity.name}-history.json')
                 try:
-                    with open(filename, 'wt', encoding='utf8') as fp:
-                        json.dump(entity.history, fp, ensure_ascii=False, indent=4)
-                        self.logger.info(
-                            f'[{entity.name}] history ({len(entity.history)} items) successfully stored at {filename}')
+                    rows = await asyncio.to_thread(self._load_history, store, entity)
                 except Exception as e:
-                    self.logger.info(f'[{entity.name}] failed to store history to "{filename}": {e}')
-            raise
+                    self.logger.warning(f'[{entity.name}] failed to load history from "{path}": {e}')
+                    continue
+                # values seen before the history was loaded are the most recent ones
+                history = OrderedDict(rows)
+                for value, seen_at in entity.history.items():
+                    history.pop(value, None)
+                    history[value] = seen_at
+                    store.add(entity.name, value, seen_at)
+                while len(history) > entity.history_size:
+                    history.popitem(last=False)
+                entity.history.clear()
+                entity.history.update(history)
+                self.logger.info(f'[{entity.name}] history ({len(entity.history)} items) successfully loaded from {path}')
+
+            while True:
+                try:
+                    await asyncio.wait_for(flush_needed.wait(), self.conf.commit_interval)
+                except asyncio.TimeoutError:
+                    pass
+                flush_needed.clear()
+                try:
+                    await asyncio.to_thread(store.flush, self._flush_cutoffs())
+                except sqlite3.Error as e:
+                    self.logger.warning(f'failed to store history to "{path}": {e}')
+        finally:
+            self.store = None
+            self.flush_needed = None
+            try:
+                stored = store.flush(self._flush_cutoffs())
+                self.logger.debug(f'stored {stored} pending history items to {path}')
+            except sqlite3.Error as e:
+                self.logger.warning(f'failed to store history to "{path}": {e}')
+            store.close()
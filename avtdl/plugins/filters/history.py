@@ -0,0 +1,89 @@
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from avtdl.core.utils import check_dir
+
+
+class SeenHistory:
+    """
+    Persistent storage of values already seen by filter.deduplicate entities
+
+    Every value is stored as a single row with the time it was first seen,
+    so new values are appended with cheap inserts instead of rewriting the whole
+    history. Writes are buffered by `add()` and stored in a single transaction
+    by `flush()`, which also drops rows exceeding the entity history size or TTL.
+
+    Lookups are not performed against the database: the filter keeps the loaded
+    history in memory and only uses this class to restore it after restart.
+
+    Methods perform blocking IO and are intended to be called via asyncio.to_thread().
+    """
+
+    MAX_PENDING_ROWS = 1000
+
+    def __init__(self, db_path: Union[str, Path], logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger('history')
+        self.lock = threading.Lock()
+        self.pending: List[Tuple[str, str, float]] = []
+        if not db_path == ':memory:' and not Path(db_path).exists():
+            check_dir(Path(db_path).parent)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        if not db_path == ':memory:':
+            self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS history (entity text, value text, seen_at real, PRIMARY KEY(entity, value))')
+        self.db.execute('CREATE INDEX IF NOT EXISTS index_entity_seen_at ON history (entity, seen_at)')
+        self.db.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+    def add(self, entity: str, value: str, seen_at: float) -> bool:
+        """buffer a newly seen value, return True when enough rows are pending to flush them"""
+        self.pending.append((entity, value, seen_at))
+        return len(self.pending) >= self.MAX_PENDING_ROWS
+
+    def load(self, entity: str, limit: int, not_before: Optional[float] = None) -> List[Tuple[str, float]]:
+        """return up to limit most recently seen values of the entity with their timestamps, oldest first"""
+        not_before = not_before if not_before is not None else float('-inf')
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT value, seen_at FROM history WHERE entity = ? AND seen_at >= ? ORDER BY seen_at DESC LIMIT ?',
+                (entity, not_before, limit)).fetchall()
+        return rows[::-1]
+
+    def import_values(self, entity: str, values: Iterable[str], seen_at: float) -> int:
+        """store values without overwriting already present ones, return number of rows added"""
+        rows = [(entity, value, seen_at) for value in values]
+        with self.lock:
+            before = self.db.total_changes
+            self.db.executemany('INSERT OR IGNORE INTO history VALUES (?, ?, ?)', rows)
+            self.db.commit()
+            return self.db.total_changes - before
+
+    def flush(self, cutoffs: Optional[Dict[str, float]] = None) -> int:
+        """
+        store pending values in a single transaction, return number of stored rows
+
+        For every entity in cutoffs rows seen before the given timestamp are removed.
+        """
+        pending, self.pending = self.pending, []
+        with self.lock:
+            self.db.executemany('INSERT OR REPLACE INTO history VALUES (?, ?, ?)', pending)
+            for entity, cutoff in (cutoffs or {}).items():
+                self.db.execute('DELETE FROM history WHERE entity = ? AND seen_at < ?', (entity, cutoff))
+            if self.db.in_transaction:
+                self.db.commit()
+        return len(pending)
+
+    def size(self, entity: Optional[str] = None) -> int:
+        with self.lock:
+            if entity is None:
+                row = self.db.execute('SELECT COUNT(1) FROM history').fetchone()
+            else:
+                row = self.db.execute('SELECT COUNT(1) FROM history WHERE entity = ?', (entity,)).fetchone()
+        return int(row[0])
@@ -1,4 +1,5 @@
 import datetime
+import logging
 import re
 from textwrap import shorten
 from typing import Any, List, Optional, Sequence, Tuple
@@ -10,6 +11,7 @@ from dateutil import parser
 from pydantic import ConfigDict, PositiveFloat
 
 from avtdl.core.actors import Filter, FilterEntity
+from avtdl.core.executor import run_parser
 from avtdl.core.interfaces import MAX_REPR_LEN, Record
 from avtdl.core.monitors import PagedFeedMonitor, PagedFeedMonitorConfig, PagedFeedMonitorEntity
 from avtdl.core.plugins import Plugins
@@ -182,9 +184,7 @@ class NitterMonitor(PagedFeedMonitor):
         raw_page = await self._get_user_page(entity, client)
         if raw_page is None:
             return None, None
-        page = self._parse_html(raw_page, entity.url)
-        records = self._parse_entries(page)
-        next_page_url = self._get_continuation_url(page)
+        records, next_page_url = await run_parser(self.parse_page, raw_page, entity.url, self.logger)
         return records, next_page_url
 
     async def handle_next_page(self, entity: NitterMonitorEntity, client: HttpClient,
@@ -196,9 +196,7 @@ class NitterMonitor(PagedFeedMonitor):
         response = await client.request(next_page_url, headers=self.HEADERS, settings=retry_settings)
         if not isinstance(response, DataResponse):
             return None, None
-        page = self._parse_html(response.text, entity.url)
-        records = self._parse_entries(page)
-        next_page_url = self._get_continuation_url(page)
+        records, next_page_url = await run_parser(self.parse_page, response.text, entity.url, self.logger)
         return records, next_page_url
 
     async def _get_user_page(self, entity: NitterMonitorEntity, client: HttpClient) -> Optional[str]:
@@ -208,19 +206,28 @@ class NitterMonitor(PagedFeedMonitor):
             return None
         return text
 
-    def _parse_entries(self, page: lxml.html.HtmlElement) -> List[NitterRecord]:
+    @classmethod
+    def parse_page(cls, raw_page: str, base_url: str, logger: logging.Logger) -> Tuple[List[NitterRecord], Optional[str]]:
+        """parse posts and continuation url from raw page, intended to be run in the parse executor"""
+        page = cls._parse_html(raw_page, base_url)
+        records = cls._parse_entries(page, logger)
+        next_page_url = cls._get_continuation_url(page)
+        return records, next_page_url
+
+    @classmethod
+    def _parse_entries(cls, page: lxml.html.HtmlElement, logger: logging.Logger) -> List[NitterRecord]:
         try:
-            posts_section = self._parse_timeline(page)
+            posts_section = cls._parse_timeline(page)
         except Exception as e:
-            self.logger.debug(f'error parsing nitter page: {e}')
+            logger.debug(f'error parsing nitter page: {e}')
             return []
         records = []
         for post_node in posts_section:
             try:
-                record = self._parse_post(post_node)
+                record = cls._parse_post(post_node)
             except Exception as e:
-                self.logger.exception(f'error parsing a post: {e}')
-                self.logger.debug(f'raw post: {get_html_content(post_node)}')
+                logger.exception(f'error parsing a post: {e}')
+                logger.debug(f'raw post: {get_html_content(post_node)}')
             else:
                 records.append(record)
         return records
@@ -246,7 +253,8 @@ class NitterMonitor(PagedFeedMonitor):
         links = raw_attachments.xpath(".//a/@href")
         return links
 
-    def _parse_quote(self, raw_quote: lxml.html.HtmlElement) -> Optional[NitterQuoteRecord]:
+    @classmethod
+    def _parse_quote(cls, raw_quote: lxml.html.HtmlElement) -> Optional[NitterQuoteRecord]:
         url = raw_quote.xpath(".//*[@class='quote-link']/@href")[0]
         url = re.sub('#m$', '', url)
         author = raw_quote.xpath(".//*[@class='fullname']/@title")[0]
@@ -264,7 +272,7 @@ class NitterMonitor(PagedFeedMonitor):
             html = get_html_content(post_body)
 
         [raw_attachments] = raw_quote.xpath(".//*[@class='quote-media-container']/*[@class='attachments']") or [None]
-        attachments = self._parse_attachments(raw_attachments) if raw_attachments is not None else []
+        attachments = cls._parse_attachments(raw_attachments) if raw_attachments is not None else []
 
         return NitterQuoteRecord(url=url,
                                  author=author,
@@ -276,7 +284,8 @@ class NitterMonitor(PagedFeedMonitor):
                                  attachments=attachments
                                  )
 
-    def _parse_post(self, raw_post: lxml.html.HtmlElement) -> NitterRecord:
+    @classmethod
+    def _parse_post(cls, raw_post: lxml.html.HtmlElement) -> NitterRecord:
         retweet_header = ''.join(element.text_content() for element in raw_post.xpath(".//*[@class='retweet-header']")).lstrip() or None
         reply_header = ''.join(element.text_content() for element in raw_post.xpath(".//*[@class='tweet-body']/*[@class='replying-to']")).lstrip() or None
 
@@ -294,7 +303,7 @@ class NitterMonitor(PagedFeedMonitor):
         html = get_html_content(post_body)
 
         [raw_attachments] = raw_post.xpath("(.//*[@class='tweet-body']/*[@class='attachments'])[1]") or [None]
-        attachments = self._parse_attachments(raw_attachments) if raw_attachments is not None else []
+        attachments = cls._parse_attachments(raw_attachments) if raw_attachments is not None else []
 
         video_attachments = raw_post.xpath(".//*[@class='attachment video-container']/video/@poster")
         if video_attachments:
@@ -302,7 +311,7 @@ class NitterMonitor(PagedFeedMonitor):
             attachments.extend(thumbnails)
 
         [raw_quote] = raw_post.xpath(".//*[@class='quote quote-big']") or [None]
-        quote = self._parse_quote(raw_quote) if raw_quote is not None else None
+        quote = cls._parse_quote(raw_quote) if raw_quote is not None else None
 
         return NitterRecord(url=url,
                             author=author,
@@ -3,8 +3,9 @@ from textwrap import shorten
 from typing import Any, Dict, List, Optional, Sequence, Union
 
 import feedparser
-from pydantic import ConfigDict, ValidationError, model_validator
+from pydantic import ConfigDict, PrivateAttr, ValidationError, model_validator
 
+from avtdl.core.executor import run_parser
 from avtdl.core.formatters import Fmt, html_images, html_to_text, make_datetime
 from avtdl.core.interfaces import MAX_REPR_LEN, Record, TextRecord
 from avtdl.core.monitors import BaseFeedMonitor, BaseFeedMonitorConfig, BaseFeedMonitorEntity
@@ -36,9 +37,31 @@ class GenericRSSRecord(Record):
     published: datetime.datetime
     """"published" or "issued" field value of this entry"""
 
+    _text: Optional[str] = PrivateAttr(default=None)
+    _markdown: Optional[str] = PrivateAttr(default=None)
+
+    @property
+    def summary_text(self) -> str:
+        """summary converted to plaintext, rendered on first use and cached"""
+        if self._text is None:
+            self._text = html_to_text(self.summary, self.url)
+        return self._text
+
+    @property
+    def summary_markdown(self) -> str:
+        """summary converted to markdown with images stripped, rendered on first use and cached"""
+        if self._markdown is None:
+            self._markdown = html_to_text(self.summary, self.url, markdown=True, strip_img=True)
+        return self._markdown
+
+    def _drop_cache(self) -> None:
+        super()._drop_cache()
+        self._text = None
+        self._markdown = None
+
     def __str__(self):
         second_line = f'[{self.published}] {self.author}: {self.title}\n' if self.author or self.title else ''
-        summary = html_to_text(self.summary)
+        summary = self.summary_text
         summary = shorten(summary, MAX_REPR_LEN * 5)
         return f'{self.url}\n{second_line}{summary}'
 
@@ -59,7 +82,7 @@ class GenericRSSRecord(Record):
     def as_embed(self) -> List[dict]:
         embed: Dict[str, Any] = {
             'title': self.title,
-            'description': html_to_text(self.summary, self.url, markdown=True, strip_img=True),
+            'description': self.summary_markdown,
             'url': self.url,
             'color': None,
             'author': {'name': self.author},
@@ -83,6 +106,11 @@ class GenericRSSMonitorConfig(BaseFeedMonitorConfig):
 class GenericRSSMonitorEntity(BaseFeedMonitorEntity):
     pass
 
+def parse_feed(text: Union[str, bytes], response_headers: Dict[str, str]) -> feedparser.FeedParserDict:
+    """parse raw feed, intended to be run in the parse executor"""
+    return feedparser.parse(text, response_headers=response_headers, resolve_relative_uris=True)
+
+
 @Plugins.register('generic_rss', Plugins.kind.ACTOR)
 class GenericRSSMonitor(BaseFeedMonitor):
     """
@@ -143,7 +171,7 @@ class GenericRSSMonitor(BaseFeedMonitor):
             response_headers['content-location'] = entity.url
 
         try:
-            feed = feedparser.parse(text, response_headers=response_headers, resolve_relative_uris=True)
+            feed = await run_parser(parse_feed, text, response_headers)
             if feed.get('entries') is not None:
                 return feed
             else:
@@ -80,16 +80,20 @@ class TwitcastMonitor(HttpTaskMonitor):
     for all monitored users to not exceed one request per second.
     """
 
+    IS_LIVE_URL = 'https://twitcasting.tv/userajax.php?c=islive&u={user_id}'
+    MOVIE_INFO_URL = 'https://en.twitcasting.tv/streamserver.php?target={user_id}&mode=client'
 
     async def get_new_records(self, entity: TwitcastMonitorEntity, client: HttpClient) -> Sequence[TwitcastRecord]:
         record = await self.check_channel(entity, client)
         return [record] if record else []
 
     async def check_channel(self, entity: TwitcastMonitorEntity, client: HttpClient) -> Optional[TwitcastRecord]:
-        if not await self.is_live(entity, client):
+        live_status = await self.get_live_status(entity, client)
+        if live_status is None:
             return None
 
-        movie_id = await self.get_movie_id(entity, client)
+        # live status is the id of the current movie, only fall back to requesting it separately if it's not
+        movie_id = live_status if live_status.isdigit() else await self.get_movie_id(entity, client)
         if movie_id is None:
             self.logger.warning(f'[{entity.name}] failed to get movie id, will report this record again if it was a temporary error, will never report new records if it is permanent')
             movie_id = 'movie id is unknown'
@@ -106,16 +110,20 @@ class TwitcastMonitor(HttpTaskMonitor):
         record = TwitcastRecord(url=channel_url, user_id=entity.user_id, movie_id=movie_id, movie_url=movie_url, title=title, thumbnail_url=thumbnail_url)
         return record
 
-    async def is_live(self, entity: TwitcastMonitorEntity, client: HttpClient) -> bool:
-        url = f"https://twitcasting.tv/userajax.php?c=islive&u={entity.user_id}"
+    async def get_live_status(self, entity: TwitcastMonitorEntity, client: HttpClient) -> Optional[str]:
+        """return id of the current movie if user is live, None if it is not or the check failed"""
+        url = self.IS_LIVE_URL.format(user_id=entity.user_id)
         text = await self.request(url, entity, client)
         if text is None:
             self.logger.warning(f'[{entity.name}] failed to check if channel {entity.user_id} is live')
-            return False
-        return text != '0'
+            return None
+        text = text.strip()
+        if text == '0':
+            return None
+        return text
 
     async def get_movie_id(self, entity: TwitcastMonitorEntity, client: HttpClient) -> Optional[str]:
-        url = f'https://en.twitcasting.tv/streamserver.php?target={entity.user_id}&mode=client'
+        url = self.MOVIE_INFO_URL.format(user_id=entity.user_id)
         latest_movie_info = await self.request_json(url, entity, client)
         if latest_movie_info is None:
             return None
@@ -297,10 +297,10 @@ class Operations:
 
 
 class GQL(Endpoint):
+    URL = 'https://gql.twitch.tv/gql'
 
-    @staticmethod
-    def prepare(operations: Sequence[Operation]) -> RequestDetails:
-        api_url = 'https://gql.twitch.tv/gql'
+    @classmethod
+    def prepare(cls, operations: Sequence[Operation]) -> RequestDetails:
         headers = {'Client-Id': 'kimne78kx3ncx6brgo4mv6wki5h1ko', 'Content-Type': 'application/json'}
         body = [operation.payload() for operation in operations]
-        return RequestDetails(url=api_url, method='POST', data=json.dumps(body, ensure_ascii=False), headers=headers)
+        return RequestDetails(url=cls.URL, method='POST', data=json.dumps(body, ensure_ascii=False), headers=headers)
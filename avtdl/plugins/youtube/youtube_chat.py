@@ -5,6 +5,7 @@ from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 from pydantic import Field, PositiveFloat
 
+from avtdl.core.executor import run_parser
 from avtdl.core.formatters import Fmt
 from avtdl.core.interfaces import MAX_REPR_LEN, Record
 from avtdl.core.monitors import BaseFeedMonitor, BaseFeedMonitorConfig, BaseFeedMonitorEntity
@@ -192,7 +193,7 @@ class YoutubeChatMonitor(BaseFeedMonitor):
         except Exception as e:
             self.logger.warning(f'[{entity.name}] error parsing page {entity.url}: {e}')
             return {}
-        actions, continuation, initial_page = self._get_actions(raw_page_text, first_page=True)
+        actions, continuation, initial_page = await run_parser(self._get_actions, raw_page_text, True)
 
         innertube_context = get_innertube_context(raw_page_text)
         session_index = get_session_index(initial_page)
@@ -244,7 +245,7 @@ class YoutubeChatMonitor(BaseFeedMonitor):
                 entity.context.done = True
                 self.logger.info(f'[{entity.name}] giving up on downloading chat replay for {entity.url}')
             return None
-        actions, continuation, _ = self._get_actions(page)
+        actions, continuation, _ = await run_parser(self._get_actions, page)
         entity.context.continuation_token = continuation
         if continuation is None and entity.context.is_replay:
             self.logger.info(f'[{entity.name}] finished downloading chat replay')
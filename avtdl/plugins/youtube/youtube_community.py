@@ -2,6 +2,7 @@ from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 from pydantic import PositiveFloat
 
+from avtdl.core.executor import run_parser
 from avtdl.core.interfaces import MAX_REPR_LEN, Record
 from avtdl.core.monitors import PagedFeedMonitor, PagedFeedMonitorConfig, PagedFeedMonitorEntity
 from avtdl.core.plugins import Plugins
@@ -177,7 +178,7 @@ class CommunityPostsMonitor(PagedFeedMonitor):
             return None, None
         raw_page_text = await handle_consent(raw_page_text, entity.url, client, self.logger)
         try:
-            initial_page = get_initial_data(raw_page_text)
+            initial_page = await run_parser(get_initial_data, raw_page_text)
         except Exception as e:
             self.logger.exception(f'[{entity.name}] failed to get initial data from {entity.url}: {e}')
             return None, None
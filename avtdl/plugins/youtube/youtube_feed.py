@@ -4,6 +4,7 @@ from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 from pydantic import Field, PositiveFloat
 
 from avtdl.core.actors import Filter, FilterEntity
+from avtdl.core.executor import run_parser
 from avtdl.core.interfaces import Record
 from avtdl.core.monitors import PagedFeedMonitor, PagedFeedMonitorConfig, PagedFeedMonitorEntity
 from avtdl.core.plugins import Plugins
@@ -163,7 +164,7 @@ class VideosMonitor(PagedFeedMonitor):
         if raw_page_text is None:
             return None, None
         raw_page_text = await handle_consent(raw_page_text, entity.url, client, self.logger)
-        video_renderers, lockup_views, continuation_token, page = get_video_renderers(raw_page_text)
+        video_renderers, lockup_views, continuation_token, page = await run_parser(get_video_renderers, raw_page_text)
         if not video_renderers and not lockup_views:
             self.logger.warning(f'[{entity.name}] found no videos on first page of {entity.url}')
         owner_info = parse_owner_info(page)
@@ -185,7 +186,7 @@ class VideosMonitor(PagedFeedMonitor):
         if raw_page is None:
             self.logger.debug(f'[{entity.name}] failed to load next page, aborting')
             return None, None
-        video_renderers, lockup_views, continuation_token, page = get_video_renderers(raw_page, anchor='')
+        video_renderers, lockup_views, continuation_token, page = await run_parser(get_video_renderers, raw_page, '')
 
         if not video_renderers and not lockup_views:
             self.logger.debug(f'[{entity.name}] found no videos when parsing continuation of {entity.url}')
@@ -227,7 +228,7 @@ class VideosMonitor(PagedFeedMonitor):
                 continue
         return records
 
-    def record_got_updated(self, record: YoutubeVideoRecord, entity: VideosMonitorEntity) -> bool:
+    def record_update_is_significant(self, record: YoutubeVideoRecord, entity: VideosMonitorEntity) -> bool:
         excluded_fields = {'published_text'}
         return self.db.record_has_changed(record, entity.name, excluded_fields)
 
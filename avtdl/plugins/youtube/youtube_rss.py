@@ -171,7 +171,7 @@ class FeedMonitor(GenericRSSMonitor):
         # record.check_scheduled() involves loading video page, so it should only be done when necessarily
         # and here seems to be the only good place for it, since network request requires "session" object
         for record in records:
-            previous = self.load_record(record, entity)
+            previous = await self.async_db.call(self.load_record, record, entity)
             if previous is None:
                 await record.check_scheduled(client, self.logger)
                 continue
@@ -193,11 +193,11 @@ class FeedMonitor(GenericRSSMonitor):
                     self.logger.warning(msg)
                     rescheduled_records.append(record)
 
-        new_records = self.filter_new_records(records, entity)
+        new_records = await self.select_new_records(records, entity)
         rescheduled_records.extend(new_records)  # type: ignore
         return rescheduled_records
 
-    def record_got_updated(self, record: YoutubeFeedRecord, entity: FeedMonitorEntity) -> bool:
+    def record_update_is_significant(self, record: YoutubeFeedRecord, entity: FeedMonitorEntity) -> bool:
         excluded_fields = {'views'}
         return self.db.record_has_changed(record, entity.name, excluded_fields)
 
@@ -500,42 +500,32 @@ class Pagination {
     }
 
     /**
-     * @param {number} currentPage
-     * @param {number} totalPages
+     * @param {{current: number, total: number, first: string?, previous: string?, next: string?}} data
      * @param {string} baseUrl
      */
-    render(currentPage, totalPages, baseUrl) {
+    render(data, baseUrl) {
         this.container.innerHTML = '';
 
-        const onFirstPage = currentPage <= 1;
-        const previousPageUrl = this.getPageUrl(baseUrl, currentPage - 1);
-        this._previousPageUrl = onFirstPage ? null : previousPageUrl;
+        const firstPageUrl = data.first ? this.getPageUrl(baseUrl, data.first) : null;
+        const previousPageUrl = data.previous ? this.getPageUrl(baseUrl, data.previous) : null;
+        const nextPageUrl = data.next ? this.getPageUrl(baseUrl, data.next) : null;
+        const lastPageUrl = data.next ? this.getPageUrl(baseUrl, null) : null;
+        this._previousPageUrl = previousPageUrl;
+        this._nextPageUrl = nextPageUrl;
 
-        this.addPageLink('«', this.getPageUrl(baseUrl, 1), onFirstPage);
-        this.addPageLink('‹', previousPageUrl, onFirstPage);
+        this.addPageLink('«', firstPageUrl || '', !firstPageUrl);
+        this.addPageLink('‹', previousPageUrl || '', !previousPageUrl);
 
-        const pageNumbers = this.getPageNumbers(currentPage, totalPages);
-        pageNumbers.forEach((page) => {
-            const pageUrl = this.getPageUrl(baseUrl, page);
-            const pageLink = this.createPageLink(page.toString(), pageUrl);
-            if (page === currentPage) {
-                pageLink.classList.add('active');
-            }
-            if (page == totalPages || page == 1) {
-                pageLink.classList.add('pagination-link-edge');
-            }
-            this.container.appendChild(pageLink);
-        });
-
-        const onLastPage = currentPage >= totalPages;
-        const nextPageUrl = this.getPageUrl(baseUrl, currentPage + 1);
-        this._nextPageUrl = onLastPage ? null : nextPageUrl;
+        // pages are loaded relative to the neighbouring ones, so the number is only an estimate
+        const currentPage = this.createPageLink(`${data.current} / ${data.total}`, '', true);
+        currentPage.title = 'Current page / total pages';
+        this.container.appendChild(currentPage);
 
-        this.addPageLink('›', nextPageUrl, onLastPage);
-        this.addPageLink('»', this.getPageUrl(baseUrl, totalPages), onLastPage);
+        this.addPageLink('›', nextPageUrl || '', !nextPageUrl);
+        this.addPageLink('»', lastPageUrl || '', !lastPageUrl);
 
         if (!this.keyboardEventAdded) {
-            this.addKeyboardNavigation(onFirstPage ? null : previousPageUrl, onLastPage ? null : nextPageUrl);
+            this.addKeyboardNavigation(previousPageUrl, nextPageUrl);
             this.keyboardEventAdded = true;
         }
     }
@@ -596,42 +586,18 @@ class Pagination {
     }
 
     /**
+     * Gets url of the page pointed to by the cursor, or of the most recent page if cursor is null.
      * @param {string | URL} baseUrl
-     * @param {number} page
+     * @param {string?} cursor
      */
-    getPageUrl(baseUrl, page) {
+    getPageUrl(baseUrl, cursor) {
         const url = new URL(baseUrl, window.location.origin);
-        url.searchParams.set('page', page.toString());
-        return url.toString();
-    }
-
-    /**
-     * Gets an array of page numbers to display.
-     * @param {number} currentPage - The current page number.
-     * @param {number} totalPages - The total number of pages.
-     * @returns {number[]} An array of page numbers to display.
-     */
-    getPageNumbers(currentPage, totalPages) {
-        const pageLinks = [];
-        const maxPagesToShow = 7;
-        const halfRange = Math.floor(maxPagesToShow / 2);
-
-        let startPage = Math.max(1, currentPage - halfRange);
-        let endPage = Math.min(totalPages, currentPage + halfRange);
-
-        // Adjust the start and end pages if there are not enough pages to show
-        if (endPage - startPage < maxPagesToShow - 1) {
-            if (startPage === 1) {
-                endPage = Math.min(totalPages, startPage + maxPagesToShow - 1);
-            } else {
-                startPage = Math.max(1, endPage - maxPagesToShow + 1);
-            }
-        }
-
-        for (let i = startPage; i <= endPage; i++) {
-            pageLinks.push(i);
+        url.searchParams.delete('page');
+        if (cursor) {
+            url.searchParams.set('cursor', cursor);
+        } else {
+            url.searchParams.delete('cursor');
         }
-
-        return pageLinks;
+        return url.toString();
     }
 }
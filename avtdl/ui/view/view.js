@@ -130,9 +130,7 @@ class RecordsView {
         const view = params.get('view');
         const entity = params.get('entity');
 
-        const pageParam = params.get('page');
-        const pageValue = pageParam ? parseInt(pageParam, 10) : null;
-        const page = pageValue ? pageValue.toString() : null;
+        const cursor = params.get('cursor');
 
         const perPage = params.get('size');
 
@@ -140,7 +138,7 @@ class RecordsView {
             actor: actor,
             view: view,
             entity: entity,
-            page: page,
+            cursor: cursor,
             size: perPage,
         };
     }
@@ -187,7 +185,7 @@ class RecordsView {
             this.viewState.fullDescriptions
         );
 
-        this.pages.render(data['current'], data['total'], window.location.pathname + window.location.search);
+        this.pages.render(data, window.location.pathname + window.location.search);
 
         this.controls.render();
 
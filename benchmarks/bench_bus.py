@@ -0,0 +1,60 @@
+"""
+Measure MessageBus.pub latency depending on the total number of subscriptions
+
+Run with `python -m benchmarks.bench_bus`. Every configuration publishes
+to a single entity with one subscriber, the rest of subscriptions belong
+to unrelated entities, so publish latency is expected to stay flat.
+Fan-out case publishes a fresh record to an entity used in many chains.
+"""
+from typing import Dict
+
+from avtdl.core.interfaces import TextRecord
+from avtdl.core.runtime import MessageBus
+from benchmarks.utils import measure, report
+
+SUBSCRIPTIONS = [10, 100, 1000, 10000]
+CHAINS = [1, 10, 50]
+
+
+def noop(topic: str, record: TextRecord) -> None:
+    pass
+
+
+def prepare_bus(subscriptions: int) -> MessageBus:
+    bus = MessageBus()
+    for i in range(subscriptions):
+        chain = f'chain{i % 10}'
+        bus.sub(bus.incoming_topic_for('actor', f'entity{i}', chain), noop)
+    return bus
+
+
+def bench_pub() -> Dict[str, float]:
+    results = {}
+    for subscriptions in SUBSCRIPTIONS:
+        bus = prepare_bus(subscriptions)
+        topic = bus.incoming_topic_for('actor', 'entity0', 'chain0')
+        record = TextRecord(text='benchmark', chain='chain0')
+        results[f'{subscriptions} subscriptions'] = measure(lambda: bus.pub(topic, record), number=10000)
+    return results
+
+
+def bench_fan_out() -> Dict[str, float]:
+    results = {}
+    text = 'benchmark ' * 500
+    for chains in CHAINS:
+        bus = MessageBus()
+        for i in range(chains):
+            bus.sub(bus.incoming_topic_for('actor', 'entity', f'chain{i}'), noop)
+        topic = bus.incoming_topic_for('actor', 'entity')
+        record = TextRecord(text=text)
+        results[f'{chains} chains'] = measure(lambda: bus.pub(topic, record), number=1000)
+    return results
+
+
+def main() -> None:
+    report('MessageBus.pub, single subscriber on the topic', bench_pub())
+    report('MessageBus.pub, fan-out of a new record', bench_fan_out())
+
+
+if __name__ == '__main__':
+    main()
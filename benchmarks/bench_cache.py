@@ -0,0 +1,61 @@
+"""
+Measure FileCache.retrieve latency for stored and missing urls
+
+Run with `python -m benchmarks.bench_cache`. The cache directory is filled
+with empty files for 5000 image urls spread over 50 hosts, as the web
+interface would look up a thumbnail for every record on a page. After the
+first lookup of a directory its content is kept in the index, so hits are
+served from memory, while misses also check directory modification time.
+"""
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+from avtdl.core.cache import FileCache
+from avtdl.core.interfaces import Record
+from benchmarks.bench_format import make_record
+from benchmarks.utils import measure, report
+
+FILES = 5000
+HOSTS = 50
+
+
+def image_url(i: int) -> str:
+    return f'https://img{i % HOSTS}.example.com/images/{i}.jpg'
+
+
+def fill_cache(cache: FileCache, record: Record, urls: List[str]) -> None:
+    for url in urls:
+        path = cache.filename_for(record, url).with_suffix('.jpg')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+
+def retrieve_all(cache: FileCache, record: Record, urls: List[str]) -> None:
+    for url in urls:
+        cache.retrieve(record, url)
+
+
+def bench_retrieve() -> Dict[str, float]:
+    record = make_record()
+    stored = [image_url(i) for i in range(FILES)]
+    missing = [image_url(i) for i in range(FILES, FILES * 2)]
+    with tempfile.TemporaryDirectory() as directory:
+        cache = FileCache(Path(directory), '.part')
+        fill_cache(cache, record, stored)
+        assert cache.retrieve(record, stored[0]) is not None
+        assert cache.retrieve(record, missing[0]) is None
+        results = {
+            'hit': measure(lambda: retrieve_all(cache, record, stored), number=1, repeat=3) / FILES,
+            'miss': measure(lambda: retrieve_all(cache, record, missing), number=1, repeat=3) / FILES,
+            'filename_for': measure(lambda: cache.filename_for(record, stored[0]), number=10000),
+        }
+    return results
+
+
+def main() -> None:
+    report(f'FileCache.retrieve, {FILES} files, time per url', bench_retrieve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Measure Chain construction time depending on the number of entities
+
+Run with `python -m benchmarks.bench_chain`. Every chain connects a monitor
+to a filter and an action. Each entity of a card is subscribed to every
+entity of the next one, so the number of subscriptions created grows as
+a product of entity counts of adjacent cards.
+"""
+from typing import Dict, List, Tuple
+
+from avtdl.core.chain import Chain, ChainConfigSection
+from avtdl.core.runtime import RuntimeContext
+from benchmarks.utils import measure, report
+
+LAYOUTS: List[Tuple[int, int, int]] = [(10, 1, 1), (1000, 1, 1), (1000, 1, 10), (100, 10, 100)]
+
+
+def make_section(monitors: int, filters: int, actions: int) -> ChainConfigSection:
+    return ChainConfigSection.model_validate([
+        {'monitor': [f'monitor{i}' for i in range(monitors)]},
+        {'filter': [f'filter{i}' for i in range(filters)]},
+        {'action': [f'action{i}' for i in range(actions)]},
+    ])
+
+
+def bench_chain() -> Dict[str, float]:
+    results = {}
+    for monitors, filters, actions in LAYOUTS:
+        section = make_section(monitors, filters, actions)
+        results[f'{monitors} x {filters} x {actions} entities'] = measure(
+            lambda: Chain('bench', section, RuntimeContext.create()), number=10)
+    return results
+
+
+def main() -> None:
+    report('Chain construction, monitor x filter x action entities', bench_chain())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Measure cost of storing, looking up and classifying records in RecordDB
+
+Run with `python -m benchmarks.bench_db`. The database is filled with
+records of 1000 entities having 50 records each, then every entity is
+checked once, as it would happen on a single poll of every feed, with
+one new and one updated record per entity. Storing is measured for a batch
+of records of a single entity, lookups for a single record and a page of
+records as shown by the web interface.
+"""
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+from avtdl.core.db import RecordDB, RecordState
+from avtdl.core.interfaces import TextRecord
+from benchmarks.utils import measure, report
+
+ENTITIES = 1000
+RECORDS = 50
+
+
+class UidTextRecord(TextRecord):
+    uid: str
+
+    def get_uid(self) -> str:
+        return self.uid
+
+
+def make_records(entity: int, version: str = '') -> List[UidTextRecord]:
+    return [UidTextRecord(uid=f'{entity}-{i}', text=f'record {i} of entity {entity}{version}') for i in range(RECORDS)]
+
+
+def prepare_db(path: Path) -> RecordDB:
+    db = RecordDB(path)
+    db.deferred_commit = True
+    for entity in range(ENTITIES):
+        db.store_records(make_records(entity), f'entity{entity}')
+    db.commit()
+    return db
+
+
+def fetched_records() -> Dict[str, List[UidTextRecord]]:
+    fetched = {}
+    for entity in range(ENTITIES):
+        records = make_records(entity)
+        records[0] = UidTextRecord(uid=f'{entity}-new', text='new record')
+        records[1] = UidTextRecord(uid=records[1].uid, text='updated record')
+        fetched[f'entity{entity}'] = records
+    return fetched
+
+
+def per_record_queries(db: RecordDB, fetched: Dict[str, List[UidTextRecord]]) -> None:
+    for entity_name, records in fetched.items():
+        for record in records:
+            if not db.record_exists(record, entity_name):
+                continue
+            db.record_got_updated(record, entity_name)
+
+
+def batch_query(db: RecordDB, fetched: Dict[str, List[UidTextRecord]]) -> None:
+    for entity_name, records in fetched.items():
+        db.classify_records(records, entity_name)
+
+
+def bench_classify() -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        db = prepare_db(Path(directory) / 'bench.sqlite')
+        fetched = fetched_records()
+        states = db.classify_records(fetched['entity0'], 'entity0')
+        assert states[:3] == [RecordState.NEW, RecordState.UPDATED, RecordState.UNCHANGED]
+        results = {
+            'record_exists + record_got_updated': measure(lambda: per_record_queries(db, fetched), number=1, repeat=3),
+            'classify_records': measure(lambda: batch_query(db, fetched), number=1, repeat=3),
+        }
+        db.db.close()
+    return results
+
+
+def bench_store() -> Dict[str, float]:
+    batches = iter(range(ENTITIES, ENTITIES * 100))
+    with tempfile.TemporaryDirectory() as directory:
+        db = prepare_db(Path(directory) / 'bench.sqlite')
+        results = {
+            f'store_records, {RECORDS} new records': measure(
+                lambda: db.store_records(make_records(next(batches)), 'new entity'), number=20, repeat=3),
+            f'store_records, {RECORDS} existing records': measure(
+                lambda: db.store_records(make_records(0), 'entity0'), number=20, repeat=3),
+        }
+        db.db.close()
+    return results
+
+
+def bench_lookup() -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        db = prepare_db(Path(directory) / 'bench.sqlite')
+        record = make_records(ENTITIES // 2)[RECORDS // 2]
+        entity_name = f'entity{ENTITIES // 2}'
+        last_page = db.load_cursor_page(entity_name, None, 20)
+        assert last_page.previous is not None
+        results = {
+            'record_exists': measure(lambda: db.record_exists(record, entity_name), number=1000),
+            'load_record': measure(lambda: db.load_record(record, entity_name), number=1000),
+            'load_cursor_page, one feed': measure(lambda: db.load_cursor_page(entity_name, last_page.previous, 20), number=100),
+            'load_cursor_page, all feeds': measure(lambda: db.load_cursor_page(None, last_page.previous, 20), number=100),
+        }
+        db.db.close()
+    return results
+
+
+def main() -> None:
+    report(f'poll of {ENTITIES} entities with {RECORDS} records each', bench_classify())
+    report('storing records', bench_store())
+    report('looking up records', bench_lookup())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure peak memory usage of HttpClient.download_file
+
+Run with `python -m benchmarks.bench_download [size in MiB]`. A local server
+streams a file of the given size (1024 MiB by default) and it is downloaded
+to a temporary directory with both transports, reporting throughput and
+growth of the process peak resident set size. Peak RSS is only available
+on platforms providing the `resource` module.
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from avtdl.core.request import ClientPool, Transport
+
+MiB = 1024 * 1024
+BLOCK = b'\xAB' * MiB
+
+
+def peak_rss() -> int:
+    """return peak resident set size of the process in bytes, or 0 if it can't be measured"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def make_app(size: int) -> web.Application:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'application/octet-stream'})
+        response.content_length = size * MiB
+        await response.prepare(request)
+        for _ in range(size):
+            await response.write(BLOCK)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get('/file', handler)
+    return app
+
+
+async def download(size: int, transport: Transport, directory: Path) -> None:
+    server = TestServer(make_app(size))
+    await server.start_server()
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='bench', transport=transport)
+        path = directory / f'{transport.value}.bin'
+        rss_before = peak_rss()
+        started = time.perf_counter()
+        info = await client.download_file(path, str(server.make_url("/file")))
+        duration = time.perf_counter() - started
+        rss_growth = peak_rss() - rss_before
+        assert info is not None and path.stat().st_size == size * MiB
+        path.unlink()
+        print(f'  {transport.value:<10} {size / duration:>8.1f} MiB/s   peak RSS growth {rss_growth / MiB:>8.1f} MiB')
+    finally:
+        await client_pool.close()
+        await server.close()
+
+
+async def main(size: int) -> None:
+    print(f'downloading {size} MiB')
+    with tempfile.TemporaryDirectory() as directory:
+        for transport in Transport:
+            await download(size, transport, Path(directory))
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1024))
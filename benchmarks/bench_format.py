@@ -0,0 +1,49 @@
+"""
+Measure Fmt.format throughput on typical filename and message templates
+
+Run with `python -m benchmarks.bench_format`. Templates are compiled on
+the first use and then taken from the cache, so the numbers show the cost
+of formatting a single record with an already known template. The target
+is at least 100k formats per second for simple templates.
+"""
+import datetime
+from typing import Dict
+
+from avtdl.core.formatters import Fmt
+from avtdl.plugins.rss.generic_rss import GenericRSSRecord
+from benchmarks.utils import measure, report
+
+TEMPLATES = {
+    'literal only': 'static text',
+    'single field': '{title}',
+    'filename': '[{author}] {title} ({uid})',
+    'filename with date': '%Y-%m-%d [{author}] {title}',
+}
+
+
+def make_record() -> GenericRSSRecord:
+    return GenericRSSRecord(uid='12345', url='https://example.com/posts/12345', summary='<p>summary</p>' * 50,
+                            author='author', title='Title of the post',
+                            published=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+
+
+def bench_format() -> Dict[str, float]:
+    record = make_record()
+    results = {}
+    for name, template in TEMPLATES.items():
+        results[name] = measure(lambda: Fmt.format(template, record), number=10000)
+    results['filename, sanitized'] = measure(
+        lambda: Fmt.format(TEMPLATES['filename'], record, sanitize=True), number=10000)
+    return results
+
+
+def main() -> None:
+    results = bench_format()
+    report('Fmt.format, time per call', results)
+    print('formats per second:')
+    for name, duration in results.items():
+        print(f'  {name}: {1 / duration:,.0f}')
+
+
+if __name__ == '__main__':
+    main()
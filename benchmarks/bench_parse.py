@@ -0,0 +1,81 @@
+"""
+Measure event loop lag caused by parsing a large feed
+
+Run with `python -m benchmarks.bench_parse`. A synthetic RSS feed of about
+5 MB is parsed with `parse_feed` of the generic_rss plugin, either directly
+on the event loop or through ParseExecutor, while a ticker task measures how
+late it gets woken up compared to the requested interval. The worst lag is
+what every other monitor experiences while the feed is being parsed.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from avtdl.core.executor import ExecutorKind, ParseExecutor
+from avtdl.plugins.rss.generic_rss import parse_feed
+
+TICK = 0.005
+FEED_SIZE = 5 * 1024 * 1024
+
+
+def make_feed(size: int) -> str:
+    items: List[str] = []
+    length = 0
+    i = 0
+    while length < size:
+        item = (f'<item><guid>https://example.com/posts/{i}</guid><title>Post number {i}</title>'
+                f'<link>/posts/{i}</link><pubDate>Mon, 06 Sep 2021 16:45:00 +0000</pubDate>'
+                f'<description>&lt;p&gt;Text of the post {i} with &lt;a href="/tags/{i}"&gt;a link&lt;/a&gt;'
+                f' and some more words to make it longer&lt;/p&gt;</description></item>')
+        items.append(item)
+        length += len(item)
+        i += 1
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>bench</title>{"".join(items)}</channel></rss>'
+
+
+async def measure_lag(job: Callable[[], Awaitable[object]]) -> Dict[str, float]:
+    lags: List[float] = []
+    done = False
+
+    async def ticker():
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - started - TICK)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK * 2)
+    started = time.perf_counter()
+    await job()
+    duration = time.perf_counter() - started
+    done = True
+    await ticker_task
+    return {'duration': duration, 'max lag': max(lags), 'ticks': len(lags)}
+
+
+async def main() -> None:
+    feed = make_feed(FEED_SIZE)
+    headers = {'content-location': 'https://example.com/feed'}
+    print(f'parsing {len(feed) / 1024 / 1024:.1f} MB feed')
+
+    async def inline():
+        parse_feed(feed, headers)
+
+    results = {'event loop': await measure_lag(inline)}
+    for kind in ExecutorKind:
+        executor = ParseExecutor(kind, workers=1)
+        await executor.run(len, '')  # start workers before measuring
+
+        async def offloaded():
+            await executor.run(parse_feed, feed, headers)
+
+        results[f'{kind.value} executor'] = await measure_lag(offloaded)
+        executor.shutdown()
+
+    for name, result in results.items():
+        print(f'  {name:<18} parsed in {result["duration"]:6.2f} s, '
+              f'max loop lag {result["max lag"] * 1000:8.1f} ms over {result["ticks"]} ticks')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+"""
+Measure cost of Record.hash on freshly created and already hashed records
+
+Run with `python -m benchmarks.bench_record`. Hash of a record is calculated
+from its JSON representation and cached until a serialized field changes,
+so the uncached case shows the cost paid once per record, mostly on storing
+it in the database, and the cached case shows the cost of every next call.
+"""
+from typing import Dict
+
+from avtdl.core.interfaces import Record, TextRecord
+from benchmarks.bench_format import make_record
+from benchmarks.utils import measure, report
+
+
+def uncached_hash(record: Record) -> str:
+    record._drop_cache()
+    return record.hash()
+
+
+def bench_hash() -> Dict[str, float]:
+    records: Dict[str, Record] = {'TextRecord': TextRecord(text='benchmark ' * 20), 'GenericRSSRecord': make_record()}
+    results = {}
+    for name, record in records.items():
+        results[f'{name}, uncached'] = measure(lambda: uncached_hash(record), number=10000)
+        results[f'{name}, cached'] = measure(record.hash, number=10000)
+    return results
+
+
+def main() -> None:
+    report('Record.hash, time per call', bench_hash())
+
+
+if __name__ == '__main__':
+    main()
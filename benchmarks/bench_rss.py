@@ -0,0 +1,40 @@
+"""
+Measure cost of turning a fetched RSS feed into records in GenericRSSMonitor
+
+Run with `python -m benchmarks.bench_rss`. Feeds of typical sizes are parsed
+with feedparser through `parse_feed`, and entries of the parsed feed are
+converted into GenericRSSRecord by the monitor, as it happens on every
+update of a feed that has changed since the previous one. Conversion modifies
+entries of the parsed feed, so it is measured together with parsing.
+"""
+from typing import Dict
+
+from avtdl.core.runtime import RuntimeContext
+from avtdl.plugins.rss.generic_rss import GenericRSSMonitor, GenericRSSMonitorConfig, parse_feed
+from benchmarks.bench_parse import make_feed
+from benchmarks.utils import measure, report
+
+FEED_SIZES = [16 * 1024, 256 * 1024]
+HEADERS = {'content-location': 'https://example.com/feed'}
+
+
+def bench_parse() -> Dict[str, float]:
+    monitor = GenericRSSMonitor(GenericRSSMonitorConfig(name='rss', db_path=':memory:'), [], RuntimeContext.create())
+    results = {}
+    for size in FEED_SIZES:
+        feed = make_feed(size)
+        entries = len(parse_feed(feed, HEADERS)['entries'])
+        assert len(monitor._parse_entries(parse_feed(feed, HEADERS))) == entries
+        results[f'parse_feed, {entries} entries'] = measure(lambda: parse_feed(feed, HEADERS), number=5, repeat=3)
+        results[f'parse_feed + _parse_entries, {entries} entries'] = measure(
+            lambda: monitor._parse_entries(parse_feed(feed, HEADERS)), number=5, repeat=3)
+    monitor.db.db.close()
+    return results
+
+
+def main() -> None:
+    report('GenericRSSMonitor, time per feed', bench_parse())
+
+
+if __name__ == '__main__':
+    main()
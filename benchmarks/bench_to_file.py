@@ -0,0 +1,82 @@
+"""
+Measure throughput and event loop lag of the to_file action
+
+Run with `python -m benchmarks.bench_to_file`. 100k text records are passed
+to a `to_file` entity writing them to one of a few files chosen by the record
+text, in batches of 100 records per loop iteration. Without the actor `run()`
+task every record is written by opening, appending to and closing the file
+on the event loop, with it records are buffered and written in the background.
+A ticker task measures how late it gets woken up compared to the requested
+interval while records are being written.
+"""
+import asyncio
+import gc
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from avtdl.core.actors import ActorConfig
+from avtdl.core.interfaces import TextRecord
+from avtdl.core.runtime import RuntimeContext
+from avtdl.plugins.file.text_file import FileAction, FileActionEntity
+
+RECORDS = 100_000
+FILES = 5
+BATCH = 100
+TICK = 0.001
+
+
+class FileRecord(TextRecord):
+    target: str
+    """name of the file the record is written to"""
+
+
+async def write_records(directory: Path, buffered: bool) -> Dict[str, float]:
+    entity = FileActionEntity(name='bench', path=directory, filename='{target}.txt', output_template='{text}')
+    actor = FileAction(ActorConfig(name='to_file'), [entity], RuntimeContext.create())
+    records = [FileRecord(text=f'record number {i} with some text to make it longer', target=f'file{i % FILES}')
+               for i in range(RECORDS)]
+    # keep collection of records left from the previous run from showing up as loop lag
+    gc.collect()
+
+    lags: List[float] = []
+    done = False
+
+    async def ticker():
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - started - TICK)
+
+    ticker_task = asyncio.create_task(ticker())
+    actor_task = asyncio.create_task(actor.run()) if buffered else None
+    await asyncio.sleep(TICK * 2)
+    started = time.perf_counter()
+    for i in range(0, RECORDS, BATCH):
+        for record in records[i:i + BATCH]:
+            actor.handle(entity, record)
+        await asyncio.sleep(0)
+    if actor_task is not None:
+        actor_task.cancel()
+        await asyncio.gather(actor_task, return_exceptions=True)
+    duration = time.perf_counter() - started
+    done = True
+    await ticker_task
+
+    written = sum(len(path.read_text(encoding='utf8').splitlines()) for path in directory.iterdir())
+    assert written == RECORDS, f'expected {RECORDS} lines, got {written}'
+    return {'duration': duration, 'max lag': max(lags)}
+
+
+async def main() -> None:
+    print(f'writing {RECORDS} records to {FILES} files')
+    for name, buffered in [('unbuffered', False), ('buffered', True)]:
+        with tempfile.TemporaryDirectory() as directory:
+            result = await write_records(Path(directory), buffered)
+        print(f'  {name:<12} {RECORDS / result["duration"]:10.0f} records/s, '
+              f'max loop lag {result["max lag"] * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""
+Measure extraction of embedded JSON data from stored YouTube pages
+
+Run with `python -m benchmarks.bench_youtube`. Pages in `benchmarks/fixtures`
+mimic the structure and size of a channel videos tab with 30 videos and of
+a live chat page with 200 messages, with ytInitialData embedded in a script
+tag after a large chunk of unrelated markup. They are parsed the same way
+the youtube monitors do it.
+"""
+import gzip
+from pathlib import Path
+from typing import Dict
+
+from avtdl.plugins.youtube.common import extract_keys, get_initial_data_fast, get_innertube_context
+from avtdl.plugins.youtube.feed_info import get_video_renderers
+from avtdl.plugins.youtube.youtube_chat import Parser
+from benchmarks.utils import measure, report
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+INITIAL_DATA_ANCHOR = 'var ytInitialData = '
+
+
+def load_fixture(name: str) -> str:
+    with gzip.open(FIXTURES / name, 'rt', encoding='utf8') as fp:
+        return fp.read()
+
+
+def bench_parse() -> Dict[str, float]:
+    videos_page = load_fixture('youtube_channel_videos.html.gz')
+    chat_page = load_fixture('youtube_live_chat.html.gz')
+    chat_keys = list(Parser.known_actions)
+    renderers, _, continuation, _ = get_video_renderers(videos_page)
+    assert len(renderers) == 30 and continuation is not None
+    actions, _ = extract_keys(chat_page, chat_keys, INITIAL_DATA_ANCHOR)
+    assert len(actions['addChatItemAction']) == 200
+    return {
+        'get_initial_data_fast, videos page': measure(lambda: get_initial_data_fast(videos_page), number=100),
+        'extract_keys, videos page': measure(lambda: get_video_renderers(videos_page), number=100),
+        'extract_keys, innertube context': measure(lambda: get_innertube_context(videos_page), number=100),
+        'extract_keys, live chat page': measure(lambda: extract_keys(chat_page, chat_keys, INITIAL_DATA_ANCHOR), number=100),
+    }
+
+
+def main() -> None:
+    report('YouTube page parsing, time per page', bench_parse())
+
+
+if __name__ == '__main__':
+    main()
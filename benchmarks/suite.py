@@ -0,0 +1,174 @@
+"""
+Run benchmarks of core hot paths and compare results between commits
+
+Run with `python -m benchmarks.suite`. Every benchmark reports the best
+observed time of a single operation. Results can be saved as a JSON
+baseline with `--save PATH` and compared with a previously saved baseline
+with `--compare PATH`, or two saved baselines can be compared without running
+anything with `--diff OLD NEW`. When comparing, operations that got slower
+by more than `--threshold` (20% by default) are reported as regressions
+and the exit code is 1. Timings depend on the machine, so only baselines
+made on the same machine should be compared.
+
+Typical use is saving a baseline before making changes:
+
+    python -m benchmarks.suite --save baseline.json
+    python -m benchmarks.suite --compare baseline.json
+
+A subset of benchmarks can be selected with `-k`, which is matched against
+benchmark names as a substring.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks import bench_bus, bench_cache, bench_chain, bench_db, bench_format, bench_record, bench_rss, \
+    bench_youtube
+from benchmarks.utils import format_duration, report
+
+BASELINE_VERSION = 1
+DEFAULT_THRESHOLD = 0.2
+
+BENCHMARKS: Dict[str, Callable[[], Dict[str, float]]] = {
+    'MessageBus.pub': bench_bus.bench_pub,
+    'MessageBus.pub fan-out': bench_bus.bench_fan_out,
+    'Chain': bench_chain.bench_chain,
+    'RecordDB store': bench_db.bench_store,
+    'RecordDB lookup': bench_db.bench_lookup,
+    'RecordDB classify': bench_db.bench_classify,
+    'Fmt.format': bench_format.bench_format,
+    'Record.hash': bench_record.bench_hash,
+    'GenericRSSMonitor': bench_rss.bench_parse,
+    'YouTube': bench_youtube.bench_parse,
+    'FileCache': bench_cache.bench_retrieve,
+}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def is_selected(name: str, selected: Optional[str]) -> bool:
+    return selected is None or selected.lower() in name.lower()
+
+
+def run(selected: Optional[str] = None) -> Dict[str, float]:
+    """run benchmarks with names containing selected substring, return results keyed by "benchmark: case" names"""
+    results: Dict[str, float] = {}
+    for name, bench in BENCHMARKS.items():
+        if not is_selected(name, selected):
+            continue
+        started = time.perf_counter()
+        bench_results = bench()
+        report(f'{name} ({time.perf_counter() - started:.1f} s)', bench_results)
+        for case, duration in bench_results.items():
+            results[f'{name}: {case}'] = duration
+    return results
+
+
+def make_baseline(results: Dict[str, float]) -> dict:
+    return {
+        'version': BASELINE_VERSION,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def save_baseline(path: Path, baseline: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baseline, indent=2), encoding='utf8')
+
+
+def load_baseline(path: Path) -> dict:
+    baseline = json.loads(path.read_text(encoding='utf8'))
+    if not isinstance(baseline, dict) or baseline.get('version') != BASELINE_VERSION:
+        raise ValueError(f'"{path}" is not a benchmark baseline of version {BASELINE_VERSION}')
+    return baseline
+
+
+def compare(old: Dict[str, float], new: Dict[str, float],
+            threshold: float = DEFAULT_THRESHOLD) -> Tuple[List[Tuple[str, Optional[float], Optional[float], str]], List[str]]:
+    """
+    return rows of (name, old duration, new duration, verdict) for every
+    benchmark present in either of the results, and names of regressions
+    """
+    rows = []
+    regressions = []
+    for name in [*old, *(name for name in new if name not in old)]:
+        old_duration, new_duration = old.get(name), new.get(name)
+        if old_duration is None:
+            verdict = 'added'
+        elif new_duration is None:
+            verdict = 'removed'
+        else:
+            change = new_duration / old_duration - 1 if old_duration else 0
+            verdict = f'{change:+.1%}'
+            if change > threshold:
+                verdict += ' slower'
+                regressions.append(name)
+            elif change < -threshold:
+                verdict += ' faster'
+        rows.append((name, old_duration, new_duration, verdict))
+    return rows, regressions
+
+
+def print_comparison(old: dict, new: dict, threshold: float) -> bool:
+    """print comparison of two baselines, return True if there are no regressions"""
+    rows, regressions = compare(old['results'], new['results'], threshold)
+    print(f'comparing {old.get("commit") or "unknown commit"} ({old.get("created")}) '
+          f'with {new.get("commit") or "unknown commit"} ({new.get("created")})')
+    width = max((len(row[0]) for row in rows), default=0)
+    for name, old_duration, new_duration, verdict in rows:
+        old_text = format_duration(old_duration) if old_duration is not None else '-'
+        new_text = format_duration(new_duration) if new_duration is not None else '-'
+        print(f'  {name:<{width}}  {old_text:>10}  {new_text:>10}  {verdict}')
+    if regressions:
+        print(f'{len(regressions)} regressions over {threshold:.0%}')
+    return not regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description='Run benchmarks of core hot paths')
+    parser.add_argument('-k', dest='selected', help='only run benchmarks with names containing this substring')
+    parser.add_argument('--save', type=Path, help='store results as a JSON baseline at this path')
+    parser.add_argument('--compare', type=Path, help='compare results with the baseline stored at this path')
+    parser.add_argument('--diff', type=Path, nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two stored baselines without running benchmarks')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown reported as a regression, default %(default)s')
+    args = parser.parse_args(argv)
+
+    if args.diff is not None:
+        old, new = (load_baseline(path) for path in args.diff)
+        return 0 if print_comparison(old, new, args.threshold) else 1
+
+    reference = load_baseline(args.compare) if args.compare is not None else None
+    if reference is not None:
+        # benchmarks that were not selected to run are not compared
+        reference['results'] = {name: duration for name, duration in reference['results'].items()
+                                if is_selected(name.split(': ', 1)[0], args.selected)}
+    baseline = make_baseline(run(args.selected))
+    if args.save is not None:
+        save_baseline(args.save, baseline)
+        print(f'results saved to "{args.save}"')
+    if reference is not None:
+        return 0 if print_comparison(reference, baseline, args.threshold) else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import timeit
+from typing import Callable, Dict, List
+
+
+def measure(func: Callable[[], object], number: int = 1000, repeat: int = 5) -> float:
+    """return the best observed duration of a single func() call, in seconds"""
+    timings = timeit.repeat(func, number=number, repeat=repeat)
+    return min(timings) / number
+
+
+def format_duration(seconds: float) -> str:
+    for unit, scale in [('s', 1), ('ms', 1e-3), ('us', 1e-6)]:
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+def report(title: str, results: Dict[str, float]) -> None:
+    """print timings as a two-column table"""
+    print(title)
+    width = max((len(name) for name in results), default=0)
+    lines: List[str] = []
+    for name, duration in results.items():
+        lines.append(f'  {name:<{width}}  {format_duration(duration):>10}')
+    print('\n'.join(lines))
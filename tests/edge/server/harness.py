@@ -1,4 +1,4 @@
-from collections import defaultdict, deque
+from collections import Counter, defaultdict, deque
 from pathlib import Path
 from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple, Union
 
@@ -76,6 +76,8 @@ class TestServer:
         self._runner: Optional[web.AppRunner] = None
         self._site: Optional[web.TCPSite] = None
         self._payloads: Dict[Tuple[str, str], deque[Payload]] = defaultdict(deque)
+        self.requests: Counter[Tuple[str, str]] = Counter()
+        '''number of requests received by every (method, path) pair'''
 
     async def start(self) -> None:
         self._runner = web.AppRunner(self._app)
@@ -104,6 +106,7 @@ class TestServer:
 
     def _make_handler(self, method: str, path: str) -> Callable[[web.Request], Awaitable[web.Response]]:
         async def handler(request: web.Request) -> web.Response:
+            self.requests[(method.upper(), path)] += 1
             queue = self.get_payload_queue(method, path)
 
             if len(queue) == 0:
@@ -139,6 +142,15 @@ class TestServer:
         for payload in route.payloads:
             queue.append(payload)
 
+    def register_handler(self, method: str, path: str, handler: Callable[[web.Request], Awaitable[web.Response]]) -> None:
+        '''Register a route producing responses with a custom handler, counting requests to it'''
+
+        async def counting_handler(request: web.Request) -> web.Response:
+            self.requests[(method.upper(), path)] += 1
+            return await handler(request)
+
+        self._app.router.add_route(method, path, counting_handler)
+
 
 def build_server_from_config(config: ServerConfig) -> TestServer:
     '''Create a TestServer instance and register every route defined in config'''
@@ -0,0 +1,507 @@
+"""
+Drive the application runtime against local stand-ins of external services
+
+Run with `python tests/edge/server/load.py --entities 300 --chains 30 --duration 120`.
+Local servers emulating RSS feeds, Youtube channel pages, Twitch GQL API and
+Discord webhooks are started in a separate thread, and a configuration is
+generated with the given number of monitor entities, split evenly between
+`generic_rss`, `channel` and `twitch` monitors, and the given number of chains.
+Every chain passes records of its monitor entities through a `filter.match`
+entity to its own `discord.hook` entity. The runtime is then run for a fixed
+duration, after which throughput, end-to-end latency of records, resident
+memory size and event loop lag are reported.
+
+Every RSS feed and Youtube channel publishes a new entry every
+`--publish-interval` seconds, every Twitch user goes live once. The
+publication time can be derived from a marker embedded in the entry title,
+which allows the webhook stand-in to measure how long it took the record
+to be delivered. Entries published before the first update of a feed are
+treated by the monitor as already seen, as it happens in real deployments.
+Discord stand-in enforces the webhook rate limit of 5 messages in 2 seconds.
+
+Startup is included in the duration. Feed monitors fetch every entity once
+on startup before regular updates begin, one entity after another, and the
+`channel` monitor waits `next_page_delay` after each of them, so with many
+Youtube entities the first updates can take a while to start.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from email.utils import formatdate
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+from avtdl.core.config import ConfigParser, config_sancheck
+from avtdl.core.lag import LoopLagMonitor
+from avtdl.core.loggers import LoggingConfig, setup_console_logger, silence_library_loggers
+from avtdl.core.request import ClientPool
+from avtdl.core.runtime import RuntimeContext, TerminatedAction
+from avtdl.plugins.twitch.twitch import GQL
+from harness import TestServer
+
+KINDS = ['rss', 'youtube', 'twitch']
+PLUGINS = {'rss': 'generic_rss', 'youtube': 'channel', 'twitch': 'twitch'}
+FEED_SIZE = 15
+"""number of the most recent entries served by every feed"""
+MARKER = re.compile(r'#load-(rss|youtube|twitch)-(\d+)-(-?\d+)')
+WEBHOOK_LIMIT = 5
+WEBHOOK_WINDOW = 2
+
+
+def marker(kind: str, index: int, seq: int) -> str:
+    return f'#load-{kind}-{index}-{seq}'
+
+
+@dataclass
+class Schedule:
+    """Publication times of entries of feeds of a single kind, spread evenly over the interval"""
+    feeds: int
+    interval: float
+    start: float
+
+    def published_at(self, index: int, seq: int) -> float:
+        return self.start + self.interval * (seq + index / self.feeds)
+
+    def latest(self, index: int, now: float) -> int:
+        """sequence number of the most recent entry published before now"""
+        return math.floor((now - self.start) / self.interval - index / self.feeds)
+
+    def published_between(self, start: float, end: float) -> int:
+        count = 0
+        for index in range(self.feeds):
+            count += max(0, self.latest(index, end) - self.latest(index, start))
+        return count
+
+
+@dataclass
+class Deliveries:
+    """Records received by the webhook stand-in"""
+    messages: int = 0
+    rate_limited: int = 0
+    duplicates: int = 0
+    latencies: List[float] = field(default_factory=list)
+    seen: Set[Tuple[str, str, str]] = field(default_factory=set)
+
+
+class MockServices:
+    """Local stand-ins for external services, running in a separate thread with its own event loop"""
+
+    TWITCH_LIVE_SEQ = 1
+    """twitch users go live when their second entry would be published, after the first update"""
+
+    def __init__(self, schedules: Dict[str, Schedule]) -> None:
+        self.schedules = schedules
+        self.servers = {'rss': TestServer(), 'youtube': TestServer(), 'twitch': TestServer(), 'discord': TestServer()}
+        self.deliveries = Deliveries()
+        self.windows: Dict[str, Tuple[float, int]] = {}
+        """webhook id -> start of the current rate limit window and number of requests in it"""
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+
+        self.servers['rss'].register_handler('GET', '/rss/{index}', self.rss_feed)
+        self.servers['youtube'].register_handler('GET', '/youtube/{index}/videos', self.youtube_page)
+        self.servers['twitch'].register_handler('POST', '/gql', self.twitch_gql)
+        self.servers['discord'].register_handler('POST', '/webhook/{index}', self.discord_webhook)
+
+    def url(self, service: str) -> str:
+        return self.servers[service].url
+
+    def requests(self, service: str) -> int:
+        return sum(self.servers[service].requests.values())
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name='mock services', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise RuntimeError(f'failed to start mock services: {self._error}') from self._error
+
+    def stop(self) -> None:
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread is not None:
+            self._thread.join()
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        try:
+            for server in self.servers.values():
+                await server.start()
+        except BaseException as e:
+            self._error = e
+            raise
+        finally:
+            self._ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            for server in self.servers.values():
+                await server.stop()
+
+    def recent_entries(self, kind: str, index: int) -> List[Tuple[int, float]]:
+        schedule = self.schedules[kind]
+        latest = schedule.latest(index, time.time())
+        return [(seq, schedule.published_at(index, seq)) for seq in range(latest, latest - FEED_SIZE, -1)]
+
+    async def rss_feed(self, request: web.Request) -> web.Response:
+        index = int(request.match_info['index'])
+        items = []
+        for seq, published in self.recent_entries('rss', index):
+            url = f'https://feed{index}.example.com/posts/{seq}'
+            items.append(f'<item><guid>{url}</guid><title>Post {seq} {marker("rss", index, seq)}</title>'
+                         f'<link>{url}</link><pubDate>{formatdate(published, usegmt=True)}</pubDate>'
+                         f'<description>&lt;p&gt;Text of the post {seq} of feed {index}&lt;/p&gt;</description></item>')
+        feed = (f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed {index}</title>'
+                f'<link>https://feed{index}.example.com/</link>{"".join(items)}</channel></rss>')
+        return web.Response(text=feed, content_type='application/rss+xml')
+
+    async def youtube_page(self, request: web.Request) -> web.Response:
+        index = int(request.match_info['index'])
+        contents = []
+        for seq, published in self.recent_entries('youtube', index):
+            video_id = f'v{index:05d}{seq % 100000:05d}'
+            contents.append({'richItemRenderer': {'content': {'videoRenderer': {
+                'videoId': video_id,
+                'title': {'runs': [{'text': f'Stream {seq} {marker("youtube", index, seq)}'}]},
+                'descriptionSnippet': {'runs': [{'text': f'Description of the stream {seq} of channel {index}'}]},
+                'publishedTimeText': {'simpleText': f'{int(time.time() - published)} seconds ago'},
+                'lengthText': {'simpleText': '1:02:03'},
+                'thumbnail': {'thumbnails': [{'url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg'}]},
+            }}}})
+        data = {
+            'contents': {'twoColumnBrowseResultsRenderer': {'tabs': [
+                {'tabRenderer': {'title': 'Videos', 'selected': True, 'content': {'richGridRenderer': {'contents': contents}}}}
+            ]}},
+            'metadata': {'channelMetadataRenderer': {
+                'title': f'Channel {index}', 'externalId': f'UCload{index:018d}',
+                'vanityChannelUrl': f'http://www.youtube.com/@channel{index}',
+                'avatar': {'thumbnails': [{'url': f'https://yt3.googleusercontent.com/channel{index}'}]}}},
+        }
+        context = {'client': {'hl': 'en', 'gl': 'US', 'clientName': 'WEB', 'clientVersion': '2.20231023.04.02'}}
+        page = ('<!DOCTYPE html><html><head><title>YouTube</title>'
+                f'<script>ytcfg.set({{"INNERTUBE_CONTEXT":{json.dumps(context)}}});</script></head><body>'
+                f'<script>var ytInitialData = {json.dumps(data)};</script></body></html>')
+        return web.Response(text=page, content_type='text/html')
+
+    async def twitch_gql(self, request: web.Request) -> web.Response:
+        operations = await request.json()
+        now = time.time()
+        results: List[Dict[str, Any]] = []
+        for operation in operations:
+            username = operation.get('variables', {}).get('channelLogin', '')
+            index = int(username.removeprefix('load') or 0)
+            name = operation.get('operationName')
+            if name == 'UseLive':
+                live_since = self.schedules['twitch'].published_at(index, self.TWITCH_LIVE_SEQ)
+                if now < live_since:
+                    stream = None
+                else:
+                    created_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(live_since))
+                    stream = {'id': str(index), 'createdAt': created_at}
+                results.append({'data': {'user': {'stream': stream}}})
+            elif name == 'UseLiveBroadcast':
+                title = f'Stream {marker("twitch", index, self.TWITCH_LIVE_SEQ)}'
+                results.append({'data': {'user': {'lastBroadcast': {'title': title, 'game': {'name': 'Just Chatting'}}}}})
+            else:
+                results.append({'data': {}})
+        return web.json_response(results)
+
+    async def discord_webhook(self, request: web.Request) -> web.Response:
+        webhook = request.match_info['index']
+        now = time.time()
+        window_start, count = self.windows.get(webhook, (0.0, 0))
+        if now >= window_start + WEBHOOK_WINDOW:
+            window_start, count = now, 0
+        count += 1
+        self.windows[webhook] = (window_start, count)
+        reset_at = math.ceil(window_start + WEBHOOK_WINDOW)
+        headers = {'X-RateLimit-Limit': str(WEBHOOK_LIMIT),
+                   'X-RateLimit-Remaining': str(max(0, WEBHOOK_LIMIT - count)),
+                   'X-RateLimit-Reset': str(reset_at),
+                   'X-RateLimit-Bucket': f'bucket{webhook}'}
+        if count > WEBHOOK_LIMIT:
+            self.deliveries.rate_limited += 1
+            body = {'message': 'You are being rate limited.', 'retry_after': reset_at - now, 'global': False}
+            return web.json_response(body, status=429, headers=headers)
+
+        text = await request.text()
+        self.deliveries.messages += 1
+        for key in set(MARKER.findall(text)):
+            if key in self.deliveries.seen:
+                self.deliveries.duplicates += 1
+                continue
+            self.deliveries.seen.add(key)
+            kind, index, seq = key
+            published = self.schedules[kind].published_at(int(index), int(seq))
+            self.deliveries.latencies.append(now - published)
+        return web.Response(status=204, headers=headers)
+
+
+@dataclass
+class LoadOptions:
+    entities: int = 300
+    chains: int = 30
+    duration: float = 120
+    update_interval: float = 30
+    publish_interval: float = 60
+    kinds: List[str] = field(default_factory=lambda: list(KINDS))
+
+
+@dataclass
+class LoadReport:
+    duration: float
+    entities: Dict[str, int]
+    chains: int
+    published: int
+    """entries published by the stand-ins while the runtime was running"""
+    delivered: int
+    """distinct records received by the webhook stand-in"""
+    duplicates: int
+    messages: int
+    rate_limited: int
+    throughput: float
+    """delivered records per second"""
+    latency: Dict[str, float]
+    requests: Dict[str, int]
+    memory: Dict[str, Optional[int]]
+    loop_lag: Dict[str, float]
+
+    def __str__(self) -> str:
+        entities = ', '.join(f'{count} {kind}' for kind, count in self.entities.items())
+        latency = ', '.join(f'{name} {value:.2f} s' for name, value in self.latency.items()) or 'no records delivered'
+        requests = ', '.join(f'{service} {count}' for service, count in self.requests.items())
+        memory = ', '.join(f'{name} {format_size(value)}' for name, value in self.memory.items())
+        lag = self.loop_lag
+        lines = [
+            f'ran {entities} entities in {self.chains} chains for {self.duration:.1f} s',
+            f'  published      {self.published} entries',
+            f'  delivered      {self.delivered} records in {self.messages} messages, '
+            f'{self.duplicates} duplicates, {self.rate_limited} rate limited requests',
+            f'  throughput     {self.throughput:.2f} records/s',
+            f'  latency        {latency}',
+            f'  requests       {requests}',
+            f'  memory (RSS)   {memory}',
+            f'  loop lag       average {lag["average"] * 1000:.1f} ms, maximum {lag["max"] * 1000:.1f} ms, '
+            f'{int(lag["stalls"])} stalls',
+        ]
+        return '\n'.join(lines)
+
+
+def format_size(size: Optional[int]) -> str:
+    if size is None:
+        return 'unavailable'
+    return f'{size / 1024 / 1024:.1f} MiB'
+
+
+def current_rss() -> Optional[int]:
+    """return resident set size of the process in bytes, or peak size if current one is not available"""
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+class MemorySampler:
+
+    def __init__(self, interval: float = 1) -> None:
+        self.interval = interval
+        self.start = current_rss()
+        self.peak = self.start
+        self.last = self.start
+
+    def sample(self) -> None:
+        self.last = current_rss()
+        if self.last is not None and (self.peak is None or self.last > self.peak):
+            self.peak = self.last
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.sample()
+
+
+def split_entities(entities: int, kinds: List[str]) -> Dict[str, int]:
+    return {kind: entities // len(kinds) + (1 if i < entities % len(kinds) else 0) for i, kind in enumerate(kinds)}
+
+
+def make_config(services: MockServices, counts: Dict[str, int], chains: int,
+                update_interval: float, workdir: Path) -> dict:
+    """generate configuration with entities of every kind distributed between chains of this kind"""
+    kinds = [kind for kind, count in counts.items() if count > 0]
+    chains_entities: List[Tuple[str, List[str]]] = [(kinds[i % len(kinds)], []) for i in range(chains)]
+    actors: Dict[str, dict] = {}
+    for kind in kinds:
+        kind_chains = [entities for chain_kind, entities in chains_entities if chain_kind == kind]
+        entities = []
+        for index in range(counts[kind]):
+            entity: Dict[str, Any] = {'name': f'{kind}{index}', 'update_interval': update_interval}
+            if kind == 'rss':
+                entity.update({'url': f'{services.url("rss")}/rss/{index}', 'adjust_update_interval': False})
+            elif kind == 'youtube':
+                entity.update({'url': f'{services.url("youtube")}/youtube/{index}/videos', 'adjust_update_interval': False})
+            else:
+                entity.update({'username': f'load{index}'})
+            entities.append(entity)
+            kind_chains[index % len(kind_chains)].append(entity['name'])
+        actors[PLUGINS[kind]] = {'config': {'db_path': f'{workdir / "db"}/'}, 'entities': entities}
+
+    chains_section = {}
+    filters = []
+    hooks = []
+    for i, (kind, entities) in enumerate(chains_entities):
+        if not entities:
+            continue
+        name = f'chain{i}'
+        filters.append({'name': name, 'patterns': ['#load-']})
+        hooks.append({'name': name, 'url': f'{services.url("discord")}/webhook/{i}'})
+        chains_section[name] = [{PLUGINS[kind]: entities}, {'filter.match': [name]}, {'discord.hook': [name]}]
+    actors['filter.match'] = {'entities': filters}
+    actors['discord.hook'] = {'entities': hooks}
+
+    settings = {'log_directory': str(workdir / 'logs'), 'cache_directory': f'{workdir / "cache"}/',
+                'state_directory': f'{workdir / "state"}/'}
+    return {'settings': settings, 'actors': actors, 'chains': chains_section}
+
+
+def close_log_files() -> None:
+    """detach log file handlers pointing to the working directory"""
+    for name, handler in [('', LoggingConfig.file_handler), ('aiohttp.access', LoggingConfig.access_handler)]:
+        if handler is not None:
+            logging.getLogger(name).removeHandler(handler)
+            handler.close()
+    LoggingConfig.file_handler = LoggingConfig.access_handler = None
+
+
+def summarize_latency(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    if len(latencies) == 1:
+        return {'p50': latencies[0], 'p95': latencies[0], 'max': latencies[0]}
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {'p50': percentiles[49], 'p95': percentiles[94], 'max': max(latencies)}
+
+
+async def run_load(options: LoadOptions) -> LoadReport:
+    counts = split_entities(options.entities, options.kinds)
+    start = time.time()
+    schedules = {kind: Schedule(max(count, 1), options.publish_interval, start) for kind, count in counts.items()}
+    services = MockServices(schedules)
+    services.start()
+    workdir = Path(tempfile.mkdtemp(prefix='avtdl-load-'))
+    gql_url = GQL.URL
+    GQL.URL = f'{services.url("twitch")}/gql'
+    try:
+        config = make_config(services, counts, options.chains, options.update_interval, workdir)
+        ctx = RuntimeContext.create()
+        # check for termination more often than every 5 seconds to keep the run close to the requested duration
+        ctx.controller.poll_interval = 0.5
+        loop_monitor = LoopLagMonitor()
+        ctx.set_extra('loop_monitor', loop_monitor)
+        memory = MemorySampler()
+        with ctx:
+            _, actors, chains = ConfigParser.parse(config, ctx)
+            config_sancheck(actors, chains)
+            controller = ctx.controller
+            _ = controller.create_task(loop_monitor.run(), name='loop lag monitor')
+            _ = controller.create_task(memory.run(), name='memory sampler')
+            for actor in actors.values():
+                _ = controller.create_task(actor.run(), name=f'{actor!r}.{hash(actor)}')
+            controller.terminate_after(options.duration, TerminatedAction.EXIT)
+            started_at = time.time()
+            await controller.run_until_termination()
+            finished_at = time.time()
+        for actor in actors.values():
+            # monitors cancelled before their first update don't get to close their sessions
+            clients = getattr(actor, 'clients', None)
+            if isinstance(clients, ClientPool):
+                await clients.close()
+        memory.sample()
+    finally:
+        GQL.URL = gql_url
+        services.stop()
+        close_log_files()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    deliveries = services.deliveries
+    duration = finished_at - started_at
+    stats = loop_monitor.stats
+    return LoadReport(
+        duration=duration,
+        entities={kind: count for kind, count in counts.items() if count > 0},
+        chains=len(chains),
+        published=sum(schedule.published_between(started_at, finished_at)
+                      for kind, schedule in schedules.items() if kind != 'twitch') + counts.get('twitch', 0),
+        delivered=len(deliveries.seen),
+        duplicates=deliveries.duplicates,
+        messages=deliveries.messages,
+        rate_limited=deliveries.rate_limited,
+        throughput=len(deliveries.seen) / duration if duration else 0,
+        latency=summarize_latency(deliveries.latencies),
+        requests={service: services.requests(service) for service in services.servers},
+        memory={'start': memory.start, 'peak': memory.peak, 'end': memory.last},
+        loop_lag={'average': stats.total_lag / stats.samples if stats.samples else 0,
+                  'max': stats.max_lag, 'stalls': stats.stalls},
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> Tuple[LoadOptions, argparse.Namespace]:
+    defaults = LoadOptions()
+    parser = argparse.ArgumentParser(description='Run the application against local stand-ins of external services and report its performance')
+    parser.add_argument('-n', '--entities', type=int, default=defaults.entities, help='total number of monitor entities, default %(default)s')
+    parser.add_argument('-m', '--chains', type=int, default=defaults.chains, help='number of chains, default %(default)s')
+    parser.add_argument('-t', '--duration', type=float, default=defaults.duration, help='how long to run, in seconds, default %(default)s')
+    parser.add_argument('--update-interval', type=float, default=defaults.update_interval, help='update interval of monitor entities, default %(default)s')
+    parser.add_argument('--publish-interval', type=float, default=defaults.publish_interval, help='how often every feed publishes a new entry, default %(default)s')
+    parser.add_argument('--kinds', default=','.join(defaults.kinds), help='comma-separated kinds of monitors to use, out of %(default)s')
+    parser.add_argument('--json', type=Path, help='also write the report to this file in JSON format')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show info messages of the application')
+    args = parser.parse_args(argv)
+
+    kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+    unknown = set(kinds) - set(KINDS)
+    if unknown or not kinds:
+        parser.error(f'unknown monitor kinds: {", ".join(unknown)}, supported kinds are {", ".join(KINDS)}')
+    if args.entities < len(kinds):
+        parser.error(f'need at least one entity of every kind, got {args.entities} entities for {len(kinds)} kinds')
+    if args.chains < len(kinds):
+        parser.error(f'need at least one chain of every kind, got {args.chains} chains for {len(kinds)} kinds')
+    options = LoadOptions(args.entities, args.chains, args.duration, args.update_interval, args.publish_interval, kinds)
+    return options, args
+
+
+def main() -> None:
+    options, args = parse_args()
+    setup_console_logger(logging.INFO if args.verbose else logging.WARNING)
+    silence_library_loggers()
+    report = asyncio.run(run_load(options))
+    print(report)
+    if args.json is not None:
+        args.json.write_text(json.dumps(asdict(report), indent=2), encoding='utf8')
+
+
+if __name__ == '__main__':
+    main()
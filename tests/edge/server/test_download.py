@@ -0,0 +1,138 @@
+import hashlib
+from typing import List, Optional
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from avtdl.core.request import ClientPool, DownloadProgress, Transport
+
+CONTENT = bytes(range(256)) * 1024
+ETAG = '"v1"'
+
+
+class RangeServer:
+    """Serve CONTENT at /file, honoring Range and If-Range headers"""
+
+    def __init__(self) -> None:
+        self.etag = ETAG
+        self.requests: List[Optional[str]] = []
+        app = web.Application()
+        app.router.add_get('/file', self.handler)
+        self.server = TestServer(app)
+
+    @property
+    def url(self) -> str:
+        return str(self.server.make_url('/file'))
+
+    async def handler(self, request: web.Request) -> web.Response:
+        requested_range = request.headers.get('Range')
+        self.requests.append(requested_range)
+        headers = {'ETag': self.etag, 'Content-Type': 'application/octet-stream'}
+        if requested_range is None or request.headers.get('If-Range') != self.etag:
+            return web.Response(body=CONTENT, headers=headers)
+        start = int(requested_range.removeprefix('bytes=').rstrip('-'))
+        if start >= len(CONTENT):
+            return web.Response(status=416, headers=headers)
+        headers['Content-Range'] = f'bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}'
+        return web.Response(status=206, body=CONTENT[start:], headers=headers)
+
+
+@pytest_asyncio.fixture
+async def range_server():
+    server = RangeServer()
+    await server.server.start_server()
+    try:
+        yield server
+    finally:
+        await server.server.close()
+
+
+def make_partial(path, url: str, size: int, etag: str = ETAG) -> None:
+    path.write_bytes(CONTENT[:size])
+    DownloadProgress(url=url, validator=etag, response_headers={'ETag': etag}).save(path)
+
+
+@pytest.mark.parametrize("transport", [Transport.AIOHTTP, Transport.CURL_CFFI])
+@pytest.mark.asyncio
+async def test_resume_partial_file(range_server: RangeServer, transport: Transport, tmp_path):
+    path = tmp_path / 'file.part'
+    make_partial(path, range_server.url, 1000)
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='test_download', transport=transport)
+        info = await client.download_file(path, range_server.url, chunk_size=4096, resume=True)
+        assert info is not None
+        assert range_server.requests == ['bytes=1000-']
+        assert path.read_bytes() == CONTENT
+        assert info.sha256 == hashlib.sha256(CONTENT).hexdigest()
+        assert not DownloadProgress.location(path).exists()
+    finally:
+        await client_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_restart_if_remote_file_changed(range_server: RangeServer, tmp_path):
+    path = tmp_path / 'file.part'
+    make_partial(path, range_server.url, 1000, etag='"outdated"')
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='test_download')
+        info = await client.download_file(path, range_server.url, resume=True)
+        assert info is not None
+        assert range_server.requests == ['bytes=1000-']
+        assert path.read_bytes() == CONTENT
+    finally:
+        await client_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_progress_is_persisted(range_server: RangeServer, tmp_path):
+    path = tmp_path / 'file.part'
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='test_download')
+
+        async def failing_chunks(*args, **kwargs):
+            yield CONTENT[:5000]
+            raise OSError('connection lost')
+
+        original_store_response = client.store_response
+
+        async def interrupted_store_response(path, url, status, headers, chunks, chunk_size, progress, resume):
+            return await original_store_response(path, url, status, headers, failing_chunks(), chunk_size,
+                                                 progress, resume)
+
+        client.store_response = interrupted_store_response  # type: ignore
+        assert await client.download_file(path, range_server.url, resume=True) is None
+        client.store_response = original_store_response  # type: ignore
+
+        progress = DownloadProgress.load(path)
+        assert progress is not None
+        assert progress.validator == ETAG
+        assert path.stat().st_size == 5000
+
+        info = await client.download_file(path, range_server.url, resume=True)
+        assert info is not None
+        assert range_server.requests == [None, 'bytes=5000-']
+        assert path.read_bytes() == CONTENT
+    finally:
+        await client_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_range_not_satisfiable_discards_progress(range_server: RangeServer, tmp_path):
+    path = tmp_path / 'file.part'
+    make_partial(path, range_server.url, len(CONTENT))
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='test_download')
+        assert await client.download_file(path, range_server.url, resume=True) is None
+        assert DownloadProgress.load(path) is None
+
+        info = await client.download_file(path, range_server.url, resume=True)
+        assert info is not None
+        assert path.read_bytes() == CONTENT
+    finally:
+        await client_pool.close()
@@ -0,0 +1,185 @@
+import json
+from typing import List, Sequence
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from avtdl.core.interfaces import Record
+from avtdl.core.monitors import HttpTaskMonitor, HttpTaskMonitorEntity
+from avtdl.core.runtime import RuntimeContext
+from avtdl.plugins.fc2.fc2 import FC2Monitor, FC2MonitorConfig, FC2MonitorEntity
+from avtdl.plugins.twitcast.twitcast_monitor import TwitcastMonitor, TwitcastMonitorConfig, TwitcastMonitorEntity
+from harness import TestServer
+
+LIVE_USERS = {'3': '790000003', '1000': '790001000'}
+
+
+@pytest_asyncio.fixture
+async def server():
+    server = TestServer()
+    yield server
+    await server.stop()
+
+
+async def poll_all(monitor: HttpTaskMonitor, entities: Sequence[HttpTaskMonitorEntity]) -> List[Record]:
+    records: List[Record] = []
+    for entity in entities:
+        client = monitor._get_client(entity)
+        records.extend(await monitor.get_new_records(entity, client))  # type: ignore
+    return records
+
+
+class TestTwitcast:
+
+    @staticmethod
+    async def register(server: TestServer, live_status: str = '') -> None:
+        async def is_live(request: web.Request) -> web.Response:
+            user_id = request.rel_url.query['u']
+            return web.Response(text=live_status or LIVE_USERS.get(user_id, '0'))
+
+        async def stream_server(request: web.Request) -> web.Response:
+            user_id = request.rel_url.query['target']
+            return web.json_response({'movie': {'id': int(LIVE_USERS[user_id]), 'live': True}})
+
+        server.register_handler('GET', '/userajax.php', is_live)
+        server.register_handler('GET', '/streamserver.php', stream_server)
+        await server.start()
+
+    @staticmethod
+    def prepare_monitor(server: TestServer, monkeypatch, users: Sequence[str]):
+        monkeypatch.setattr(TwitcastMonitor, 'IS_LIVE_URL', server.url + '/userajax.php?c=islive&u={user_id}')
+        monkeypatch.setattr(TwitcastMonitor, 'MOVIE_INFO_URL', server.url + '/streamserver.php?target={user_id}&mode=client')
+        entities = [TwitcastMonitorEntity(name=user, user_id=user) for user in users]
+        monitor = TwitcastMonitor(TwitcastMonitorConfig(name='twitcast'), entities, RuntimeContext.create())
+        return monitor, entities
+
+    @pytest.mark.asyncio
+    async def test_single_request_per_user(self, server, monkeypatch):
+        await self.register(server)
+        monitor, entities = self.prepare_monitor(server, monkeypatch, ['1', '2', '3'])
+        try:
+            records = await poll_all(monitor, entities)
+            records += await poll_all(monitor, entities)
+        finally:
+            await monitor.clients.close()
+        assert [record.get_uid() for record in records] == [LIVE_USERS['3']]
+        assert server.requests[('GET', '/userajax.php')] == 6
+        assert server.requests[('GET', '/streamserver.php')] == 0
+
+    @pytest.mark.asyncio
+    async def test_movie_id_requested_if_unknown(self, server, monkeypatch):
+        await self.register(server, live_status='live')
+        monitor, entities = self.prepare_monitor(server, monkeypatch, ['3'])
+        try:
+            records = await poll_all(monitor, entities)
+        finally:
+            await monitor.clients.close()
+        assert [record.get_uid() for record in records] == [LIVE_USERS['3']]
+        assert server.requests[('GET', '/streamserver.php')] == 1
+
+
+class TestFC2:
+
+    LAST_MODIFIED = 'Wed, 15 Nov 2023 22:13:20 GMT'
+
+    @classmethod
+    async def register(cls, server: TestServer, list_status: int = 200, conditional: bool = False) -> None:
+        async def channel_list(request: web.Request) -> web.Response:
+            if list_status != 200:
+                return web.Response(status=list_status)
+            if not conditional:
+                channels = [{'id': user_id, 'title': 'title'} for user_id in LIVE_USERS]
+                return web.json_response({'channel': channels})
+            if request.headers.get('If-Modified-Since') == cls.LAST_MODIFIED:
+                return web.Response(status=304)
+            channels = [{'id': user_id, 'title': 'title'} for user_id in LIVE_USERS]
+            return web.json_response({'channel': channels}, headers={'Last-Modified': cls.LAST_MODIFIED})
+
+        async def adult_channel_list(request: web.Request) -> web.Response:
+            return web.json_response({'channel': []})
+
+        async def member_api(request: web.Request) -> web.Response:
+            user_id = (await request.post())['streamid']
+            channel_data = {'is_publish': 1 if user_id in LIVE_USERS else 0, 'channelid': user_id,
+                            'start': '1700000000000', 'title': 'title', 'info': 'info',
+                            'image': 'https://example.com/image.jpg', 'login_only': 0}
+            return web.Response(text=json.dumps({'data': {'channel_data': channel_data}}))
+
+        server.register_handler('GET', '/contents/allchannellist.php', channel_list)
+        server.register_handler('GET', '/adult/contents/allchannellist.php', adult_channel_list)
+        server.register_handler('POST', '/api/memberApi.php', member_api)
+        await server.start()
+
+    @staticmethod
+    def prepare_monitor(server: TestServer, monkeypatch, users: Sequence[str], **config):
+        monkeypatch.setattr(FC2Monitor, 'METADATA_URL', server.url + '/api/memberApi.php')
+        monkeypatch.setattr(FC2Monitor, 'CHANNEL_LIST_URLS', [server.url + '/contents/allchannellist.php',
+                                                              server.url + '/adult/contents/allchannellist.php'])
+        entities = [FC2MonitorEntity(name=user, user_id=user) for user in users]
+        monitor = FC2Monitor(FC2MonitorConfig(name='fc2', **config), entities, RuntimeContext.create())
+        return monitor, entities
+
+    @staticmethod
+    def member_requests(server: TestServer) -> int:
+        return server.requests[('POST', '/api/memberApi.php')]
+
+    @staticmethod
+    def list_requests(server: TestServer) -> int:
+        return server.requests[('GET', '/contents/allchannellist.php')] + server.requests[('GET', '/adult/contents/allchannellist.php')]
+
+    @pytest.mark.asyncio
+    async def test_details_requested_for_live_users_only(self, server, monkeypatch):
+        await self.register(server)
+        monitor, entities = self.prepare_monitor(server, monkeypatch, [str(i) for i in range(20)])
+        try:
+            records = await poll_all(monitor, entities)
+            records += await poll_all(monitor, entities)
+        finally:
+            await monitor.clients.close()
+        assert [record.user_id for record in records] == ['3']  # type: ignore
+        assert self.list_requests(server) == 2
+        assert self.member_requests(server) == 2
+
+    @pytest.mark.asyncio
+    async def test_unchanged_list_reused(self, server, monkeypatch):
+        await self.register(server, conditional=True)
+        monitor, entities = self.prepare_monitor(server, monkeypatch, [str(i) for i in range(20)])
+        try:
+            records = await poll_all(monitor, entities)
+            monitor.live_channels_updated = float('-inf')
+            entities[3].latest_live_start = ''
+            records += await poll_all(monitor, entities)
+        finally:
+            await monitor.clients.close()
+        assert [record.user_id for record in records] == ['3', '3']  # type: ignore
+        assert monitor.live_channels == set(LIVE_USERS)
+        assert self.list_requests(server) == 4
+        assert self.member_requests(server) == 2
+        assert all(entity.update_interval == entity.base_update_interval for entity in entities)
+
+    @pytest.mark.asyncio
+    async def test_fallback_on_list_failure(self, server, monkeypatch):
+        await self.register(server, list_status=500)
+        monitor, entities = self.prepare_monitor(server, monkeypatch, [str(i) for i in range(5)])
+        try:
+            records = await poll_all(monitor, entities)
+        finally:
+            await monitor.clients.close()
+        assert [record.user_id for record in records] == ['3']  # type: ignore
+        assert self.list_requests(server) == 1
+        assert self.member_requests(server) == 5
+        assert all(entity.update_interval == entity.base_update_interval for entity in entities)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('users, config', [(['1', '3'], {}), (['1', '2', '3'], {'use_channel_list': False})])
+    async def test_list_not_used(self, server, monkeypatch, users, config):
+        await self.register(server)
+        monitor, entities = self.prepare_monitor(server, monkeypatch, users, **config)
+        try:
+            records = await poll_all(monitor, entities)
+        finally:
+            await monitor.clients.close()
+        assert [record.user_id for record in records] == ['3']  # type: ignore
+        assert self.list_requests(server) == 0
+        assert self.member_requests(server) == len(users)
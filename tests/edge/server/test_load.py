@@ -0,0 +1,45 @@
+import pytest
+
+from avtdl.plugins.twitch.twitch import GQL
+from load import KINDS, LoadOptions, MockServices, Schedule, make_config, run_load, split_entities
+
+
+class TestSchedule:
+
+    def test_entries_spread_over_interval(self):
+        schedule = Schedule(feeds=4, interval=10, start=1000)
+        assert [schedule.published_at(index, 0) for index in range(4)] == [1000, 1002.5, 1005, 1007.5]
+        assert schedule.latest(1, 1002.5) == 0
+        assert schedule.latest(1, 1002.4) == -1
+        assert schedule.published_between(1000, 1020) == 8
+
+
+def test_config_assigns_every_entity_to_a_chain(tmp_path):
+    counts = split_entities(10, KINDS)
+    assert counts == {'rss': 4, 'youtube': 3, 'twitch': 3}
+    services = MockServices({})
+    services.start()
+    try:
+        config = make_config(services, counts, 5, 60, tmp_path)
+    finally:
+        services.stop()
+    chains = config['chains']
+    assert len(chains) == 5
+    for plugin, count in [('generic_rss', 4), ('channel', 3), ('twitch', 3)]:
+        names = [name for chain in chains.values() for name in chain[0].get(plugin, [])]
+        assert sorted(names) == sorted(entity['name'] for entity in config['actors'][plugin]['entities'])
+        assert len(names) == count
+
+
+@pytest.mark.asyncio
+async def test_records_delivered():
+    options = LoadOptions(entities=6, chains=3, duration=4, update_interval=0.25, publish_interval=0.25)
+    report = await run_load(options)
+
+    assert GQL.URL == 'https://gql.twitch.tv/gql'
+    assert report.entities == {'rss': 2, 'youtube': 2, 'twitch': 2}
+    assert all(count > 0 for count in report.requests.values())
+    assert report.delivered > 0
+    assert report.duplicates == 0
+    assert report.delivered <= report.published
+    assert 0 < report.latency['p50'] <= report.latency['max']
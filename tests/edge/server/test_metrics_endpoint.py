@@ -0,0 +1,115 @@
+import logging
+import re
+from typing import Dict
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from avtdl.core.actions import QueueAction, QueueActionConfig, QueueActionEntity
+from avtdl.core.config import SettingsSection
+from avtdl.core.db import RecordDB
+from avtdl.core.interfaces import TextRecord
+from avtdl.core.request import HttpClient, HttpRateLimit
+from avtdl.core.runtime import RuntimeContext, TaskStatus
+from avtdl.core.webui import WebUI
+from avtdl.plugins.twitcast.twitcast_monitor import TwitcastMonitor, TwitcastMonitorConfig, TwitcastMonitorEntity
+from harness import TestServer
+
+SAMPLE = re.compile(r'^(?P<name>[a-z_]+)(?P<labels>\{.*\})? (?P<value>\S+)$')
+
+
+class NoopQueueAction(QueueAction):
+
+    async def handle_single_record(self, logger: logging.Logger, client: HttpClient,
+                                   entity: QueueActionEntity, record) -> None:
+        pass
+
+
+@pytest_asyncio.fixture
+async def server():
+    server = TestServer()
+
+    async def is_live(request: web.Request) -> web.Response:
+        return web.Response(text='790000003')
+
+    server.register_handler('GET', '/userajax.php', is_live)
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+def ctx(tmp_path) -> RuntimeContext:
+    ctx = RuntimeContext.create()
+    settings = SettingsSection(cache_directory=tmp_path / 'cache', state_directory=tmp_path / 'state')
+    ctx.set_extra('settings', settings)
+    return ctx
+
+
+async def scrape(ctx: RuntimeContext, tmp_path) -> Dict[str, float]:
+    """start web interface on a random port, request /metrics and return values of all samples"""
+    settings: SettingsSection = ctx.get_extra('settings')  # type: ignore
+    webui = WebUI(tmp_path / 'config.yml', {}, ctx, settings, {}, {})
+    app = web.Application()
+    app.add_routes(webui.routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+                assert response.status == 200
+                assert response.content_type == 'text/plain'
+                text = await response.text()
+    finally:
+        await runner.cleanup()
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        match = SAMPLE.match(line)
+        assert match is not None, f'malformed line "{line}"'
+        samples[match['name'] + (match['labels'] or '')] = float(match['value'])
+    return samples
+
+
+def delta(before: Dict[str, float], after: Dict[str, float], sample: str) -> float:
+    return after.get(sample, 0) - before.get(sample, 0)
+
+
+@pytest.mark.asyncio
+async def test_scrape_metrics(server, ctx, tmp_path, monkeypatch):
+    before = await scrape(ctx, tmp_path)
+
+    monkeypatch.setattr(TwitcastMonitor, 'IS_LIVE_URL', server.url + '/userajax.php?c=islive&u={user_id}')
+    entity = TwitcastMonitorEntity(name='user', user_id='user')
+    monitor = TwitcastMonitor(TwitcastMonitorConfig(name='metrics_twitcast'), [entity], ctx)
+    try:
+        await monitor.run_once(entity, monitor._get_client(entity), TaskStatus(None, None))
+    finally:
+        await monitor.clients.close()
+
+    async with HttpRateLimit('metrics_rate_limit'):
+        pass
+
+    action = NoopQueueAction(QueueActionConfig(name='metrics_queue'), [QueueActionEntity(name='queue')], ctx)
+    for i in range(3):
+        action.handle(action.entities['queue'], TextRecord(text=f'{i}'))
+
+    db = RecordDB(':memory:')
+    db.store_records([TextRecord(text='record')], 'feed')
+
+    after = await scrape(ctx, tmp_path)
+
+    assert delta(before, after, 'avtdl_monitor_records_total{actor="metrics_twitcast",entity="user"}') == 1
+    assert delta(before, after, 'avtdl_bus_published_total{topic="output/metrics_twitcast/user/"}') == 1
+    assert delta(before, after, 'avtdl_http_requests_total{host="127.0.0.1",status="200"}') == 1
+    assert delta(before, after, 'avtdl_http_request_duration_seconds_count{host="127.0.0.1"}') == 1
+    assert delta(before, after, 'avtdl_http_request_duration_seconds_bucket{host="127.0.0.1",le="+Inf"}') == 1
+    assert delta(before, after, 'avtdl_rate_limit_wait_seconds_count{name="metrics_rate_limit"}') == 1
+    assert after['avtdl_queue_depth{actor="metrics_queue",entity="queue"}'] == 3
+    assert delta(before, after, 'avtdl_sqlite_query_duration_seconds_count{query="store"}') == 1
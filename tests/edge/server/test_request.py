@@ -1,6 +1,9 @@
+import asyncio
+import time
+
 import pytest
 
-from avtdl.core.request import ClientPool, Transport
+from avtdl.core.request import ClientPool, RetrySettings, Transport
 from harness import ServerConfig, TestServer
 from test_harness import server_cfg, server_instance
 
@@ -156,3 +159,133 @@ async def test_download(server_instance: TestServer, server_cfg: ServerConfig, t
                 assert download_path.read_bytes() == payload.body
     finally:
         await client_pool.close()
+
+
+shared_session_config = [
+    {
+        "method": "GET",
+        "path": "/shared",
+        "payloads": [
+            {
+                "body": "ok",
+            }
+        ]
+    },
+]
+
+
+@pytest.mark.parametrize("server_cfg", [shared_session_config], indirect=True)
+@pytest.mark.parametrize("transport", [Transport.AIOHTTP, Transport.CURL_CFFI])
+@pytest.mark.asyncio
+async def test_clients_share_connections(server_instance: TestServer, server_cfg: ServerConfig, transport: Transport):
+    client_pool = ClientPool()
+    try:
+        clients = [client_pool.get_client(name=f'entity{i}', headers={'X-Entity': str(i)}, transport=transport)
+                   for i in range(5)]
+        assert len(client_pool.sessions) == 1
+        for client in clients:
+            response = await client.request_once(server_instance.url + '/shared')
+            assert response.ok
+            request_headers = {k.lower(): v for k, v in response.request_headers.items()}
+            assert request_headers['x-entity'] == client.headers['X-Entity']
+        assert client_pool.stats.opened == 1
+        assert client_pool.stats.reused == len(clients) - 1
+    finally:
+        await client_pool.close()
+
+
+def unavailable_config(retry_after: str = '') -> list:
+    headers = {'Retry-After': retry_after} if retry_after else {}
+    return [
+        {
+            "method": "GET",
+            "path": "/flaky",
+            "payloads": [
+                {"status": 503, "headers": headers},
+                {"status": 503, "headers": headers},
+                {"body": "ok"},
+            ]
+        },
+    ]
+
+
+def served_requests(server: TestServer) -> int:
+    """number of payloads consumed from the three-element queue of unavailable_config()"""
+    return 3 - len(server.get_payload_queue('GET', '/flaky'))
+
+
+@pytest.mark.parametrize("server_cfg", [unavailable_config()], indirect=True)
+@pytest.mark.parametrize("transport", [Transport.AIOHTTP, Transport.CURL_CFFI])
+@pytest.mark.asyncio
+async def test_retry_until_success(server_instance: TestServer, server_cfg: ServerConfig, transport: Transport):
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='test_retry', transport=transport)
+        settings = RetrySettings(retry_times=3, retry_delay=0.05, retry_multiplier=2)
+        response = await client.request(server_instance.url + '/flaky', settings=settings)
+        assert response.ok
+        assert response.text == 'ok'
+    finally:
+        await client_pool.close()
+
+
+@pytest.mark.parametrize("server_cfg", [unavailable_config()], indirect=True)
+@pytest.mark.asyncio
+async def test_retry_gives_up(server_instance: TestServer, server_cfg: ServerConfig):
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='test_retry')
+        settings = RetrySettings(retry_times=1, retry_delay=0.05)
+        response = await client.request(server_instance.url + '/flaky', settings=settings)
+        assert response.status == 503
+        assert served_requests(server_instance) == 2
+    finally:
+        await client_pool.close()
+
+
+@pytest.mark.parametrize("server_cfg", [unavailable_config(retry_after='1')], indirect=True)
+@pytest.mark.asyncio
+async def test_retry_honors_retry_after(server_instance: TestServer, server_cfg: ServerConfig):
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='test_retry')
+        settings = RetrySettings(retry_times=1, retry_delay=0.01)
+        started = time.monotonic()
+        response = await client.request(server_instance.url + '/flaky', settings=settings)
+        assert time.monotonic() - started >= 1
+        assert response.status == 503
+    finally:
+        await client_pool.close()
+
+
+@pytest.mark.parametrize("server_cfg", [unavailable_config(retry_after='3600')], indirect=True)
+@pytest.mark.asyncio
+async def test_retry_after_too_long(server_instance: TestServer, server_cfg: ServerConfig):
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='test_retry')
+        settings = RetrySettings(retry_times=3, retry_delay=0.01)
+        response = await client.request(server_instance.url + '/flaky', settings=settings)
+        assert response.status == 503
+        assert served_requests(server_instance) == 1
+    finally:
+        await client_pool.close()
+
+
+@pytest.mark.parametrize("server_cfg", [unavailable_config()], indirect=True)
+@pytest.mark.asyncio
+async def test_retry_wait_is_cancellable(server_instance: TestServer, server_cfg: ServerConfig):
+    client_pool = ClientPool()
+    try:
+        client = client_pool.get_client(name='test_retry')
+        settings = RetrySettings(retry_times=3, retry_delay=600)
+        task = asyncio.create_task(client.request(server_instance.url + '/flaky', settings=settings))
+        while served_requests(server_instance) == 0:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, timeout=1)
+        assert served_requests(server_instance) == 1
+    finally:
+        await client_pool.close()
@@ -0,0 +1,94 @@
+from typing import List, Tuple
+
+import pytest
+
+from avtdl.core.interfaces import Record, TextRecord
+from avtdl.core.runtime import MessageBus
+
+
+class Collector:
+
+    def __init__(self) -> None:
+        self.received: List[Tuple[str, Record]] = []
+
+    def __call__(self, topic: str, record: Record) -> None:
+        self.received.append((topic, record))
+
+
+@pytest.fixture
+def bus() -> MessageBus:
+    return MessageBus()
+
+
+class TestRouting:
+    testcases = {
+        # published chain, subscribed chains, expected receiving chains
+        'no chain to all chains': ('', ['chain1', 'chain2'], ['chain1', 'chain2']),
+        'chain to matching chain only': ('chain1', ['chain1', 'chain2'], ['chain1']),
+        'chain to generic subscription': ('chain1', [''], ['']),
+        'chain without subscribers': ('chain3', ['chain1', 'chain2'], []),
+    }
+
+    @pytest.mark.parametrize('published, subscribed, expected', testcases.values(), ids=testcases.keys())
+    def test_routing(self, bus: MessageBus, published: str, subscribed: List[str], expected: List[str]):
+        collector = Collector()
+        for chain in subscribed:
+            bus.sub(bus.incoming_topic_for('actor', 'entity', chain), collector)
+        bus.sub(bus.incoming_topic_for('actor', 'other_entity', published), collector)
+        bus.sub(bus.outgoing_topic_for('actor', 'entity', published), collector)
+
+        bus.pub(bus.incoming_topic_for('actor', 'entity', published), TextRecord(text='test', chain=published))
+
+        expected_topics = [bus.incoming_topic_for('actor', 'entity', chain) for chain in expected]
+        assert [topic for topic, _ in collector.received] == expected_topics
+
+    def test_record_gets_chain_of_subscription(self, bus: MessageBus):
+        collector = Collector()
+        bus.sub(bus.incoming_topic_for('actor', 'entity', 'chain1'), collector)
+        bus.sub(bus.incoming_topic_for('actor', 'entity', 'chain2'), collector)
+
+        record = TextRecord(text='test')
+        bus.pub(bus.incoming_topic_for('actor', 'entity'), record)
+
+        assert [received.chain for _, received in collector.received] == ['chain1', 'chain2']
+        assert record.chain == ''
+
+    def test_subscription_after_publishing(self, bus: MessageBus):
+        first, second = Collector(), Collector()
+        topic = bus.incoming_topic_for('actor', 'entity', 'chain1')
+        bus.sub(topic, first)
+        bus.pub(topic, TextRecord(text='first'))
+        bus.sub(topic, second)
+        bus.pub(topic, TextRecord(text='second'))
+
+        assert [str(record) for _, record in first.received] == ['first', 'second']
+        assert [str(record) for _, record in second.received] == ['second']
+
+    def test_history_without_subscribers(self, bus: MessageBus):
+        record = TextRecord(text='test')
+        bus.pub(bus.outgoing_topic_for('actor', 'entity', 'chain1'), record)
+
+        assert bus.get_history('actor', 'entity', direction='out') == [record]
+
+
+class TestFanOut:
+
+    def test_evolve_keeps_original(self):
+        record = TextRecord(text='test', chain='chain1')
+        evolved = record.evolve(chain='chain2')
+
+        assert evolved.chain == 'chain2'
+        assert record.chain == 'chain1'
+        assert evolved.text == record.text
+
+    def test_chains_receive_separate_snapshots(self, bus: MessageBus):
+        collector = Collector()
+        for chain in ['chain1', 'chain2', 'chain3']:
+            bus.sub(bus.incoming_topic_for('actor', 'entity', chain), collector)
+
+        record = TextRecord(text='test')
+        bus.pub(bus.incoming_topic_for('actor', 'entity'), record)
+
+        received = [received for _, received in collector.received]
+        assert len({id(snapshot) for snapshot in received}) == 3
+        assert all(snapshot.text is record.text for snapshot in received)
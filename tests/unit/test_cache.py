@@ -1,9 +1,12 @@
+import asyncio
+import os
+import time
 from pathlib import Path
 from typing import List, Optional
 
 import pytest
 
-from avtdl.core.cache import FileCache, find_file, find_free_suffix, find_with_suffix, strip_rename_suffix
+from avtdl.core.cache import CacheIndex, CacheJanitor, CacheUsage, FileCache, find_file, find_free_suffix, find_with_suffix, strip_rename_suffix
 
 SUFFIX_TEMPLATE = FileCache.RENAME_SUFFIX
 
@@ -125,3 +128,131 @@ class TestFileCacheFindFile:
 
         result = file_cache(tmp_path)._find_file(tmp_path / self.QUERY, self.URL)
         assert result == expected
+
+
+class TestCacheIndex:
+
+    @staticmethod
+    def index() -> CacheIndex:
+        return CacheIndex(SUFFIX_TEMPLATE, '.part')
+
+    def test_same_order_as_find_with_suffix(self, tmp_path):
+        prepare_files(tmp_path, ['file1 [3].jpg', 'file1 [1].jpg', 'file1.jpg', 'file2.jpg'])
+
+        files = self.index().lookup(tmp_path / 'file1')
+        assert [item.path for item in files] == find_with_suffix(tmp_path / 'file1', SUFFIX_TEMPLATE)
+
+    def test_partial_files_ignored(self, tmp_path):
+        prepare_files(tmp_path, ['file1.part'])
+
+        assert self.index().lookup(tmp_path / 'file1') == []
+
+    def test_hit_does_not_scan(self, tmp_path, monkeypatch):
+        prepare_files(tmp_path, ['file1.jpg', 'file2.jpg'])
+        index = self.index()
+        index.lookup(tmp_path / 'file1')
+
+        def fail(*args):
+            assert False, 'directory should not be accessed'
+
+        monkeypatch.setattr(Path, 'iterdir', fail)
+        monkeypatch.setattr(Path, 'stat', fail)
+        [item] = index.lookup(tmp_path / 'file2')
+        assert item.path == tmp_path / 'file2.jpg'
+
+    def test_external_changes_picked_up_on_miss(self, tmp_path):
+        index = self.index()
+        assert index.lookup(tmp_path / 'file1') == []
+        touch(tmp_path, 'file1.jpg')
+
+        [item] = index.lookup(tmp_path / 'file1')
+        assert item.path == tmp_path / 'file1.jpg'
+        assert item.size == 0
+
+    def test_add_and_forget(self, tmp_path):
+        index = self.index()
+        index.lookup(tmp_path / 'file1')
+        file = touch(tmp_path, 'file1.jpg')
+        index.add(file)
+        assert [item.path for item in index.lookup(tmp_path / 'file1')] == [file]
+
+        file.unlink()
+        index.forget(file)
+        assert index.lookup(tmp_path / 'file1') == []
+
+
+def write_file(path: Path, size: int, accessed: float) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'0' * size)
+    os.utime(path, (accessed, accessed))
+    return path
+
+
+class TestCacheJanitor:
+
+    @pytest.mark.asyncio
+    async def test_size_limit_evicts_least_recently_used(self, tmp_path):
+        now = time.time()
+        oldest = write_file(tmp_path / 'a' / 'oldest.jpg', 100, now - 300)
+        old = write_file(tmp_path / 'b' / 'old.jpg', 100, now - 200)
+        recent = write_file(tmp_path / 'a' / 'recent.jpg', 100, now - 100)
+
+        janitor = CacheJanitor(tmp_path, max_size=250, max_age=None)
+        await janitor.cleanup()
+
+        assert not oldest.exists()
+        assert old.exists() and recent.exists()
+        assert janitor.usage.bytes_used == 200
+        assert janitor.usage.evictions == 1
+
+    @pytest.mark.asyncio
+    async def test_retrieved_file_is_recently_used(self, tmp_path):
+        now = time.time()
+        oldest = write_file(tmp_path / 'oldest.jpg', 100, now - 300)
+        old = write_file(tmp_path / 'old.jpg', 100, now - 200)
+        cache = FileCache(tmp_path, '.part')
+        cache.usage.hit(oldest)
+
+        await CacheJanitor(tmp_path, max_size=150, max_age=None).cleanup()
+
+        assert oldest.exists()
+        assert not old.exists()
+
+    @pytest.mark.asyncio
+    async def test_age_limit(self, tmp_path):
+        now = time.time()
+        expired = write_file(tmp_path / 'expired.jpg', 100, now - 7200)
+        fresh = write_file(tmp_path / 'fresh.jpg', 100, now - 60)
+
+        await CacheJanitor(tmp_path, max_size=None, max_age=1).cleanup()
+
+        assert not expired.exists()
+        assert fresh.exists()
+
+    @pytest.mark.asyncio
+    async def test_evicted_file_removed_from_index(self, tmp_path):
+        file = write_file(tmp_path / 'file1.jpg', 100, time.time() - 7200)
+        cache = FileCache(tmp_path, '.part')
+        assert cache._find_file(tmp_path / 'file1', 'http://example.com/file1.jpg') == file
+
+        await CacheJanitor(tmp_path, max_size=None, max_age=1).cleanup()
+
+        assert cache._find_file(tmp_path / 'file1', 'http://example.com/file1.jpg') is None
+
+    @pytest.mark.asyncio
+    async def test_no_limits_no_scan(self, tmp_path, monkeypatch):
+        janitor = CacheJanitor(tmp_path, max_size=None, max_age=None)
+        scanned = []
+        monkeypatch.setattr(janitor, '_scan', lambda directory: scanned.append(directory) or ([], []))
+
+        await asyncio.wait_for(janitor.run(), 1)
+
+        assert scanned == []
+
+    def test_hit_ratio(self, tmp_path):
+        usage = CacheUsage.for_directory(tmp_path)
+        assert usage.hit_ratio is None
+        usage.hit(tmp_path / 'file')
+        usage.miss()
+        assert usage.hit_ratio == 0.5
+        assert FileCache(tmp_path, '.part').usage is usage
@@ -0,0 +1,94 @@
+import hashlib
+import os
+
+import pytest
+
+from avtdl.plugins.file.content_index import ContentIndex
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def index():
+    index = ContentIndex(':memory:', ignore_suffixes=['.part'])
+    yield index
+    index.close()
+
+
+class TestContentIndex:
+
+    def test_existing_file_found(self, index, tmp_path):
+        (tmp_path / 'image.jpg').write_bytes(b'content')
+        (tmp_path / 'other.jpg').write_bytes(b'content')
+
+        found = index.find_duplicate(tmp_path, 'image', len(b'content'), sha256(b'content'))
+
+        assert found == tmp_path / 'image.jpg'
+
+    def test_different_content_not_found(self, index, tmp_path):
+        (tmp_path / 'image.jpg').write_bytes(b'content')
+
+        assert index.find_duplicate(tmp_path, 'image', len(b'CONTENT'), sha256(b'CONTENT')) is None
+
+    def test_added_file_found(self, index, tmp_path):
+        index.scan(tmp_path)
+        file = tmp_path / 'image [1].jpg'
+        file.write_bytes(b'content')
+        index.add(file, sha256(b'content'))
+
+        assert index.find_duplicate(tmp_path, 'image', len(b'content'), sha256(b'content')) == file
+
+    def test_file_added_externally_found(self, index, tmp_path):
+        (tmp_path / 'other.jpg').write_bytes(b'other')
+        assert index.find_duplicate(tmp_path, 'image', len(b'content'), sha256(b'content')) is None
+        (tmp_path / 'image [1].jpg').write_bytes(b'content')
+        stat = tmp_path.stat()
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        found = index.find_duplicate(tmp_path, 'image', len(b'content'), sha256(b'content'))
+
+        assert found == tmp_path / 'image [1].jpg'
+
+    def test_partial_files_ignored(self, index, tmp_path):
+        (tmp_path / 'image.part').write_bytes(b'content')
+
+        assert index.find_duplicate(tmp_path, 'image', len(b'content'), sha256(b'content')) is None
+
+    def test_removed_file_forgotten(self, index, tmp_path):
+        file = tmp_path / 'image.jpg'
+        file.write_bytes(b'content')
+        index.add(file)
+        file.unlink()
+
+        assert index.find_duplicate(tmp_path, 'image', len(b'content'), sha256(b'content')) is None
+        assert index.db.execute('SELECT COUNT(*) FROM files').fetchone()[0] == 0
+
+    def test_modified_file_rehashed(self, index, tmp_path):
+        file = tmp_path / 'image.jpg'
+        file.write_bytes(b'content')
+        index.add(file)
+        file.write_bytes(b'CONTENT')
+        stat = file.stat()
+        os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        assert index.find_duplicate(tmp_path, 'image', len(b'content'), sha256(b'content')) is None
+        assert index.find_duplicate(tmp_path, 'image', len(b'CONTENT'), sha256(b'CONTENT')) == file
+
+    def test_index_persisted(self, tmp_path):
+        db_path = tmp_path / 'index.sqlite'
+        directory = tmp_path / 'downloads'
+        directory.mkdir()
+        file = directory / 'image.jpg'
+        file.write_bytes(b'content')
+
+        index = ContentIndex(db_path)
+        index.add(file, 'stored hash')
+        index.close()
+
+        index = ContentIndex(db_path)
+        try:
+            assert index.find_duplicate(directory, 'image', len(b'content'), 'stored hash') == file
+        finally:
+            index.close()
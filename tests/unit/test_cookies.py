@@ -3,7 +3,8 @@ import http.cookies
 
 import pytest
 
-from avtdl.core.cookies import AnotherAiohttpCookieJar, AnotherCurlCffiCookieJar
+from avtdl.core.cookies import AnotherAiohttpCookieJar, AnotherCurlCffiCookieJar, cookies_files, load_cookies, \
+    read_cookies
 
 
 @pytest.fixture(params=[AnotherAiohttpCookieJar, AnotherCurlCffiCookieJar])
@@ -121,3 +122,29 @@ async def test_mutating_extracted_cookiejar_reflects_on_original(jar_class):
 
     assert original.get('copy') == 'copy_value'
     assert copy.get('original') == 'original_value'
+
+
+def test_loaded_cookies_cached(tmp_path, monkeypatch):
+    path = tmp_path / 'cookies.txt'
+    file_jar = cookiejar.MozillaCookieJar()
+    file_jar.set_cookie(sample_cookie(name='alpha', value='A'))
+    file_jar.save(str(path), ignore_discard=True, ignore_expires=True)
+
+    reads = []
+    monkeypatch.setattr(cookies_files, 'parse', lambda p: reads.append(p) or read_cookies(p))
+    cookies_files.clear()
+
+    first = load_cookies(path)
+    second = load_cookies(path)
+    assert first is not None and second is not None
+    assert first is not second
+    assert [cookie.value for cookie in second] == ['A']
+    assert len(reads) == 1
+
+    first.clear()
+    assert [cookie.value for cookie in load_cookies(path) or []] == ['A']
+
+    file_jar.set_cookie(sample_cookie(name='beta', value='B'))
+    file_jar.save(str(path), ignore_discard=True, ignore_expires=True)
+    assert sorted(cookie.value for cookie in load_cookies(path) or []) == ['A', 'B']
+    assert len(reads) == 2
@@ -0,0 +1,85 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from avtdl.core.db import AsyncRecordDB, RecordDB, RecordState
+from avtdl.core.interfaces import TextRecord
+
+
+def stored_rows(path) -> int:
+    """count rows visible to a separate connection"""
+    db = sqlite3.connect(path)
+    try:
+        return db.execute('SELECT COUNT(1) FROM records').fetchone()[0]
+    finally:
+        db.close()
+
+
+def test_wal_enabled(tmp_path):
+    db = RecordDB(tmp_path / 'test.sqlite')
+    mode = db.db.execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode == 'wal'
+
+
+def test_store_commits_immediately(tmp_path):
+    path = tmp_path / 'test.sqlite'
+    db = RecordDB(path)
+    db.store_records([TextRecord(text='test')], 'entity')
+    assert stored_rows(path) == 1
+
+
+@pytest.mark.asyncio
+async def test_deferred_commit(tmp_path):
+    path = tmp_path / 'test.sqlite'
+    db = RecordDB(path)
+    async_db = AsyncRecordDB(db, commit_interval=0.1)
+    task = asyncio.create_task(async_db.run())
+    await asyncio.sleep(0)
+
+    record = TextRecord(text='test')
+    await async_db.call(db.store_records, [record], 'entity')
+    assert await async_db.call(db.record_exists, record, 'entity')
+    assert stored_rows(path) == 0
+
+    await asyncio.sleep(0.3)
+    assert stored_rows(path) == 1
+
+    await async_db.call(db.store_records, [TextRecord(text='test2')], 'entity')
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert stored_rows(path) == 2
+
+
+class UidTextRecord(TextRecord):
+    uid: str
+
+    def get_uid(self) -> str:
+        return self.uid
+
+
+def test_classify_records():
+    db = RecordDB(':memory:')
+    db.store_records([UidTextRecord(uid='1', text='old'), UidTextRecord(uid='2', text='old')], 'entity')
+    db.store_records([UidTextRecord(uid='3', text='old')], 'other_entity')
+    fetched = [
+        UidTextRecord(uid='1', text='old'),
+        UidTextRecord(uid='2', text='new'),
+        UidTextRecord(uid='3', text='old'),
+    ]
+
+    states = db.classify_records(fetched, 'entity')
+
+    assert states == [RecordState.UNCHANGED, RecordState.UPDATED, RecordState.NEW]
+    for record, state in zip(fetched, states):
+        assert db.record_exists(record, 'entity') == (state != RecordState.NEW)
+        assert db.record_got_updated(record, 'entity') == (state == RecordState.UPDATED)
+
+
+def test_classify_many_records():
+    db = RecordDB(':memory:')
+    records = [UidTextRecord(uid=str(i), text='old') for i in range(RecordDB.MAX_QUERY_PARAMETERS * 2 + 1)]
+    db.store_records(records, 'entity')
+
+    assert set(db.classify_records(records, 'entity')) == {RecordState.UNCHANGED}
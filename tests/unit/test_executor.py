@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+
+from avtdl.core.executor import ExecutorKind, ParseExecutor, configure_parse_executor, get_parse_executor, run_parser
+from avtdl.plugins.rss.generic_rss import parse_feed
+
+FEED = '''<?xml version="1.0"?>
+<rss version="2.0"><channel><title>test</title>
+<item><guid>1</guid><title>first</title><link>/posts/1</link><pubDate>Mon, 06 Sep 2021 16:45:00 +0000</pubDate></item>
+</channel></rss>'''
+
+
+@pytest.fixture(params=[ExecutorKind.THREAD, ExecutorKind.PROCESS])
+def executor(request):
+    executor = ParseExecutor(request.param, workers=1)
+    yield executor
+    executor.shutdown()
+
+
+class TestParseExecutor:
+
+    @pytest.mark.asyncio
+    async def test_run(self, executor):
+        assert await executor.run(json.loads, '{"a": [1, 2]}') == {'a': [1, 2]}
+
+    @pytest.mark.asyncio
+    async def test_exception_propagated(self, executor):
+        with pytest.raises(json.JSONDecodeError):
+            await executor.run(json.loads, '{')
+
+    @pytest.mark.asyncio
+    async def test_parse_feed(self, executor):
+        feed = await executor.run(parse_feed, FEED, {'content-location': 'https://example.com/feed'})
+        [entry] = feed['entries']
+        assert entry['link'] == 'https://example.com/posts/1'
+
+    @pytest.mark.asyncio
+    async def test_bounded(self):
+        executor = ParseExecutor(ExecutorKind.THREAD, workers=2)
+        try:
+            results = await asyncio.gather(*[executor.run(sum, [i, i]) for i in range(10)])
+            assert results == [2 * i for i in range(10)]
+            assert len(executor.executor._threads) == 2
+        finally:
+            executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_configure_replaces_shared_executor():
+    previous = get_parse_executor()
+    try:
+        configure_parse_executor(ExecutorKind.THREAD, 3)
+        assert get_parse_executor() is not previous
+        assert get_parse_executor().workers == 3
+        assert await run_parser(json.loads, '[]') == []
+    finally:
+        configure_parse_executor(previous.kind, previous.workers)
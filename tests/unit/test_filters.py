@@ -1,12 +1,16 @@
+import asyncio
 import datetime
-from typing import List, Tuple
+import json
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
 
 import pytest
 
 from avtdl.core.interfaces import Event, EventType, OpaqueRecord, TextRecord
 from avtdl.core.runtime import RuntimeContext
-from avtdl.plugins.filters.filters import EmptyFilterConfig, EmptyFilterEntity, EventCauseFilter, MatchFilter, \
-    MatchFilterEntity
+from avtdl.plugins.filters.filters import DeduplicateFilter, DeduplicateFilterConfig, DeduplicateFilterEntity, \
+    EmptyFilterConfig, EmptyFilterEntity, EventCauseFilter, MatchFilter, MatchFilterEntity
 from avtdl.plugins.filters.format import FormatEventFilter, FormatEventFilterEntity, FormatOpaqueFilter, \
     FormatOpaqueFilterEntity
 from avtdl.plugins.twitch.twitch import TwitchRecord
@@ -110,3 +114,82 @@ class TestFormatOpaque:
 
         assert getattr(result, 'field1') == 'field1: test'
         assert getattr(result, 'field2') == 'field2: test'
+
+
+class TestDeduplicate:
+
+    @staticmethod
+    def prepare_filter(history_dir: Optional[Path], **entity_fields) -> Tuple[DeduplicateFilter, DeduplicateFilterEntity]:
+        config = DeduplicateFilterConfig(name='test', history_dir=history_dir, commit_interval=0.01)
+        entity = DeduplicateFilterEntity(name='test', field='text', **entity_fields)
+        ctx = RuntimeContext.create()
+        return DeduplicateFilter(config, [entity], ctx), entity
+
+    @staticmethod
+    async def run_filter(dedupe: DeduplicateFilter, *texts: str, duration: float = 0.05) -> List[str]:
+        """start filter, feed it records with given texts while it is running, return texts let through"""
+        task = asyncio.create_task(dedupe.run())
+        await asyncio.sleep(duration)
+        entity = next(iter(dedupe.entities.values()))
+        passed = [text for text in texts if dedupe.match(entity, TextRecord(text=text)) is not None]
+        await asyncio.sleep(duration)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return passed
+
+    def test_drops_seen(self):
+        dedupe, entity = self.prepare_filter(None)
+        passed = [text for text in ['a', 'b', 'a', 'c', 'b'] if dedupe.match(entity, TextRecord(text=text))]
+        assert passed == ['a', 'b', 'c']
+
+    def test_size_limit(self):
+        dedupe, entity = self.prepare_filter(None, history_size=2)
+        passed = [text for text in ['a', 'b', 'c', 'a', 'c'] if dedupe.match(entity, TextRecord(text=text))]
+        assert passed == ['a', 'b', 'c', 'a']
+        assert list(entity.history) == ['c', 'a']
+
+    def test_ttl(self, monkeypatch):
+        dedupe, entity = self.prepare_filter(None, history_ttl=1)
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now)
+        assert dedupe.match(entity, TextRecord(text='a')) is not None
+        assert dedupe.match(entity, TextRecord(text='a')) is None
+        monkeypatch.setattr(time, 'time', lambda: now + 3601)
+        assert dedupe.match(entity, TextRecord(text='a')) is not None
+
+    @pytest.mark.asyncio
+    async def test_history_restored(self, tmp_path):
+        dedupe, _ = self.prepare_filter(tmp_path)
+        assert await self.run_filter(dedupe, 'a', 'b') == ['a', 'b']
+
+        dedupe, _ = self.prepare_filter(tmp_path)
+        assert await self.run_filter(dedupe, 'a', 'b', 'c') == ['c']
+
+    @pytest.mark.asyncio
+    async def test_history_written_before_shutdown(self, tmp_path):
+        dedupe, entity = self.prepare_filter(tmp_path)
+        task = asyncio.create_task(dedupe.run())
+        await asyncio.sleep(0.05)
+        dedupe.match(entity, TextRecord(text='a'))
+        await asyncio.sleep(0.05)
+        assert dedupe.store is not None
+        assert dedupe.store.size('test') == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_stored_history_trimmed(self, tmp_path):
+        dedupe, _ = self.prepare_filter(tmp_path, history_size=3)
+        assert await self.run_filter(dedupe, *'abcde') == list('abcde')
+
+        dedupe, entity = self.prepare_filter(tmp_path, history_size=3)
+        assert await self.run_filter(dedupe, 'a', 'e') == ['a']
+        assert list(entity.history) == ['d', 'e', 'a']
+
+    @pytest.mark.asyncio
+    async def test_legacy_history_imported(self, tmp_path):
+        legacy_file = tmp_path / 'test-test-history.json'
+        legacy_file.write_text(json.dumps({'a': True, 'b': True}), encoding='utf8')
+        dedupe, _ = self.prepare_filter(tmp_path)
+        assert await self.run_filter(dedupe, 'a', 'b', 'c') == ['c']
+        assert not legacy_file.exists()
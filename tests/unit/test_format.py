@@ -1,12 +1,17 @@
 import datetime
+import sys
 from typing import Optional
 
+import lxml.html
 import pytest
 
+from avtdl.core import formatters
+from avtdl.core.formatters import Context, Fmt, MessageFormatter, html_images, html_to_text, html_to_text2
 from avtdl.core.interfaces import TextRecord
 from avtdl.core.runtime import RuntimeContext
 from avtdl.plugins.filters.filters import EmptyFilterConfig
 from avtdl.plugins.filters.format import FormatFilter, FormatFilterEntity
+from avtdl.plugins.rss.generic_rss import GenericRSSRecord
 
 
 class TestFormatFilter:
@@ -93,3 +98,81 @@ class TestFormatFilter:
         fmt, entity = self.prepare_filter('*** {json} ***')
         result = fmt.match(entity, text_record)
         assert result.text == '*** {"text": "test text message"} ***'
+
+
+class TestTemplate:
+
+    def test_fields(self):
+        template = Fmt.compile('{text} in {title}, {text} again')
+        assert template.fields == ['text', 'title', 'text']
+        assert template.include == {'text', 'title'}
+
+    def test_cached(self):
+        assert Fmt.compile('*** {text} ***') is Fmt.compile('*** {text} ***')
+
+    def test_escaped_braces(self):
+        record = TextRecord(text='message')
+        assert Fmt.format(r'\{text\} {text}', record) == '{text} message'
+
+    def test_value_not_interpolated(self):
+        record = TextRecord(text='{json}')
+        assert Fmt.format('{text}', record) == '{json}'
+
+    def test_output_format_placeholder(self):
+        record = TextRecord(text='message')
+        assert Fmt.format('{json}', record) == record.as_json()
+
+    def test_date(self):
+        record = TextRecord(text='message')
+        tz = datetime.timezone.utc
+        expected = datetime.datetime.now(tz).strftime('%Y')
+        assert Fmt.format('%Y 100% {text}', record, tz=tz) == f'{expected} 100% message'
+
+
+class TestHtmlContent:
+    HTML = '<p>Post with <a href="/tags/1">a *link*</a></p><p><img src="/image.png" alt="image"></p>'
+    BASE_URL = 'https://example.com/posts/1'
+
+    def test_images(self):
+        assert html_images(self.HTML, self.BASE_URL) == ['https://example.com/image.png']
+
+    def test_empty(self):
+        assert html_images('', None) == []
+        assert html_to_text('') == ''
+
+    def test_deep_nesting(self):
+        root = lxml.html.Element('div')
+        elem = root
+        for _ in range(sys.getrecursionlimit() * 2):
+            elem = lxml.html.etree.SubElement(elem, 'div')
+        elem.text = 'deep text'
+        assert ''.join(html_to_text2(root, Context(plaintext=True))) == 'deep text'
+
+    def test_record_renders_summary_lazily(self, monkeypatch):
+        text = html_to_text(self.HTML, self.BASE_URL)
+        markdown = html_to_text(self.HTML, self.BASE_URL, markdown=True, strip_img=True)
+        calls = []
+        original = formatters.html_from_string
+
+        def counting_parse(*args, **kwargs):
+            calls.append(args)
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(formatters, 'html_from_string', counting_parse)
+        record = GenericRSSRecord(uid='1', url=self.BASE_URL, summary=self.HTML,
+                                  published=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+        assert record.attachments == ['https://example.com/image.png']
+        assert len(calls) == 1
+
+        str(record)
+        str(record)
+        assert len(calls) == 2
+        MessageFormatter.make_embeds(record)
+        MessageFormatter.make_embeds(record)
+        assert len(calls) == 3
+        assert record.summary_text == text
+        assert record.summary_markdown == markdown
+
+        updated = record.evolve(summary='<p>updated</p>')
+        assert str(updated).endswith('updated')
+        assert len(calls) == 4
@@ -7,7 +7,8 @@ import pytest
 
 from avtdl.core.actors import ActorConfig
 from avtdl.core.runtime import RuntimeContext
-from avtdl.plugins.file.text_file import FileMonitor, FileMonitorEntity
+from avtdl.plugins.file import text_file
+from avtdl.plugins.file.text_file import FileMonitor, FileMonitorEntity, RecordSplitter
 
 
 def add_to_file(text: str, path: Path, encoding: Optional[str] = None):
@@ -209,3 +210,91 @@ class TestEntityValidators:
     def test_invalid_end_regexp():
         with pytest.raises(ValueError):
             _ = FileMonitorEntity(name='test', path=Path('dummy'), record_end='*invalid regexp*')
+
+
+class TestRecordSplitter:
+
+    @staticmethod
+    def test_blocks_give_same_records():
+        text = '[LOG] Line 1.\n[LOG] Line 2a\nLine 2b.\nUnrelated line.\n[LOG] Line 3.\n'
+        whole = RecordSplitter(r'\[LOG\]', r'\.').feed(text)
+        splitter = RecordSplitter(r'\[LOG\]', r'\.')
+        lines = [line for block in text.splitlines(keepends=True) for line in splitter.feed(block)]
+        assert lines == whole
+        assert [line.strip() for line in lines] == ['[LOG] Line 1.', '[LOG] Line 2a\nLine 2b.', '[LOG] Line 3.']
+
+    @staticmethod
+    def test_partial_record_kept():
+        splitter = RecordSplitter(r'\[LOG\]', r'\.', partial='[LOG] Line 1')
+        assert splitter.feed('a\n[LOG] Line') == []
+        assert splitter.partial == '[LOG] Line 1a\n[LOG] Line'
+
+    @staticmethod
+    def test_many_records():
+        text = 'Line\n' * 200000
+        assert len(RecordSplitter('^', '$').feed(text)) == 200000
+
+
+class TestBlockReading:
+    """reading the file in blocks much smaller than the text gives the same records"""
+
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def small_blocks(monkeypatch):
+        monkeypatch.setattr(text_file, 'READ_SIZE', 4)
+        monkeypatch.setattr(text_file, 'MAX_READ_SIZE', 24)
+
+    @staticmethod
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('params', [{'follow': True, 'split_lines': True}])
+    async def test_split_lines(entity, monitor):
+        add_to_file('Line 1\nLine 2\nLine 3\n', entity.path)
+        records = await monitor.get_new_records(entity)
+        assert [str(record) for record in records] == ['Line 1', 'Line 2', 'Line 3']
+
+    @staticmethod
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('params', [{'follow': True, 'split_lines': True}])
+    async def test_read_limit(entity, monitor):
+        # 9 bytes long lines do not end on the boundary of the read limit
+        lines = [f'Line {i:02}x' for i in range(10)]
+        add_to_file(''.join(f'{line}\n' for line in lines), entity.path)
+        first = await monitor.get_new_records(entity)
+        assert [str(record) for record in first] == lines[:2]
+        assert entity.position == 18
+        rest = []
+        for _ in range(5):
+            rest += await monitor.get_new_records(entity)
+        assert [str(record) for record in first + rest] == lines
+
+    @staticmethod
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('params', [{'follow': True, 'split_lines': True, 'encoding': 'utf8'}])
+    async def test_read_limit_multibyte_characters(entity, monitor):
+        lines = [f'Строка {i}' for i in range(10)]
+        add_to_file(''.join(f'{line}\r\n' for line in lines), entity.path, 'utf8')
+        records = []
+        for _ in range(10):
+            records += await monitor.get_new_records(entity)
+        assert [str(record) for record in records] == lines
+
+    @staticmethod
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('params', [{'follow': True, 'encoding': 'utf8'}])
+    async def test_multibyte_characters(entity, monitor):
+        add_to_file('Строка 1\r\nСтрока 2\r\n', entity.path, 'utf8')
+        # 34 bytes of text exceed the read limit, so the second line is only read on the next update
+        records = await monitor.get_new_records(entity)
+        records += await monitor.get_new_records(entity)
+        assert [str(record) for record in records] == ['Строка 1', 'Строка 2']
+
+    @staticmethod
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('params', [{'follow': True, 'quiet_start': True, 'split_lines': True}])
+    async def test_follow_quiet_start(entity, monitor):
+        add_to_file('Line 1\n', entity.path)
+        assert await monitor.get_new_records(entity) == []
+        await asyncio.sleep(0.01)
+        add_to_file('Line 2\n', entity.path)
+        records = await monitor.get_new_records(entity)
+        assert [str(record) for record in records] == ['Line 2']
@@ -1,10 +1,10 @@
 import logging
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import pytest
 
-from avtdl.core.monitors import load_headers
+from avtdl.core.monitors import headers_files, load_headers, parse_headers
 
 
 def add_to_file(text: str, path: Path, encoding: Optional[str] = None):
@@ -77,3 +77,62 @@ def test_headers_file_parsing(tmp_path, name, content, expected):
     add_to_file(content, path)
     result = load_headers(path, logging.getLogger('test_headers'))
     assert result == expected
+
+
+class TestHeadersCache:
+
+    @staticmethod
+    @pytest.fixture()
+    def parsed(monkeypatch) -> List[Path]:
+        """paths of headers files parsed while the test runs"""
+        calls: List[Path] = []
+
+        def counting_parse(path: Path):
+            calls.append(path)
+            return parse_headers(path)
+
+        monkeypatch.setattr(headers_files, 'parse', counting_parse)
+        headers_files.clear()
+        return calls
+
+    def test_file_parsed_once(self, tmp_path, parsed):
+        path = tmp_path / 'headers.txt'
+        add_to_file('key1: value1\n', path)
+        first = load_headers(path, logging.getLogger('first'))
+        second = load_headers(tmp_path / '.' / 'headers.txt', logging.getLogger('second'))
+        assert first == second == {'key1': 'value1'}
+        assert len(parsed) == 1
+
+    def test_changed_file_reloaded(self, tmp_path, parsed):
+        path = tmp_path / 'headers.txt'
+        add_to_file('key1: value1\n', path)
+        load_headers(path, logging.getLogger('test_headers'))
+        add_to_file('key2: value2\n', path)
+        assert load_headers(path, logging.getLogger('test_headers')) == {'key1': 'value1', 'key2': 'value2'}
+        assert len(parsed) == 2
+
+    def test_returned_headers_not_shared(self, tmp_path, parsed):
+        path = tmp_path / 'headers.txt'
+        add_to_file('key1: value1\n', path)
+        headers = load_headers(path, logging.getLogger('test_headers'))
+        assert headers is not None
+        headers['key1'] = 'changed'
+        assert load_headers(path, logging.getLogger('test_headers')) == {'key1': 'value1'}
+
+    def test_removed_file(self, tmp_path, parsed):
+        path = tmp_path / 'headers.txt'
+        add_to_file('key1: value1\n', path)
+        load_headers(path, logging.getLogger('test_headers'))
+        path.unlink()
+        assert load_headers(path, logging.getLogger('test_headers')) is None
+
+    @pytest.mark.parametrize('name, content', [('headers.json', '{"key1": "value1",}'), ('headers.json', '["key1"]'),
+                                               ('headers.txt', 'key1: value1\nkey2 value2\n')])
+    def test_problems_reported_on_every_call(self, tmp_path, parsed, caplog, name, content):
+        path = tmp_path / name
+        add_to_file(content, path)
+        for logger_name in ['first', 'second']:
+            caplog.clear()
+            load_headers(path, logging.getLogger(logger_name))
+            assert [record.name for record in caplog.records if record.levelno == logging.WARNING] == [logger_name]
+        assert len(parsed) == (1 if name.endswith('.txt') else 2)
@@ -0,0 +1,62 @@
+import asyncio
+import sys
+import time
+from typing import Optional
+
+import pytest
+
+from avtdl.core.actors import ActorConfig, Filter, FilterEntity
+from avtdl.core.interfaces import Record, TextRecord
+from avtdl.core.lag import LOOP_STALLS, LoopLagMonitor, describe_stack
+from avtdl.core.runtime import RuntimeContext
+
+
+class BlockingFilter(Filter):
+
+    def match(self, entity: FilterEntity, record: Record) -> Optional[Record]:
+        time.sleep(0.3)
+        return record
+
+
+async def monitor_while(monitor: LoopLagMonitor, action) -> None:
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.05)
+    action()
+    await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_no_stalls():
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.1)
+    await monitor_while(monitor, lambda: None)
+    assert monitor.stats.samples > 0
+    assert monitor.stats.stalls == 0
+    assert len(monitor.stalls) == 0
+
+
+@pytest.mark.asyncio
+async def test_stall_attributed_to_entity():
+    entity = FilterEntity(name='slow')
+    actor = BlockingFilter(ActorConfig(name='blocking'), [entity], RuntimeContext.create())
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.1)
+    stalls_before = LOOP_STALLS.get('blocking', 'slow')
+
+    await monitor_while(monitor, lambda: actor.handle_record(entity, TextRecord(text='text')))
+
+    assert monitor.stats.stalls == 1
+    [stall] = monitor.stalls
+    assert stall.duration >= 0.25
+    assert stall.actor == 'blocking'
+    assert stall.entity == 'slow'
+    assert stall.location is not None and 'actors.py' in stall.location
+    assert stall.task is not None
+    assert LOOP_STALLS.get('blocking', 'slow') == stalls_before + 1
+
+
+def test_describe_stack_outside_actors():
+    actor, entity, location = describe_stack(sys._getframe())
+    assert actor is None
+    assert entity is None
+    assert location is None
@@ -0,0 +1,61 @@
+import pytest
+
+from avtdl.core.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter():
+    registry = Registry()
+    counter = Counter('requests_total', 'Number of requests', ['host', 'status'], registry=registry)
+    counter.inc('example.com', '200')
+    counter.inc('example.com', '200', amount=2)
+    counter.inc('example.org', '404')
+    assert counter.get('example.com', '200') == 3
+    assert registry.render() == '\n'.join([
+        '# HELP requests_total Number of requests',
+        '# TYPE requests_total counter',
+        'requests_total{host="example.com",status="200"} 3',
+        'requests_total{host="example.org",status="404"} 1',
+    ]) + '\n'
+
+
+def test_gauge_without_labels():
+    registry = Registry()
+    gauge = Gauge('queue_depth', 'Queue depth', registry=registry)
+    gauge.inc()
+    gauge.inc(amount=4)
+    gauge.dec()
+    assert gauge.render_samples() == ['queue_depth 4']
+    gauge.set(value=0.5)
+    assert gauge.render_samples() == ['queue_depth 0.5']
+
+
+def test_histogram():
+    histogram = Histogram('duration_seconds', 'Duration', ['name'], buckets=[0.1, 1], registry=None)
+    for value in [0.05, 0.1, 0.5, 3]:
+        histogram.observe('a', value=value)
+    assert histogram.render_samples() == [
+        'duration_seconds_bucket{name="a",le="0.1"} 2',
+        'duration_seconds_bucket{name="a",le="1"} 3',
+        'duration_seconds_bucket{name="a",le="+Inf"} 4',
+        'duration_seconds_sum{name="a"} 3.65',
+        'duration_seconds_count{name="a"} 4',
+    ]
+
+
+def test_label_escaping():
+    counter = Counter('records_total', 'Records', ['topic'], registry=None)
+    counter.inc('a"b\\c\nd')
+    assert counter.render_samples() == [r'records_total{topic="a\"b\\c\nd"} 1']
+
+
+def test_wrong_labels():
+    counter = Counter('records_total', 'Records', ['topic'], registry=None)
+    with pytest.raises(ValueError):
+        counter.inc('a', 'b')
+
+
+def test_duplicate_name():
+    registry = Registry()
+    Counter('records_total', 'Records', registry=registry)
+    with pytest.raises(ValueError):
+        Gauge('records_total', 'Records', registry=registry)
@@ -1,6 +1,10 @@
+import datetime
+from typing import List
+
 import pytest
 
-from avtdl.core.db import calculate_offset
+from avtdl.core.db import OLDEST_KEY, RecordDB, calculate_offset, decode_cursor, encode_cursor
+from avtdl.core.interfaces import RecordsPage, TextRecord
 
 testcases = {
     'first page': (1, 10, 100, (10, 90)),
@@ -18,3 +22,115 @@ testcases = {
 def test_offset(page, per_page, total_rows, expected):
     limit, offset = calculate_offset(page, per_page, total_rows)
     assert (limit, offset) == expected
+
+
+class UidTextRecord(TextRecord):
+    uid: str
+
+    def get_uid(self) -> str:
+        return self.uid
+
+
+def make_db(size: int, feed: str = 'feed', path=':memory:') -> RecordDB:
+    db = RecordDB(path)
+    records = [UidTextRecord(uid=f'{i:05}', text=f'{feed} {i}') for i in range(size)]
+    db.store_records(records, feed)
+    return db
+
+
+def texts(records_page: RecordsPage) -> List[str]:
+    return [record.text for record in records_page.records]  # type: ignore
+
+
+class TestCursorPagination:
+
+    def test_most_recent_page(self):
+        db = make_db(95)
+        records_page = db.load_cursor_page('feed', None, 10)
+        assert texts(records_page) == [f'feed {i}' for i in range(85, 95)]
+        assert (records_page.current, records_page.total) == (10, 10)
+        assert records_page.next is None
+        assert records_page.previous is not None
+
+    def test_walk_back_and_forth(self):
+        db = make_db(95)
+        db.store_records([UidTextRecord(uid='x', text='other feed')], 'other')
+        seen = []
+        records_page = db.load_cursor_page('feed', None, 10)
+        while True:
+            seen = texts(records_page) + seen
+            if records_page.previous is None:
+                break
+            records_page = db.load_cursor_page('feed', records_page.previous, 10)
+        assert seen == [f'feed {i}' for i in range(95)]
+        assert records_page.current == 1
+        assert records_page.first is None
+
+        seen = []
+        while True:
+            seen.extend(texts(records_page))
+            if records_page.next is None:
+                break
+            records_page = db.load_cursor_page('feed', records_page.next, 10)
+        assert seen == [f'feed {i}' for i in range(95)]
+        assert records_page.current == records_page.total
+
+    def test_first_page(self):
+        db = make_db(95)
+        records_page = db.load_cursor_page(None, None, 10)
+        assert records_page.first is not None
+        records_page = db.load_cursor_page(None, records_page.first, 10)
+        assert texts(records_page) == [f'feed {i}' for i in range(10)]
+        assert records_page.current == 1
+        assert records_page.previous is None
+
+    def test_ties_resolved_by_uid(self):
+        db = RecordDB(':memory:')
+        records = [UidTextRecord(uid=f'{i:02}', text=f'{i}', created_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+                   for i in range(25)]
+        db.store_records(records, 'feed', use_created_as_parsed=True)
+        seen: List[str] = []
+        records_page = db.load_cursor_page('feed', None, 10)
+        while True:
+            seen = texts(records_page) + seen
+            if records_page.previous is None:
+                break
+            records_page = db.load_cursor_page('feed', records_page.previous, 10)
+        assert seen == [f'{i}' for i in range(25)]
+
+    def test_empty(self):
+        db = RecordDB(':memory:')
+        records_page = db.load_cursor_page(None, None, 10)
+        assert records_page.records == []
+        assert records_page.previous is None and records_page.next is None
+
+    @pytest.mark.parametrize('cursor', ['', 'not a cursor', encode_cursor(True, OLDEST_KEY, 1)[:-2], 'WzEsMiwzLDRd'])
+    def test_malformed_cursor(self, cursor):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+    def test_cursor_roundtrip(self):
+        cursor = encode_cursor(False, ('2020-01-01 00:00:00+00:00', 'feed:ü'), 15)
+        assert decode_cursor(cursor) == (False, ('2020-01-01 00:00:00+00:00', 'feed:ü'), 15)
+
+
+class TestSizeCache:
+
+    def test_size_updated_on_store(self):
+        db = make_db(10)
+        assert db.get_size() == 10
+        assert db.get_size('feed') == 10
+        db.store_records([UidTextRecord(uid='a', text='a'), UidTextRecord(uid='00001', text='feed 1')], 'feed')
+        db.store_records([UidTextRecord(uid='b', text='b')], 'other')
+        assert db.sizes == {None: 12, 'feed': 11}
+        assert db.get_size('other') == 1
+        assert db.get_size() == 12
+
+    def test_size_dropped_on_external_change(self, tmp_path):
+        path = tmp_path / 'records.sqlite'
+        db = make_db(10, path=path)
+        assert db.get_size() == 10
+        other = RecordDB(path)
+        other.store_records([UidTextRecord(uid='a', text='a')], 'feed')
+        assert db.get_size() == 11
+        assert db.get_size('feed') == 11
@@ -0,0 +1,99 @@
+import datetime
+from typing import List
+
+import pytest
+
+from avtdl.core.db import RecordDB, RecordState
+from avtdl.core.formatters import Fmt
+from avtdl.core.interfaces import Record, TextRecord
+from avtdl.core.runtime import RuntimeContext
+from avtdl.plugins.filters.filters import DeduplicateFilter, DeduplicateFilterConfig, DeduplicateFilterEntity
+from avtdl.plugins.rss.generic_rss import GenericRSSRecord
+
+
+def make_record(**changes) -> GenericRSSRecord:
+    fields = dict(uid='1', url='https://example.com/1', summary='summary', author='author', title='title',
+                  published=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+    fields.update(changes)
+    return GenericRSSRecord(**fields)
+
+
+@pytest.fixture
+def serializations(monkeypatch) -> List[Record]:
+    """records serialized while the test runs, once per serialization"""
+    calls: List[Record] = []
+    original = Record._serialize
+
+    def counting_serialize(self, *args, **kwargs):
+        calls.append(self)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(Record, '_serialize', counting_serialize)
+    return calls
+
+
+class TestRecordCache:
+
+    def test_hash_cached(self, serializations):
+        record = make_record()
+        assert record.hash() == record.hash()
+        assert record.as_json() == record.as_json()
+        assert len(serializations) == 1
+
+    def test_same_as_uncached(self):
+        record = make_record()
+        assert record.as_json() == record._serialize()
+        assert record.as_json(indent=2) == record._serialize(indent=2)
+
+    def test_assignment_drops_cache(self):
+        record = make_record()
+        old_hash = record.hash()
+        record.title = 'new title'
+        assert record.hash() != old_hash
+        assert record.hash() == make_record(title='new title').hash()
+
+    def test_excluded_field_keeps_cache(self, serializations):
+        record = make_record()
+        record.hash()
+        record.origin = 'actor:entity'
+        record.chain = 'chain'
+        record.hash()
+        assert len(serializations) == 1
+
+    def test_evolve_drops_cache(self):
+        record = make_record()
+        record.hash()
+        assert record.evolve(title='new title').hash() == make_record(title='new title').hash()
+        assert record.evolve(chain='chain').hash() == record.hash()
+
+    def test_equality(self):
+        assert make_record() == make_record()
+        assert make_record() != make_record(title='new title')
+        assert TextRecord(text='text', chain='first') == TextRecord(text='text', chain='second')
+
+
+def test_serializations_from_monitor_to_action(serializations):
+    """a record is serialized once on the way from the monitor database through filters to an action"""
+    record = make_record()
+
+    # monitor: classify fetched record and store it
+    db = RecordDB(':memory:')
+    [state] = db.classify_records([record], 'entity')
+    assert state == RecordState.NEW
+    db.store_records([record], 'entity')
+
+    # bus: record is copied for a specific chain
+    record = record.evolve(chain='chain')
+
+    # filter: deduplicate by hash
+    ctx = RuntimeContext.create()
+    entity = DeduplicateFilterEntity(name='entity', field='hash')
+    dedupe = DeduplicateFilter(DeduplicateFilterConfig(name='dedupe', history_dir=None), [entity], ctx)
+    assert dedupe.match(entity, record) is record
+
+    # action: format template, store uid and hash of the processed record
+    Fmt.format('{title} {hash}', record)
+    record.get_uid()
+    record.hash()
+
+    assert len(serializations) == 1
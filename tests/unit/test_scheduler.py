@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import List
+
+import pytest
+
+from avtdl.core.runtime import TaskStatus, TasksController
+from avtdl.core.scheduler import PollScheduler
+
+
+class Recorder:
+    """Collects names of started polls and tracks how many run at the same time"""
+
+    def __init__(self, duration: float = 0) -> None:
+        self.duration = duration
+        self.started: List[str] = []
+        self.running = Counter()
+        self.max_running = Counter()
+
+    def poll(self, name: str, host: str):
+        async def poll():
+            self.started.append(name)
+            self.running[host] += 1
+            self.running['total'] += 1
+            self.max_running[host] = max(self.max_running[host], self.running[host])
+            self.max_running['total'] = max(self.max_running['total'], self.running['total'])
+            try:
+                await asyncio.sleep(self.duration)
+            finally:
+                self.running[host] -= 1
+                self.running['total'] -= 1
+
+        return poll
+
+
+async def run_for(scheduler: PollScheduler, duration: float) -> None:
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(duration)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_polls_repeatedly():
+    scheduler = PollScheduler(jitter=0)
+    recorder = Recorder()
+    scheduler.add('a', 'host', recorder.poll('a', 'host'), lambda: 0.05)
+    scheduler.add('b', 'host', recorder.poll('b', 'host'), lambda: 0.05, delay=0.02)
+    await run_for(scheduler, 0.23)
+    assert recorder.started[:4] == ['a', 'b', 'a', 'b']
+    assert Counter(recorder.started) == {'a': 5, 'b': 5}
+
+
+@pytest.mark.asyncio
+async def test_interval_is_read_after_each_poll():
+    scheduler = PollScheduler(jitter=0)
+    recorder = Recorder()
+    intervals = [0.01, 10]
+    scheduler.add('a', 'host', recorder.poll('a', 'host'), lambda: intervals.pop(0))
+    await run_for(scheduler, 0.1)
+    assert recorder.started == ['a', 'a']
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limits():
+    scheduler = PollScheduler(concurrency=3, concurrency_per_host=2, jitter=0)
+    recorder = Recorder(duration=0.05)
+    for i in range(4):
+        for host in ['first', 'second']:
+            name = f'{host}{i}'
+            scheduler.add(name, host, recorder.poll(name, host), lambda: 10)
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(0.01)
+    assert scheduler.get_stats().running == 3
+    assert scheduler.get_stats().queued == 5
+    await asyncio.sleep(0.3)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert len(recorder.started) == 8
+    assert recorder.max_running['total'] == 3
+    assert recorder.max_running['first'] == 2
+    assert recorder.max_running['second'] == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_poll_releases_slot(caplog):
+    scheduler = PollScheduler(concurrency=1, concurrency_per_host=1, jitter=0, slot_timeout=0.05)
+    slow = Recorder(duration=1)
+    fast = Recorder()
+    scheduler.add('slow', 'slow', slow.poll('slow', 'slow'), lambda: 10)
+    scheduler.add('fast', 'fast', fast.poll('fast', 'fast'), lambda: 10)
+    with caplog.at_level(logging.INFO, logger='scheduler'):
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.02)
+        assert fast.started == []
+        assert 'all 1 update slots are busy' in caplog.text
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    assert slow.started == ['slow']
+    assert fast.started == ['fast']
+    assert scheduler.get_stats().overdue == 1
+    assert 'no longer saturated' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_hosts_served_in_turn():
+    scheduler = PollScheduler(concurrency=1, jitter=0)
+    recorder = Recorder()
+    for i in range(3):
+        scheduler.add(f'busy{i}', 'busy', recorder.poll(f'busy{i}', 'busy'), lambda: 10)
+    scheduler.add('quiet', 'quiet', recorder.poll('quiet', 'quiet'), lambda: 10)
+    await run_for(scheduler, 0.05)
+    assert recorder.started == ['busy0', 'quiet', 'busy1', 'busy2']
+
+
+@pytest.mark.asyncio
+async def test_failed_job_removed():
+    scheduler = PollScheduler(jitter=0)
+    calls = []
+
+    async def poll():
+        calls.append(1)
+        raise RuntimeError('poll failed')
+
+    scheduler.add('a', 'host', poll, lambda: 0.01)
+    await run_for(scheduler, 0.1)
+    assert len(calls) == 1
+    assert 'a' not in scheduler.jobs
+
+
+@pytest.mark.asyncio
+async def test_removed_job_not_polled():
+    scheduler = PollScheduler(jitter=0)
+    recorder = Recorder()
+    scheduler.add('a', 'host', recorder.poll('a', 'host'), lambda: 0.01, delay=0.05)
+    scheduler.remove('a')
+    await run_for(scheduler, 0.1)
+    assert recorder.started == []
+
+
+@pytest.mark.asyncio
+async def test_starting_status_cleared_on_first_poll():
+    scheduler = PollScheduler(jitter=0)
+    info = TaskStatus('actor', 'entity')
+    statuses = []
+
+    async def poll():
+        statuses.append(info.status)
+        if len(statuses) == 1:
+            info.set_status('polled')
+        else:
+            raise RuntimeError('poll failed')
+
+    scheduler.add('a', 'host', poll, lambda: 0.01, delay=0.02, info=info)
+    assert info.status == 'starting in 0:00:00'
+    await run_for(scheduler, 0.1)
+    assert statuses == ['', 'polled']
+    assert info.status == 'polled'
+
+
+@pytest.mark.asyncio
+async def test_jitter_spreads_polls():
+    scheduler = PollScheduler(jitter=0.5)
+    delays = {scheduler.next_delay(scheduler.add(str(i), 'host', Recorder().poll('', ''), lambda: 10, delay=1))
+              for i in range(20)}
+    assert all(5 <= delay <= 15 for delay in delays)
+    assert len(delays) > 1
+
+
+@pytest.mark.asyncio
+async def test_lateness_stats():
+    scheduler = PollScheduler(concurrency=1, jitter=0)
+    recorder = Recorder(duration=0.05)
+    scheduler.add('a', 'host', recorder.poll('a', 'host'), lambda: 10)
+    scheduler.add('b', 'host', recorder.poll('b', 'host'), lambda: 10)
+    await run_for(scheduler, 0.1)
+    stats = scheduler.get_stats()
+    assert stats.polls == 2
+    assert stats.jobs == 2
+    assert 0.04 < stats.max_lateness < 0.1
+
+
+@pytest.mark.asyncio
+async def test_controller_runs_scheduler():
+    controller = TasksController()
+    recorder = Recorder()
+    info = TaskStatus('actor', 'entity', 'status')
+    controller.schedule('actor:entity', 'host', recorder.poll('a', 'host'), lambda: 10, info=info)
+    await asyncio.sleep(0.01)
+    assert recorder.started == ['a']
+    assert info in controller.get_status()
+    await controller.cancel_all_tasks()
+    assert not controller.tasks
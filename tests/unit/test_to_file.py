@@ -1,3 +1,4 @@
+import asyncio
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -7,6 +8,7 @@ from avtdl.core.actors import ActorConfig
 from avtdl.core.interfaces import TextRecord
 from avtdl.core.runtime import RuntimeContext
 from avtdl.plugins.file.text_file import FileAction, FileActionEntity
+from avtdl.plugins.file.writer import BufferedFile, FileWriters, WriteFailure
 
 
 def read_file(path: Path, encoding: Optional[str] = None) -> str:
@@ -103,3 +105,122 @@ class TestFirstUpdate:
         path = (entity.path or Path()) / entity.filename
         output = read_file(path, encoding=entity.encoding)
         assert output == expected
+
+
+class TestBufferedWrites:
+
+    @staticmethod
+    async def start(actor: FileAction) -> asyncio.Task:
+        task = asyncio.create_task(actor.run())
+        await asyncio.sleep(0)
+        return task
+
+    @staticmethod
+    async def stop(task: asyncio.Task) -> None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_written_on_shutdown(self, entity: FileActionEntity, actor: FileAction):
+        task = await self.start(actor)
+        for i in range(3):
+            actor.handle(entity, TextRecord(text=f'Line {i}'))
+        path = (entity.path or Path()) / entity.filename
+        assert not path.exists()
+        await self.stop(task)
+        assert read_file(path) == 'Line 0\nLine 1\nLine 2\n'
+        assert not actor.writers.files
+
+    @pytest.mark.asyncio
+    async def test_written_on_size(self, entity: FileActionEntity, actor: FileAction):
+        actor.writers.max_buffer_size = 10
+        task = await self.start(actor)
+        actor.handle(entity, TextRecord(text='Line 1'))
+        actor.handle(entity, TextRecord(text='Line 2'))
+        await asyncio.sleep(0.05)
+        path = (entity.path or Path()) / entity.filename
+        assert read_file(path) == 'Line 1\nLine 2\n'
+        assert actor.writers.files[path].is_open
+        await self.stop(task)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('params', [{'overwrite': False}])
+    async def test_no_overwrite_pending_file(self, entity: FileActionEntity, actor: FileAction):
+        task = await self.start(actor)
+        actor.handle(entity, TextRecord(text='Line 1'))
+        actor.handle(entity, TextRecord(text='Line 2'))
+        await self.stop(task)
+        assert read_file((entity.path or Path()) / entity.filename) == 'Line 1\n'
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('params', [{'append': False}])
+    async def test_truncate_discards_pending(self, entity: FileActionEntity, actor: FileAction):
+        path = (entity.path or Path()) / entity.filename
+        path.write_text('old content\n')
+        task = await self.start(actor)
+        actor.handle(entity, TextRecord(text='Line 1'))
+        actor.handle(entity, TextRecord(text='Line 2'))
+        await self.stop(task)
+        assert read_file(path) == 'Line 2\n'
+
+    def test_reopened_after_removal(self, tmp_path):
+        path = tmp_path / 'data.txt'
+        writers = FileWriters()
+        writers.deferred = True
+        writers.write(path, b'first\n')
+        writers.files[path].flush()
+        path.unlink()
+        writers.write(path, b'second\n')
+        writers.files[path].flush()
+        assert read_file(path) == 'second\n'
+        writers.files[path].close()
+
+    def test_failed_write_rolled_back(self, tmp_path, monkeypatch):
+        path = tmp_path / 'data.txt'
+        path.write_bytes(b'first\n')
+        file = BufferedFile(path)
+        fp = file._open()
+
+        class FailingFile:
+            """writes half of the data before failing"""
+
+            def __getattr__(self, name):
+                return getattr(fp, name)
+
+            def write(self, data):
+                fp.write(data[:len(data) // 2])
+                raise OSError('no space left on device')
+
+        monkeypatch.setattr(file, '_open', lambda: FailingFile())
+        file.add(b'second record\n', truncate=False, context='record')
+        failure = file.flush()
+        assert failure is not None
+        assert failure.context == ['record']
+        assert path.read_bytes() == b'first\n'
+        assert not file.is_open
+
+    @pytest.mark.asyncio
+    async def test_failure_reported(self, tmp_path):
+        failures: List[WriteFailure] = []
+        writers = FileWriters(flush_interval=0.01)
+        task = asyncio.create_task(writers.run(failures.append))
+        await asyncio.sleep(0)
+        writers.write(tmp_path, b'data', context='record')
+        await asyncio.sleep(0.05)
+        await TestBufferedWrites.stop(task)
+        assert [failure.context for failure in failures] == [['record']]
+
+    @pytest.mark.asyncio
+    async def test_idle_files_closed(self, tmp_path):
+        writers = FileWriters(flush_interval=0.01, max_open_files=2)
+        task = asyncio.create_task(writers.run(lambda failure: None))
+        await asyncio.sleep(0)
+        for name in 'abc':
+            writers.write(tmp_path / name, b'data')
+        await asyncio.sleep(0.05)
+        assert list(writers.files) == [tmp_path / 'b', tmp_path / 'c']
+        writers.idle_timeout = 0
+        await asyncio.sleep(0.05)
+        assert not writers.files
+        await TestBufferedWrites.stop(task)
+        assert all((tmp_path / name).read_bytes() == b'data' for name in 'abc')